@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+import models
+
+# --- CACHE D'ANALYSE (DÉDUPLICATION PAR EMPREINTE) ---
+# Un même reçu ré-uploadé ne doit pas repartir chez Gemini. La clé est le
+# SHA-256 du fichier ; la source de vérité reste la Black Box (AuraMemory),
+# la correction humaine primant sur la sortie IA. Un LRU en mémoire évite
+# même l'aller-retour en base pour les reçus chauds.
+
+CACHE_SIZE = int(os.getenv("AURA_ANALYSIS_CACHE_SIZE", "1024"))
+CACHE_TTL = int(os.getenv("AURA_ANALYSIS_CACHE_TTL", str(30 * 24 * 3600)))  # 0 = sans expiration
+CACHE_SCOPE = os.getenv("AURA_ANALYSIS_CACHE_SCOPE", "company")  # "company" ou "global"
+
+
+def find_cached_result(db: Session, content_hash: str, company_id: str = None, max_age: int = 0):
+    """Dernier résultat connu pour cette empreinte dans la Black Box, ou None."""
+    query = db.query(models.AuraMemory)\
+        .join(models.FinancialDocument, models.AuraMemory.document_id == models.FinancialDocument.id)\
+        .filter(models.FinancialDocument.content_hash == content_hash)
+    if company_id:
+        query = query.filter(models.FinancialDocument.company_id == company_id)
+    if max_age:
+        oldest = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=max_age)
+        query = query.filter(models.AuraMemory.created_at >= oldest)
+
+    memory = query.order_by(models.AuraMemory.id.desc()).first()
+    if not memory:
+        return None
+    return memory.human_corrected_json or memory.ai_json_output
+
+
+class AnalysisCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: int = CACHE_TTL, scope: str = CACHE_SCOPE):
+        if scope not in ("company", "global"):
+            raise ValueError(f"Portée de cache inconnue : {scope}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.scope = scope
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _key(self, content_hash: str, company_id: str):
+        return content_hash if self.scope == "global" else (company_id, content_hash)
+
+    def _remember(self, key, result: dict):
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, db: Session, content_hash: str, company_id: str):
+        key = self._key(content_hash, company_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if not self.ttl or time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return result
+                del self._entries[key]
+
+        scope_company = company_id if self.scope == "company" else None
+        result = find_cached_result(db, content_hash, scope_company, self.ttl)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+            self._remember(key, result)
+        return result
+
+    def put(self, content_hash: str, company_id: str, result: dict):
+        with self._lock:
+            self._remember(self._key(content_hash, company_id), result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "scope": self.scope,
+                "ttl_seconds": self.ttl,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
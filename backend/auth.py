@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lazy import Lazy
+from metrics import AUTH_IN_FLIGHT, AUTH_OUTCOMES, AUTH_QUEUE_DEPTH, AUTH_SECONDS
+
+# --- AUTHENTIFICATION (BCRYPT ISOLÉ, ÉCHECS RÉPÉTÉS, JETONS DE SESSION) ---
+# bcrypt tournait sur le threadpool partagé de Starlette : une rafale de
+# connexions y occupait tous les threads et affamait le tableau de bord et
+# l'inventaire. Désormais :
+#   - PasswordHasher : bcrypt dans un pool de processus dédié, au plus
+#     AURA_AUTH_MAX_CONCURRENCY opérations en cours et AURA_AUTH_MAX_QUEUE en
+#     attente ; au-delà, AuthBusy (503) plutôt qu'une file sans fin ;
+#   - LoginThrottle : par email, les échecs au-delà de AURA_AUTH_FREE_ATTEMPTS
+#     imposent une attente exponentielle (429, sans bcrypt) ; un couple
+#     email / mot de passe déjà refusé est rejeté sans recalcul (empreinte
+#     HMAC, jamais le mot de passe en clair) ;
+#   - SessionTokens : jeton signé HMAC de courte durée renvoyé au login, pour
+#     que les appels suivants n'envoient plus les identifiants.
+# L'état du throttle est propre à chaque worker (comme les seaux mémoire de la
+# Sentinelle). Les jetons sont vérifiables par tous les workers si
+# AURA_SESSION_SECRET est défini.
+#
+#     AURA_AUTH_WORKERS=2               processus bcrypt (0 = threads dédiés)
+#     AURA_AUTH_MAX_CONCURRENCY=4       opérations bcrypt simultanées
+#     AURA_AUTH_MAX_QUEUE=64            opérations en attente avant refus
+#     AURA_AUTH_FREE_ATTEMPTS=3         échecs tolérés avant attente
+#     AURA_AUTH_BACKOFF_BASE=1          attente après le premier échec de trop (s), doublée ensuite
+#     AURA_AUTH_BACKOFF_MAX=900
+#     AURA_SESSION_TTL_SECONDS=900
+
+WORKERS = int(os.getenv("AURA_AUTH_WORKERS", "2"))
+MAX_CONCURRENCY = int(os.getenv("AURA_AUTH_MAX_CONCURRENCY", str(max(1, WORKERS) * 2)))
+MAX_QUEUE = int(os.getenv("AURA_AUTH_MAX_QUEUE", "64"))
+FREE_ATTEMPTS = int(os.getenv("AURA_AUTH_FREE_ATTEMPTS", "3"))
+BACKOFF_BASE = float(os.getenv("AURA_AUTH_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.getenv("AURA_AUTH_BACKOFF_MAX", "900"))
+SESSION_TTL = int(os.getenv("AURA_SESSION_TTL_SECONDS", "900"))
+THROTTLE_MAX_ENTRIES = 100_000  # emails suivis au plus (les plus anciens sont oubliés)
+
+
+class AuthBusy(Exception):
+    """File bcrypt pleine : réessayer plus tard."""
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Trop d'échecs, réessayez dans {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+# --- BCRYPT (EXÉCUTÉ DANS LE POOL) ---
+
+def build_password_context():
+    from passlib.context import CryptContext
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    context.handler("bcrypt").get_backend()  # chargement et auto-test du backend bcrypt
+    return context
+
+
+# Un contexte par processus (workers du pool, ou processus API pour les scripts)
+pwd_context = Lazy("bcrypt", build_password_context)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.get().hash(password[:72])
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.get().verify(plain_password[:72], hashed_password)
+
+
+def _warm_worker():
+    pwd_context.get()
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = WORKERS, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            if self.workers > 0:
+                # spawn : pas de fork d'un processus API déjà multi-thread
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(MAX_CONCURRENCY, thread_name_prefix="aura-bcrypt")
+        return self._pool
+
+    async def _run(self, operation: str, func, *args):
+        if self._waiting >= self.max_queue:
+            AUTH_OUTCOMES.labels("busy").inc()
+            raise AuthBusy("File d'authentification saturée.")
+        self._waiting += 1
+        AUTH_QUEUE_DEPTH.inc()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+            AUTH_QUEUE_DEPTH.dec()
+        AUTH_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), func, *args)
+        except BrokenProcessPool:
+            self._pool = None  # processus mort : pool recréé au prochain appel
+            raise
+        finally:
+            AUTH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+            AUTH_IN_FLIGHT.dec()
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run("verify", verify_password, password, hashed)
+
+    async def warm(self):
+        """Démarre les processus et charge bcrypt (tâche de fond du lifespan)."""
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._executor()
+            await asyncio.gather(*(loop.run_in_executor(executor, _warm_worker) for _ in range(max(1, self.workers))))
+        except Exception as e:
+            print(f"⚠️ Préchauffage bcrypt en échec ({e}), nouvel essai au premier usage.")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+# --- ÉCHECS RÉPÉTÉS (PAR EMAIL) ---
+
+class LoginThrottle:
+    """
+    email -> [échecs, bloqué jusqu'à, empreintes refusées], dans l'ordre du
+    dernier échec. Une connexion réussie efface l'entrée.
+    """
+
+    def __init__(self, free_attempts: int = FREE_ATTEMPTS, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, max_entries: int = THROTTLE_MAX_ENTRIES):
+        self.free_attempts = free_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_entries = max_entries
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+
+    def _fingerprint(self, email: str, password: str) -> bytes:
+        return hmac.new(self._key, f"{email}\0{password}".encode(), hashlib.sha256).digest()[:16]
+
+    def _entry(self, email: str, now: float):
+        entry = self._entries.get(email)
+        # Attente écoulée depuis plus que l'attente maximale : l'email repart de zéro
+        if entry and now - entry[1] > self.backoff_max:
+            del self._entries[email]
+            return None
+        return entry
+
+    def check(self, email: str, password: str):
+        """Lève LoginThrottled si l'email est en attente ; True si ce mot de passe a déjà été refusé."""
+        now = time.monotonic()
+        entry = self._entry(email, now)
+        if entry is None:
+            return False
+        if entry[1] > now:
+            raise LoginThrottled(entry[1] - now)
+        return self._fingerprint(email, password) in entry[2]
+
+    def record_failure(self, email: str, password: str):
+        now = time.monotonic()
+        entry = self._entry(email, now) or [0, now, set()]
+        entry[0] += 1
+        if entry[0] > self.free_attempts:
+            entry[1] = now + min(self.backoff_max, self.backoff_base * 2 ** (entry[0] - self.free_attempts - 1))
+        else:
+            entry[1] = now
+        if len(entry[2]) < 32:
+            entry[2].add(self._fingerprint(email, password))
+        self._entries[email] = entry
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_success(self, email: str):
+        self._entries.pop(email, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- JETONS DE SESSION ---
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class SessionTokens:
+    """Jeton "user_id.expiration.signature" : vérifié par HMAC, sans base ni bcrypt."""
+
+    def __init__(self, secret: str = None, ttl: int = SESSION_TTL):
+        if not secret:
+            print("⚠️ AURA_SESSION_SECRET non défini : jetons de session valables dans ce worker seulement.")
+            secret = secrets.token_hex(32)
+        self._secret = secret.encode()
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("AURA_SESSION_SECRET"))
+
+    def _sign(self, payload: str) -> str:
+        return _b64(hmac.new(self._secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user_id: str) -> dict:
+        expires = int(time.time()) + self.ttl
+        payload = f"{_b64(user_id.encode())}.{expires}"
+        return {"token": f"{payload}.{self._sign(payload)}", "token_type": "bearer", "expires_in": self.ttl}
+
+    def verify(self, token: str):
+        """user_id du jeton, ou None s'il est invalide ou expiré."""
+        try:
+            encoded_user, expires, signature = token.split(".")
+            payload = f"{encoded_user}.{expires}"
+            if not hmac.compare_digest(signature, self._sign(payload)) or int(expires) < time.time():
+                return None
+            return base64.urlsafe_b64decode(encoded_user + "=" * (-len(encoded_user) % 4)).decode()
+        except (ValueError, UnicodeDecodeError):
+            return None
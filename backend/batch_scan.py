@@ -0,0 +1,67 @@
+import json
+import mimetypes
+import os
+import zipfile
+from pathlib import PurePosixPath
+
+# --- SCAN PAR LOT (PLUSIEURS FICHIERS OU ARCHIVE ZIP) ---
+# Outils de la route POST /api/aura/scan/batch/{user_id} : dépliage des
+# archives ZIP (bornes sur le nombre de documents et la taille décompressée)
+# et encodage des résultats au fil de l'eau, en NDJSON ou en server-sent events.
+
+BATCH_MAX_DOCUMENTS = int(os.getenv("AURA_BATCH_MAX_DOCUMENTS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("AURA_BATCH_CONCURRENCY", "8"))
+BATCH_COMMIT_SIZE = int(os.getenv("AURA_BATCH_COMMIT_SIZE", "50"))
+BATCH_MAX_UNCOMPRESSED_BYTES = int(os.getenv("AURA_BATCH_MAX_UNCOMPRESSED_BYTES", str(1024 * 1024 * 1024)))
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "multipart/x-zip"}
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+class BatchTooLarge(Exception):
+    pass
+
+
+class InvalidArchive(Exception):
+    pass
+
+
+def is_zip(upload) -> bool:
+    return upload.content_type in ZIP_CONTENT_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+
+def open_archive(fileobj, max_documents: int, max_total_bytes: int = BATCH_MAX_UNCOMPRESSED_BYTES):
+    """
+    Ouvre l'archive et liste les documents à analyser (dossiers, fichiers
+    cachés et métadonnées macOS ignorés). Bloquant : à appeler via le threadpool.
+    La taille déclarée sert au refus rapide ; la taille réelle de chaque
+    membre reste bornée à la lecture par BlobStorage.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise InvalidArchive(str(e))
+
+    members = []
+    for info in archive.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.parts[0] == "__MACOSX" or path.name.startswith("."):
+            continue
+        members.append(info)
+
+    if len(members) > max_documents:
+        raise BatchTooLarge(f"{len(members)} documents (max {max_documents})")
+    if sum(info.file_size for info in members) > max_total_bytes:
+        raise BatchTooLarge("archive trop volumineuse une fois décompressée")
+    return archive, members
+
+
+def guess_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def encode_event(fmt: str, event: str, payload: dict) -> bytes:
+    """Une ligne NDJSON ({"event": ..., ...}) ou un événement SSE."""
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n".encode()
+    return (json.dumps({"event": event, **payload}, default=str) + "\n").encode()
@@ -0,0 +1,53 @@
+"""
+Comportement du GeminiClient sous pression de quota, contre le faux Gemini local.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_gemini_quota [--documents 200]
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from fake_gemini import FakeGeminiSDK, FakeGeminiModel
+from gemini_client import GeminiClient, CircuitBreaker, AnalyzerError
+
+QUOTA_RATES = (0.0, 0.2, 0.5, 0.9)
+
+
+async def run(documents: int, quota_error_rate: float) -> dict:
+    sdk = FakeGeminiSDK(latency=0.01, processing_polls=2, quota_error_rate=quota_error_rate, seed=7)
+    client = GeminiClient(
+        sdk, FakeGeminiModel(sdk, latency=0.02), "prompt",
+        max_concurrency=8, company_concurrency=4, max_retries=4,
+        retry_base_delay=0.05, retry_max_delay=0.5, poll_initial_delay=0.01,
+        breaker=CircuitBreaker(threshold=10, reset_timeout=0.5),
+    )
+    outcomes = Counter()
+
+    async def one(i: int):
+        try:
+            await client.analyze("receipt.png", "image/png", company_id=f"company-{i % 10}")
+            outcomes["COMPLETED"] += 1
+        except AnalyzerError as e:
+            outcomes[e.status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(documents)))
+    elapsed = time.perf_counter() - start
+    return {"outcomes": dict(outcomes), "seconds": elapsed, "ok_per_s": outcomes["COMPLETED"] / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'quota 429':>10} {'durée':>8} {'réussis/s':>10}  issues")
+    for rate in QUOTA_RATES:
+        result = asyncio.run(run(args.documents, rate))
+        print(f"{rate:>10.0%} {result['seconds']:>7.2f}s {result['ok_per_s']:>10.1f}  {result['outcomes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark du Moteur 3 : boucle ligne à ligne historique vs registre des
+mouvements (création des articles inconnus + insertion des mouvements).
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_inventory
+"""
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+from inventory import process_inventory_updates
+
+LINE_COUNTS = (10, 100, 1000)
+CATALOG_SIZE = 5000  # articles déjà en stock pour la société
+
+
+def legacy_inventory_updates(db, company_id, ai_data):
+    # Version d'origine : un SELECT ... .first() puis lecture-modification-écriture par ligne
+    for item in ai_data.get("line_items", []):
+        p_name = item.get("name")
+        p_qty = item.get("quantity", 0)
+        if p_qty > 0 and p_name:
+            existing_item = db.query(models.InventoryItem).filter(
+                models.InventoryItem.company_id == company_id,
+                models.InventoryItem.product_name == p_name
+            ).first()
+            if existing_item:
+                existing_item.quantity_on_hand += p_qty
+                existing_item.unit_price = item.get("unit_price", 0.0)
+            else:
+                db.add(models.InventoryItem(
+                    company_id=company_id, product_name=p_name, sku=item.get("sku"),
+                    quantity_on_hand=p_qty, unit_price=item.get("unit_price", 0.0), low_stock_threshold=5
+                ))
+
+
+def make_invoice(lines: int) -> dict:
+    # Moitié de produits déjà connus, moitié de nouveaux (création de l'article)
+    items = []
+    for i in range(lines):
+        name = f"Produit {i}" if i % 2 == 0 else f"Nouveau {uuid.uuid4().hex[:10]}"
+        items.append({"name": name, "sku": f"SKU-{i}", "quantity": 3, "unit_price": 12.5})
+    return {"line_items": items}
+
+
+def setup_database(path: Path, legacy: bool = False):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    company = models.Company(name="Bench Ltd")
+    db.add(company)
+    db.flush()
+    db.bulk_insert_mappings(models.InventoryItem, [
+        {"id": models.generate_uuid(), "company_id": company.id, "product_name": f"Produit {i}",
+         "sku": f"SKU-{i}", "quantity_on_hand": 10, "unit_price": 10.0, "low_stock_threshold": 5}
+        for i in range(CATALOG_SIZE)
+    ])
+    if legacy:
+        # Schéma d'avant la migration : aucun index sur (company_id, product_name)
+        db.execute(text("DROP INDEX ux_inventory_items_company_product"))
+    db.commit()
+    return engine, db, company.id
+
+
+def timed(func, db, company_id, lines, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        invoice = make_invoice(lines)
+        start = time.perf_counter()
+        func(db, company_id, invoice)
+        db.commit()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'lignes':>8} {'ligne à ligne':>15} {'registre':>10} {'gain':>7}")
+    for lines in LINE_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine, db, company_id = setup_database(Path(tmp) / "legacy.db", legacy=True)
+            legacy = timed(legacy_inventory_updates, db, company_id, lines)
+            db.close()
+            engine.dispose()
+
+            engine, db, company_id = setup_database(Path(tmp) / "ledger.db")
+            ledger = timed(process_inventory_updates, db, company_id, lines)
+            db.close()
+            engine.dispose()
+
+        print(f"{lines:>8} {legacy * 1000:>13.1f}ms {ledger * 1000:>8.1f}ms {legacy / ledger:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
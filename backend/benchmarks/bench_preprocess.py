@@ -0,0 +1,193 @@
+"""
+Benchmark de bout en bout du scan (POST /api/aura/scan -> job COMPLETED),
+sans puis avec le prétraitement des documents (preprocess.py).
+
+L'API tourne dans le processus (httpx.ASGITransport) avec le faux Gemini,
+dont l'envoi et l'analyse coûtent en plus un temps proportionnel à la taille
+du fichier (AURA_FAKE_UPLOAD_SECONDS_PER_MB, AURA_FAKE_GENERATE_SECONDS_PER_MB) :
+c'est ce coût que le prétraitement réduit. Documents générés (Pillow) :
+    photo   photo de téléphone 12 MP (4032x3024) avec EXIF et GPS
+    capture capture d'écran PNG 1170x2532
+    pdf     PDF scanné de --pdf-pages pages A4 à 300 dpi
+Un fichier tronqué vérifie en plus son refus par le job (REJECTED, sans appel à Gemini).
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_preprocess --runs 5 --output preprocess.json
+    AURA_FAKE_UPLOAD_SECONDS_PER_MB=2 python -m benchmarks.bench_preprocess   # liaison plus lente
+
+Dépendances de développement : httpx, Pillow.
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from benchmarks.suite import summarize
+
+JOB_DONE = {"COMPLETED", "FAILED", "AI_UNAVAILABLE", "REJECTED"}
+
+
+def receipt_image(rng: random.Random, size: tuple, grain: int = 5):
+    """Ticket photographié : fond papier bruité (1/grain), lignes de texte sombres."""
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    noise = Image.frombytes("L", size, rng.randbytes(width * height)).point(lambda v: 200 + v // grain)
+    image = Image.merge("RGB", (noise, noise, noise.point(lambda v: v - 10)))
+    draw = ImageDraw.Draw(image)
+    line = max(12, height // 60)
+    for y in range(line * 3, height - line * 3, line * 2):
+        draw.rectangle((width // 10, y, width // 10 + rng.randint(width // 4, width * 3 // 4), y + line // 2),
+                       fill=(40, 40, 40))
+    return image
+
+
+def make_corpus(rng: random.Random, pdf_pages: int) -> dict:
+    from PIL import Image
+
+    photo = receipt_image(rng, (4032, 3024))
+    exif = Image.Exif()
+    exif[0x010F], exif[0x0110], exif[0x0112] = "Apple", "iPhone 15 Pro", 6  # fabricant, modèle, orientation
+    exif.get_ifd(0x8825).update({1: "N", 2: (25.0, 11.0, 50.0), 3: "E", 4: (55.0, 16.0, 30.0)})  # GPS Dubaï
+    buffer = io.BytesIO()
+    photo.save(buffer, "JPEG", quality=92, exif=exif)
+    corpus = {"photo": (buffer.getvalue(), "image/jpeg", "photo.jpg")}
+
+    buffer = io.BytesIO()
+    receipt_image(rng, (1170, 2532)).save(buffer, "PNG")
+    corpus["capture"] = (buffer.getvalue(), "image/png", "capture.png")
+
+    buffer = io.BytesIO()
+    pages = [receipt_image(rng, (2480, 3508), grain=24) for _ in range(pdf_pages)]  # scanner : moins de grain
+    pages[0].save(buffer, "PDF", resolution=300, save_all=True, append_images=pages[1:], quality=85)
+    corpus["pdf"] = (buffer.getvalue(), "application/pdf", "facture.pdf")
+    return corpus
+
+
+def unique(payload: bytes) -> bytes:
+    # Octets ajoutés après la fin du fichier (ignorés par les décodeurs) : pas de hit du cache d'analyse
+    return payload + b"\n%" + uuid.uuid4().hex.encode()
+
+
+async def scan(client, user_id: str, payload: bytes, mime: str, filename: str, poll: float):
+    start = time.perf_counter()
+    r = await client.post(f"/api/aura/scan/{user_id}", files={"file": (filename, payload, mime)})
+    accepted = time.perf_counter() - start
+    if r.status_code != 202:
+        return r.status_code, accepted, None
+    while True:
+        await asyncio.sleep(poll)
+        job = (await client.get(r.json()["status_url"])).json()
+        if job["status"] in JOB_DONE:
+            return job["status"], accepted, time.perf_counter() - start
+
+
+async def run(args) -> dict:
+    import main
+    from preprocess import prepared_path
+
+    rng = random.Random(args.seed)
+    corpus = make_corpus(rng, args.pdf_pages)
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test", timeout=300) as client:
+            r = await client.post("/auth/register", json={
+                "email": f"preprocess-{uuid.uuid4().hex[:8]}@example.com", "password": "bench-preprocess",
+                "full_name": "Bench Preprocess",
+            })
+            r.raise_for_status()
+            user_id = r.json()["user_id"]
+
+            for mode, enabled in (("avant", False), ("après", True)):
+                main.preprocessor.enabled = enabled
+                for kind, (payload, mime, filename) in corpus.items():
+                    end_to_end, accepted, sent = [], [], []
+                    for _ in range(args.warmup + args.runs):
+                        body = unique(payload)
+                        status, accept_s, total_s = await scan(client, user_id, body, mime, filename, args.poll)
+                        if status != "COMPLETED":
+                            raise RuntimeError(f"{mode}/{kind} : scan en échec ({status})")
+                        end_to_end.append(total_s)
+                        accepted.append(accept_s)
+                        prepared = Path(prepared_path(str(main.blob_storage.blob_path(hashlib.sha256(body).hexdigest()))))
+                        sent.append(prepared.stat().st_size if enabled else len(body))
+                    warm = slice(args.warmup, None)
+                    results.setdefault(kind, {})[mode] = {
+                        "end_to_end": summarize(end_to_end[warm]),
+                        "accepted": summarize(accepted[warm]),
+                        "bytes_in": len(payload),
+                        "bytes_sent": int(sum(sent[warm]) / len(sent[warm])),
+                    }
+
+            # Fichier tronqué : en-tête JPEG valide (202), refusé par le prétraitement du job
+            payload, mime, filename = corpus["photo"]
+            status, accept_s, total_s = await scan(client, user_id, unique(payload[: len(payload) // 3]), mime,
+                                                   "tronque.jpg", args.poll)
+            results["corrupt"] = {
+                "status": status,
+                "accepted_ms": round(accept_s * 1000, 2),
+                "end_to_end_ms": round(total_s * 1000, 2) if total_s is not None else None,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="scans mesurés par document et par mode")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--pdf-pages", type=int, default=8)
+    parser.add_argument("--poll", type=float, default=0.02, help="intervalle de suivi du job (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="fichier JSON des résultats (sinon stdout)")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="aura-preprocess-"))
+    os.environ.setdefault("AURA_DATABASE_URL", f"sqlite:///{tmp / 'main.db'}")
+    os.environ.setdefault("AURA_UPLOAD_DIR", str(tmp / "uploads"))
+    os.environ.setdefault("AURA_AUTO_MIGRATE", "1")
+    os.environ.setdefault("AURA_ANALYZER", "fake")
+    os.environ.setdefault("AURA_FAKE_UPLOAD_LATENCY", "0.05")
+    os.environ.setdefault("AURA_FAKE_GENERATE_LATENCY", "0.5")
+    os.environ.setdefault("AURA_FAKE_PROCESSING_POLLS", "0")
+    os.environ.setdefault("AURA_FAKE_UPLOAD_SECONDS_PER_MB", "0.8")  # ~10 Mbit/s montants
+    os.environ.setdefault("AURA_FAKE_GENERATE_SECONDS_PER_MB", "0.3")
+    os.environ.setdefault("AURA_RATE_LIMIT_SCAN_IP", "0")
+    os.environ.setdefault("AURA_RATE_LIMIT_SCAN_USER", "0")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args))
+
+    print("\n[scan de bout en bout, médianes]", file=sys.stderr)
+    for kind, modes in results.items():
+        if kind == "corrupt":
+            continue
+        before, after = modes["avant"], modes["après"]
+        speedup = before["end_to_end"]["median_ms"] / after["end_to_end"]["median_ms"]
+        print(f"  {kind:<8} {before['end_to_end']['median_ms']:>8.0f} ms -> {after['end_to_end']['median_ms']:>8.0f} ms"
+              f"   x{speedup:>4.1f}   {before['bytes_sent']:>9} -> {after['bytes_sent']:>8} octets envoyés"
+              f"   (202 en {after['accepted']['median_ms']:.0f} ms)", file=sys.stderr)
+    corrupt = results["corrupt"]
+    print(f"  tronqué  {corrupt['status']} en {corrupt['end_to_end_ms']} ms (202 en {corrupt['accepted_ms']} ms)",
+          file=sys.stderr)
+
+    payload = json.dumps({"meta": vars(args), "results": results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
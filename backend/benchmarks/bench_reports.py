@@ -0,0 +1,103 @@
+"""
+Benchmark du moteur de déclarations : boucle ORM ligne à ligne vs agrégation NumPy par lots.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_reports [--rows 1000000]
+"""
+import argparse
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import models
+from reports import compute_tax_report
+
+YEAR = 2025
+INSERT_BATCH = 50_000
+
+
+def populate(db, company_id: str, rows: int):
+    rng = random.Random(42)
+    start = datetime(YEAR, 1, 1)
+    for offset in range(0, rows, INSERT_BATCH):
+        batch = []
+        for i in range(offset, min(offset + INSERT_BATCH, rows)):
+            total = round(rng.uniform(5, 5000), 2)
+            batch.append({
+                "id": f"tx-{i:09d}",
+                "company_id": company_id,
+                "date": start + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                "amount_total": total,
+                "amount_tax": round(total * 0.05 / 1.05, 2),
+                "category": "Inventory",
+                "is_tax_deductible": rng.random() < 0.7,
+            })
+        db.execute(insert(models.Transaction), batch)
+    db.commit()
+
+
+def naive_report(db, company_id: str):
+    # Référence : chaque écriture chargée en objet ORM puis agrégée en Python
+    quarters = {}
+    rows = db.query(models.Transaction).filter(
+        models.Transaction.company_id == company_id,
+        models.Transaction.date >= datetime(YEAR, 1, 1),
+        models.Transaction.date < datetime(YEAR + 1, 1, 1),
+    ).all()
+    for tx in rows:
+        q = quarters.setdefault((tx.date.month - 1) // 3, {"input_vat": 0.0, "recoverable_vat": 0.0})
+        q["input_vat"] += tx.amount_tax or 0.0
+        if tx.is_tax_deductible:
+            q["recoverable_vat"] += tx.amount_tax or 0.0
+    return quarters
+
+
+def measure(func, *args):
+    # Croissance du pic RSS du processus : mesurer le moteur le plus sobre en premier
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result, elapsed, (rss_after - rss_before) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        company = models.Company(name="Bench Ltd")
+        db.add(company)
+        db.commit()
+
+        print(f"Génération de {args.rows:,} transactions...")
+        populate(db, company.id, args.rows)
+
+        report, vec_time, vec_mem = measure(compute_tax_report, db, company.id, YEAR)
+        db.expunge_all()
+        naive, naive_time, naive_mem = measure(naive_report, db, company.id)
+        db.close()
+        engine.dispose()
+
+    for q, values in sorted(naive.items()):
+        assert abs(values["input_vat"] - report["vat_returns"][q]["input_vat"]) < 1.0
+
+    print(f"{'moteur':<12} {'temps':>10} {'RSS en plus':>14}")
+    print(f"{'ORM naïf':<12} {naive_time:>9.2f}s {naive_mem:>12.1f}Mo")
+    print(f"{'NumPy':<12} {vec_time:>9.2f}s {vec_mem:>12.1f}Mo")
+    print(f"gain : {naive_time / vec_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
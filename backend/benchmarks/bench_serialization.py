@@ -0,0 +1,148 @@
+"""
+Benchmark de la sérialisation de l'inventaire (GET /api/aura/inventory) :
+ancien chemin (objets ORM complets -> jsonable_encoder -> JSONResponse)
+contre colonnes projetées -> orjson, en objets (records) ou en colonnes
+(columnar).
+
+Deux mesures par variante, sur un stock de --items articles (SQLite) :
+    serialize   sérialisation seule, lignes déjà chargées
+    route       requête + sérialisation (route get_inventory appelée directement)
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_serialization --items 10000 --output serialization.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.datagen import BENCH_USER_ID
+from benchmarks.suite import measure, measure_async
+
+COMPANY_ID = "bench-company-serialization"
+
+
+def seed_inventory(engine, items: int):
+    import models
+    from sqlalchemy.orm import Session
+
+    with Session(engine) as db:
+        db.add(models.User(id=BENCH_USER_ID, email="serialization@example.com", password_hash="-"))
+        db.add(models.Company(id=COMPANY_ID, owner_id=BENCH_USER_ID, name="Bench Serialization LLC"))
+        db.add_all(
+            models.InventoryItem(company_id=COMPANY_ID, product_name=f"Produit {i}", sku=f"SKU-{i:06d}",
+                                 quantity_on_hand=i % 250 + 1, unit_price=round(5 + i * 0.37, 2),
+                                 low_stock_threshold=5)
+            for i in range(items)
+        )
+        db.commit()
+
+
+async def run(url: str, runs: int) -> dict:
+    import main
+    import models
+    from database import build_async_engine
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from schemas import InventoryItemOut, FastJSONResponse, as_columns, as_records, columns_for
+    from sqlalchemy import desc, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = build_async_engine(url)
+    AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    def legacy_query():
+        # Requête d'origine : entités ORM complètes
+        return select(models.InventoryItem)\
+            .where(models.InventoryItem.company_id == COMPANY_ID)\
+            .where(models.InventoryItem.quantity_on_hand > 0)\
+            .order_by(desc(models.InventoryItem.quantity_on_hand))
+
+    async with AsyncSession() as db:
+        objects = (await db.execute(legacy_query())).scalars().all()
+        rows = (await db.execute(
+            select(*columns_for(models.InventoryItem, InventoryItemOut))
+            .where(models.InventoryItem.company_id == COMPANY_ID)
+            .where(models.InventoryItem.quantity_on_hand > 0)
+            .order_by(desc(models.InventoryItem.quantity_on_hand))
+        )).all()
+
+    payloads = {
+        "legacy": lambda: JSONResponse(jsonable_encoder(objects)).body,
+        "records": lambda: FastJSONResponse(as_records(rows, InventoryItemOut)).body,
+        "columnar": lambda: FastJSONResponse(as_columns(rows, InventoryItemOut)).body,
+    }
+    results = {"serialize": {}, "route": {}, "bytes": {}}
+    for name, render in payloads.items():
+        results["serialize"][name] = measure(render, runs)
+        results["bytes"][name] = len(render())
+
+    async def legacy_route():
+        async with AsyncSession() as db:
+            items = (await db.execute(legacy_query())).scalars().all()
+            JSONResponse(jsonable_encoder(items)).body
+
+    def route(fmt):
+        async def call():
+            async with AsyncSession() as db:
+                await main.get_inventory(BENCH_USER_ID, format=fmt, db=db)
+        return call
+
+    results["route"]["legacy"] = await measure_async(legacy_route, runs)
+    results["route"]["records"] = await measure_async(route("records"), runs)
+    results["route"]["columnar"] = await measure_async(route("columnar"), runs)
+
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10_000, help="articles en stock")
+    parser.add_argument("--runs", type=int, default=10, help="mesures par variante")
+    parser.add_argument("--output", help="fichier JSON des résultats (sinon stdout)")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="aura-serialization-"))
+    url = f"sqlite:///{tmp / 'inventory.db'}"
+    os.environ.setdefault("AURA_DATABASE_URL", f"sqlite:///{tmp / 'main.db'}")
+    os.environ.setdefault("AURA_UPLOAD_DIR", str(tmp / "uploads"))
+    os.environ.setdefault("AURA_ANALYZER", "simulation")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as app_main  # noqa: F401  (environnement temporaire déjà en place)
+        from database import build_engine
+        from migrations import upgrade
+
+        engine = build_engine(url)
+        upgrade(engine)
+        seed_inventory(engine, args.items)
+        engine.dispose()
+        results = asyncio.run(run(url, args.runs))
+
+    report = {"meta": {"items": args.items, "runs": args.runs}, "results": results}
+    legacy = results["serialize"]["legacy"]["median_ms"]
+    print(f"\n[inventaire de {args.items} articles]", file=sys.stderr)
+    for stage in ("serialize", "route"):
+        for name, stats in results[stage].items():
+            speedup = results[stage]["legacy"]["median_ms"] / stats["median_ms"] if stats["median_ms"] else 0
+            print(f"  {stage:<10} {name:<9} médiane {stats['median_ms']:>9.2f} ms   x{speedup:>6.1f}"
+                  f"   {results['bytes'][name]:>9} octets", file=sys.stderr)
+    report["speedup_serialize"] = {
+        name: round(legacy / stats["median_ms"], 1) for name, stats in results["serialize"].items()
+    }
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
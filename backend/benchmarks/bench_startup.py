@@ -0,0 +1,145 @@
+"""
+Benchmark du démarrage à froid d'un worker API : ce que paie chaque réplica
+ajouté pendant un pic de trafic avant de servir sa première requête.
+
+Chaque essai tourne dans un processus Python neuf (aucun module en cache) :
+    import_ms          import de main
+    ready_ms           fin du démarrage du lifespan (le worker accepte les requêtes)
+    first_request_ms   première réponse de GET / (sonde de santé)
+    analyzer_ready_ms  client Gemini prêt (préchauffé en fond, ou construit à la demande)
+    bcrypt_ready_ms    processus bcrypt démarrés et contexte chargé
+    process_ms         lancement du processus compris (interpréteur + tout le reste)
+Temps mesurés depuis le début de l'import de main, sauf process_ms.
+La migration du schéma (python migrations.py) est mesurée à part, une fois.
+
+Le backend Gemini réel est initialisé (import et configuration du SDK, modèle)
+avec une clé factice : aucun appel réseau n'a lieu au démarrage.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --runs 10 --no-warm --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+CHILD = r"""
+import asyncio, contextlib, io, json, time
+import httpx
+
+logs = io.StringIO()
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(logs):
+    import main
+t_import = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        t_ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test") as client:
+            (await client.get("/")).raise_for_status()
+        t_first = time.perf_counter()
+        mode_ia, _ = await main.analyzer.aget()
+        t_analyzer = time.perf_counter()
+        await main.password_hasher.warm()
+        t_bcrypt = time.perf_counter()
+    return mode_ia, t_ready, t_first, t_analyzer, t_bcrypt
+
+with contextlib.redirect_stdout(logs):
+    mode_ia, t_ready, t_first, t_analyzer, t_bcrypt = asyncio.run(boot())
+print(json.dumps({
+    "ai_engine": mode_ia,
+    "import_ms": (t_import - t0) * 1000,
+    "ready_ms": (t_ready - t0) * 1000,
+    "first_request_ms": (t_first - t0) * 1000,
+    "analyzer_ready_ms": (t_analyzer - t0) * 1000,
+    "bcrypt_ready_ms": (t_bcrypt - t0) * 1000,
+}))
+"""
+
+METRICS = ("import_ms", "ready_ms", "first_request_ms", "analyzer_ready_ms", "bcrypt_ready_ms", "process_ms")
+
+
+def child_env(tmp: Path, warm: bool) -> dict:
+    env = dict(os.environ)
+    env.setdefault("AURA_ANALYZER", "gemini")
+    env.setdefault("GOOGLE_API_KEY", "bench-startup-key")
+    env["AURA_DATABASE_URL"] = f"sqlite:///{tmp / 'startup.db'}"
+    env["AURA_UPLOAD_DIR"] = str(tmp / "uploads")
+    env["AURA_AUTO_MIGRATE"] = "0"
+    env["AURA_WARM_START"] = "1" if warm else "0"
+    return env
+
+
+def run_once(env: dict) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise SystemExit(f"❌ Démarrage en échec :\n{proc.stderr}")
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = elapsed * 1000
+    return sample
+
+
+def summarize(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "median_ms": round(statistics.median(values), 2),
+        "min_ms": round(values[0], 2),
+        "max_ms": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="processus lancés")
+    parser.add_argument("--no-warm", dest="warm", action="store_false",
+                        help="pas de préchauffage (AURA_WARM_START=0) : tout au premier usage")
+    parser.add_argument("--output", help="fichier JSON des résultats (sinon stdout)")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="aura-startup-"))
+    env = child_env(tmp, args.warm)
+
+    # Étape de déploiement explicite, hors du démarrage des workers
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "migrations.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+    migrate_ms = (time.perf_counter() - start) * 1000
+
+    run_once(env)  # premier lancement : caches disque (.pyc) chauds pour tous les essais
+    samples = [run_once(env) for _ in range(args.runs)]
+
+    report = {
+        "meta": {"runs": args.runs, "warm_start": args.warm, "ai_engine": samples[0]["ai_engine"],
+                 "python": sys.version.split()[0]},
+        "migrate_ms": round(migrate_ms, 2),
+        "results": {name: summarize([s[name] for s in samples]) for name in METRICS},
+    }
+
+    print(f"\n[démarrage à froid, {args.runs} processus, préchauffage {'oui' if args.warm else 'non'}, "
+          f"moteur {report['meta']['ai_engine']}]", file=sys.stderr)
+    for name, stats in report["results"].items():
+        print(f"  {name:<20} médiane {stats['median_ms']:>9.1f} ms   min {stats['min_ms']:>9.1f}   "
+              f"max {stats['max_ms']:>9.1f}", file=sys.stderr)
+    print(f"  {'migrations.py':<20} {migrate_ms:>17.1f} ms (une fois, avant les workers)", file=sys.stderr)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
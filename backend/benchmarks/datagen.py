@@ -0,0 +1,199 @@
+"""
+Générateur de données déterministe pour les benchmarks : remplit tout le schéma
+de models.py (User, Profile, Company, Transaction, FinancialDocument,
+AuraMemory, InventoryItem, FixedAsset) de 1k à 10M écritures.
+
+L'échelle est le nombre de transactions ; les autres tables suivent :
+une société pour 10 000 écritures, un article de stock pour 10, une
+immobilisation pour 100, un document + Black Box pour 10. La société de
+référence (BENCH_USER_ID) porte HOT_SHARE de toutes les lignes, pour que
+les requêtes par société grossissent avec l'échelle.
+
+Usage (depuis backend/) :
+    python -m benchmarks.datagen --scale 1M --output /tmp/aura-1M.db [--seed 42]
+"""
+import argparse
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta
+
+from passlib.hash import bcrypt
+from sqlalchemy import insert
+
+import models
+from database import build_engine
+from migrations import upgrade
+
+BENCH_USER_ID = "bench-user-00000"
+BENCH_EMAIL = "bench-00000@example.com"
+BENCH_PASSWORD = "aura-bench-password"
+HOT_SHARE = 0.2
+ROWS_PER_COMPANY = 10_000
+INSERT_BATCH = 20_000
+START_DATE = datetime(2024, 1, 1)
+DATE_SPAN_MINUTES = 2 * 365 * 24 * 60
+
+CATEGORIES = [
+    ("Inventory", True), ("Electronics", True), ("Office Supplies", True), ("Travel", True),
+    ("Fuel", True), ("Groceries", False), ("Meals & Entertainment", False),
+]
+MERCHANTS = [
+    "Sharaf DG", "Carrefour", "ENOC", "Office Depot", "Emirates Airlines", "Nando's JBR",
+    "Dubai Duty Free", "Ace Hardware", "Virgin Megastore", "Lulu Hypermarket",
+]
+ASSETS = [("MacBook Pro", 3), ("Toyota Hiace", 5), ("Mobilier de bureau", 7), ("Serveur Dell", 4)]
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(value[-1], 1)
+    return int(float(value.rstrip("km")) * factor)
+
+
+def format_scale(rows: int) -> str:
+    if rows >= 1_000_000 and rows % 1_000_000 == 0:
+        return f"{rows // 1_000_000}M"
+    if rows >= 1_000 and rows % 1_000 == 0:
+        return f"{rows // 1_000}k"
+    return str(rows)
+
+
+class DatasetGenerator:
+    def __init__(self, scale: int, seed: int = 42):
+        self.scale = scale
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.company_count = max(1, scale // ROWS_PER_COMPANY)
+        self.company_ids = [f"bench-company-{i:05d}" for i in range(self.company_count)]
+
+    def pick_company(self) -> str:
+        # La société 0 reçoit HOT_SHARE des lignes, les autres se partagent le reste
+        if self.company_count == 1 or self.rng.random() < HOT_SHARE:
+            return self.company_ids[0]
+        return self.company_ids[self.rng.randrange(1, self.company_count)]
+
+    def users(self, password_hash: str):
+        for i in range(self.company_count):
+            user_id = f"bench-user-{i:05d}"
+            yield models.User, {"id": user_id, "email": f"bench-{i:05d}@example.com", "password_hash": password_hash}
+            yield models.Profile, {"id": user_id, "full_name": f"Bench User {i}"}
+            yield models.Company, {
+                "id": self.company_ids[i], "owner_id": user_id, "name": f"Bench {i} Global Ltd",
+                "is_free_zone": True, "base_currency": "AED",
+            }
+
+    def transactions(self):
+        for i in range(self.scale):
+            company_id = self.pick_company()
+            category, deductible = self.rng.choice(CATEGORIES)
+            date = START_DATE + timedelta(minutes=self.rng.randrange(DATE_SPAN_MINUTES))
+            total = round(self.rng.lognormvariate(5, 1.2), 2)
+            document_id = None
+
+            # Un document sur 10 a son fichier et sa trace Black Box
+            if i % 10 == 0:
+                document_id = f"bench-doc-{i:010d}"
+                yield models.FinancialDocument, {
+                    "id": document_id, "company_id": company_id, "filename": f"receipt-{i}.png",
+                    "file_path": f"uploads/blobs/bench/{i}", "file_type": "image/png",
+                    "content_hash": hashlib.sha256(f"{self.seed}:{i}".encode()).hexdigest(),
+                    "status": "COMPLETED",
+                }
+                yield models.AuraMemory, {
+                    "document_id": document_id, "raw_text_input": f"Scan receipt-{i}.png",
+                    "ai_json_output": {"total": total, "category": category, "is_deductible": deductible},
+                }
+
+            yield models.Transaction, {
+                "id": f"bench-tx-{i:010d}", "company_id": company_id, "document_id": document_id,
+                "entry_number": f"J-{date.year}-{i:08X}", "date": date,
+                "merchant_name": self.rng.choice(MERCHANTS), "description": f"Achat {category}",
+                "amount_total": total, "amount_tax": round(total * 0.05 / 1.05, 2), "currency": "AED",
+                "category": category, "is_tax_deductible": deductible,
+            }
+
+    def inventory(self):
+        # Noms uniques par société (index unique company_id, product_name)
+        counters = {}
+        for _ in range(max(100, self.scale // 10)):
+            company_id = self.pick_company()
+            n = counters[company_id] = counters.get(company_id, 0) + 1
+            yield models.InventoryItem, {
+                "id": f"bench-item-{company_id[-5:]}-{n:08d}", "company_id": company_id,
+                "product_name": f"Produit {n}", "sku": f"SKU-{n}",
+                "quantity_on_hand": self.rng.randint(0, 500), "unit_price": round(self.rng.uniform(1, 2000), 2),
+                "low_stock_threshold": 5,
+            }
+
+    def fixed_assets(self):
+        for i in range(max(10, self.scale // 100)):
+            name, years = self.rng.choice(ASSETS)
+            price = round(self.rng.uniform(2_000, 150_000), 2)
+            yield models.FixedAsset, {
+                "id": f"bench-asset-{i:09d}", "company_id": self.pick_company(), "asset_name": name,
+                "purchase_date": START_DATE + timedelta(days=self.rng.randrange(730)),
+                "purchase_price": price, "lifespan_years": years, "current_value": price,
+                "depreciation_method": "declining_balance" if i % 3 == 0 else "straight_line",
+            }
+
+
+def write_rows(engine, rows) -> dict:
+    """Insère un flux (modèle, ligne) par lots, un INSERT multi-lignes par table."""
+    counts = {}
+    batches = {}
+    pending = 0
+
+    def flush():
+        with engine.begin() as conn:
+            # Ordre des tables = ordre des clés étrangères
+            for table in models.Base.metadata.sorted_tables:
+                batch = batches.pop(table.name, None)
+                if batch:
+                    conn.execute(insert(table), batch)
+
+    for model, row in rows:
+        batches.setdefault(model.__tablename__, []).append(row)
+        counts[model.__tablename__] = counts.get(model.__tablename__, 0) + 1
+        pending += 1
+        if pending >= INSERT_BATCH:
+            flush()
+            pending = 0
+    flush()
+    return counts
+
+
+def generate(url: str, scale: int, seed: int = 42, password_hash: str = None) -> dict:
+    """Crée le schéma sur url et le remplit. Retourne le nombre de lignes par table."""
+    engine = build_engine(url)
+    upgrade(engine)
+    generator = DatasetGenerator(scale, seed)
+    password_hash = password_hash or bcrypt.hash(BENCH_PASSWORD)
+
+    counts = {}
+    for stream in (generator.users(password_hash), generator.transactions(),
+                   generator.inventory(), generator.fixed_assets()):
+        for table, n in write_rows(engine, stream).items():
+            counts[table] = counts.get(table, 0) + n
+    engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", default="100k", help="nombre de transactions (1k, 100k, 1M, 10M...)")
+    parser.add_argument("--output", required=True, help="fichier SQLite ou URL SQLAlchemy")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    url = args.output if "://" in args.output else f"sqlite:///{args.output}"
+    start = time.perf_counter()
+    counts = generate(url, parse_scale(args.scale), args.seed)
+    elapsed = time.perf_counter() - start
+    for table, n in counts.items():
+        print(f"{table:<22} {n:>12,}")
+    print(f"{sum(counts.values()):,} lignes en {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
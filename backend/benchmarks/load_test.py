@@ -0,0 +1,231 @@
+"""
+Test de charge de bout en bout, entièrement hors ligne : scan, tableau de bord
+et inventaire à débit cible (boucle ouverte), latences p50/p95/p99 et débit.
+
+Par défaut l'API tourne dans le processus (httpx.ASGITransport) avec le faux
+Gemini local (AURA_ANALYZER=fake), une base SQLite et un dossier d'uploads
+temporaires. Les réglages AURA_FAKE_* (latences, erreurs, articles) et
+AURA_GEMINI_* s'appliquent tels quels.
+
+Usage (depuis backend/) :
+    python -m benchmarks.load_test --rps 50 --duration 30
+    python -m benchmarks.load_test --mix scan=1,dashboard=3,inventory=3 --duplicate-ratio 0.2
+    python -m benchmarks.load_test --mix login=5,dashboard=3 --rps 60    # rafale de connexions (bcrypt)
+    AURA_FAKE_GENERATE_LATENCY=uniform:2:6 AURA_FAKE_QUOTA_ERROR_RATE=0.1 python -m benchmarks.load_test
+    python -m benchmarks.load_test --url http://localhost:8000    # serveur déjà lancé (AURA_ANALYZER=fake)
+
+Dépendance de développement : httpx.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from collections import Counter, defaultdict
+
+import httpx
+
+JOB_DONE = {"COMPLETED", "FAILED", "AI_UNAVAILABLE", "REJECTED"}
+
+
+def random_png(rng: random.Random, size: int) -> bytes:
+    """PNG valide d'environ size octets (pixels aléatoires, incompressibles)."""
+    width = 256
+    height = max(1, size // (width * 3))
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        route, weight = part.split("=")
+        if route not in ("scan", "dashboard", "inventory", "login"):
+            raise ValueError(f"Route inconnue dans --mix : {route}")
+        mix[route] = float(weight)
+    return mix
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies = defaultdict(list)  # route -> secondes
+        self.statuses = defaultdict(Counter)  # route -> code HTTP
+        self.job_latencies = []
+        self.job_outcomes = Counter()
+        self.sent_payloads = []
+        self.user_id = None
+        self.email = None
+
+    async def setup(self):
+        email = self.email = f"load-{uuid.uuid4().hex[:8]}@example.com"
+        r = await self.client.post("/auth/register", json={
+            "email": email, "password": "load-test", "full_name": "Load Test"
+        })
+        r.raise_for_status()
+        self.user_id = r.json()["user_id"]
+
+    def receipt_bytes(self) -> bytes:
+        # Contenu unique (pas de hit de cache), sauf la part de doublons demandée
+        if self.sent_payloads and self.rng.random() < self.args.duplicate_ratio:
+            return self.rng.choice(self.sent_payloads)
+        # Vraie image : un fichier illisible serait refusé par le prétraitement (422)
+        payload = random_png(self.rng, self.args.file_size)
+        self.sent_payloads.append(payload)
+        return payload
+
+    async def timed(self, route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            r = await self.client.request(method, url, **kwargs)
+            code = r.status_code
+        except httpx.HTTPError as e:
+            r, code = None, type(e).__name__
+        self.latencies[route].append(time.perf_counter() - start)
+        self.statuses[route][code] += 1
+        return r
+
+    async def scan(self):
+        start = time.perf_counter()
+        files = {"file": (f"receipt-{uuid.uuid4().hex[:8]}.png", self.receipt_bytes(), "image/png")}
+        r = await self.timed("scan", "POST", f"/api/aura/scan/{self.user_id}", files=files)
+        if r is None or r.status_code != 202 or not self.args.track_jobs:
+            return
+
+        # Latence de bout en bout : dépôt -> job terminé
+        status_url = r.json()["status_url"]
+        deadline = start + self.args.job_timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.poll_interval)
+            job = (await self.client.get(status_url)).json()
+            if job["status"] in JOB_DONE:
+                self.job_outcomes[job["status"]] += 1
+                self.job_latencies.append(time.perf_counter() - start)
+                return
+        self.job_outcomes["TIMEOUT"] += 1
+
+    async def dashboard(self):
+        await self.timed("dashboard", "GET", f"/api/aura/dashboard/{self.user_id}")
+
+    async def login(self):
+        await self.timed("login", "POST", "/auth/login", json={"email": self.email, "password": "load-test"})
+
+    async def inventory(self):
+        await self.timed("inventory", "GET", f"/api/aura/inventory/{self.user_id}")
+
+    async def run(self) -> float:
+        # Boucle ouverte : les requêtes partent à l'heure prévue, même si le serveur
+        # ralentit (pas d'omission coordonnée comme avec N clients en boucle fermée)
+        mix = parse_mix(self.args.mix)
+        routes, weights = list(mix), list(mix.values())
+        interval = 1 / self.args.rps
+        total = int(self.args.rps * self.args.duration)
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            route = self.rng.choices(routes, weights)[0]
+            tasks.append(asyncio.create_task(getattr(self, route)()))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float):
+        print(f"\n{'route':<12} {'requêtes':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  codes")
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            codes = ", ".join(f"{code}: {n}" for code, n in sorted(self.statuses[route].items(), key=str))
+            print(f"{route:<12} {len(values):>9} {len(values) / elapsed:>8.1f} "
+                  f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+                  f"{percentile(values, 99) * 1000:>9.1f}  {codes}")
+
+        if self.job_latencies or self.job_outcomes:
+            values = sorted(self.job_latencies)
+            print(f"{'scan (job)':<12} {len(values):>9} {len(values) / elapsed:>8.1f} "
+                  f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+                  f"{percentile(values, 99) * 1000:>9.1f}  {dict(self.job_outcomes)}")
+
+        sent = sum(len(v) for v in self.latencies.values())
+        print(f"\nDurée {elapsed:.1f}s, {sent} requêtes, débit {sent / elapsed:.1f} req/s "
+              f"(cible {self.args.rps:.1f} req/s)")
+
+
+async def run_remote(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        test = LoadTest(client, args)
+        await test.setup()
+        test.report(await test.run())
+
+
+async def run_in_process(args):
+    # L'environnement doit être prêt AVANT l'import de main (moteur, analyseur, uploads)
+    tmp = tempfile.mkdtemp(prefix="aura-load-")
+    os.environ.setdefault("AURA_ANALYZER", "fake")
+    os.environ.setdefault("AURA_DATABASE_URL", f"sqlite:///{tmp}/load.db")
+    os.environ.setdefault("AURA_UPLOAD_DIR", f"{tmp}/uploads")
+    os.environ.setdefault("AURA_AUTO_MIGRATE", "1")
+    # Un seul client simulé depuis 127.0.0.1 : on mesure l'API, pas le limiteur de la Sentinelle
+    os.environ.setdefault("AURA_RATE_LIMIT_SCAN_IP", "0")
+    os.environ.setdefault("AURA_RATE_LIMIT_SCAN_USER", "0")
+
+    # Les logs emoji de l'API par requête noieraient le rapport
+    app_logs = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(app_logs):
+        import main
+        transport = httpx.ASGITransport(app=main.app)
+        async with main.app.router.lifespan_context(main.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://aura.test",
+                                         timeout=args.timeout) as client:
+                test = LoadTest(client, args)
+                await test.setup()
+                elapsed = await test.run()
+        engine_name, _ = main.analyzer.get()
+
+    print(f"API en processus, moteur IA {engine_name}, base {os.environ['AURA_DATABASE_URL']}")
+    test.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="serveur déjà lancé (sinon API dans le processus)")
+    parser.add_argument("--rps", type=float, default=20.0, help="débit cible (requêtes/s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="durée en secondes")
+    parser.add_argument("--mix", default="scan=1,dashboard=3,inventory=3", help="poids par route")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="part de fichiers déjà envoyés")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="taille des reçus (octets)")
+    parser.add_argument("--no-track-jobs", dest="track_jobs", action="store_false",
+                        help="ne pas suivre les jobs jusqu'à leur fin")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--job-timeout", type=float, default=120.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout HTTP (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="afficher les logs de l'API")
+    args = parser.parse_args()
+
+    asyncio.run(run_remote(args) if args.url else run_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
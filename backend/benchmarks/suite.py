@@ -0,0 +1,277 @@
+"""
+Suite de benchmarks des chemins chauds de l'API, sur des jeux de données
+générés (benchmarks/datagen.py), avec sortie JSON et comparaison à une
+référence enregistrée pour détecter les régressions avant déploiement.
+
+Chemins mesurés : get_dashboard (1re page et pagination), get_inventory,
+process_inventory_updates, run_depreciation (clôture de toutes les
+immobilisations), register / login (bcrypt compris) et calculate_tax_free. Les routes sont appelées directement, sans HTTP.
+
+Usage (depuis backend/) :
+    python -m benchmarks.suite --scales 1k,100k --output results.json
+    python -m benchmarks.suite --scales 1k,100k --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --scales 1k,100k --baseline benchmarks/baseline.json   # code 1 si régression
+
+Les bases générées sont gardées dans --data-dir (une par échelle et graine) :
+les relancer ne coûte que le temps des mesures.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.datagen import BENCH_EMAIL, BENCH_PASSWORD, BENCH_USER_ID, format_scale, generate, parse_scale
+
+DEFAULT_TOLERANCE = 0.20  # +20 % sur la médiane = régression
+NOISE_FLOOR_MS = 0.05  # écarts absolus plus petits ignorés (bruit de mesure)
+INVOICE_LINES = 50
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(s * 1000 for s in samples)
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "min_ms": round(samples[0], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+
+def measure(func, runs: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def measure_async(func, runs: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def run_scale(url: str, runs: int) -> dict:
+    # main est importé par l'appelant (environnement temporaire déjà en place)
+    import main
+    import models
+    from database import build_engine, build_async_engine
+    from inventory import process_inventory_updates
+    from depreciation import run_depreciation
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.orm import sessionmaker
+
+    engine = build_engine(url)
+    async_engine = build_async_engine(url)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    results = {}
+
+    async def dashboard_first_page():
+        async with AsyncSession() as db:
+            await main.get_dashboard(BENCH_USER_ID, cursor=None, limit=main.DASHBOARD_PAGE_SIZE, db=db)
+
+    async def dashboard_five_pages():
+        async with AsyncSession() as db:
+            cursor = None
+            for _ in range(5):
+                page = await main.get_dashboard(BENCH_USER_ID, cursor=cursor, limit=main.DASHBOARD_PAGE_SIZE, db=db)
+                cursor = json.loads(page.body)["next_cursor"]
+                if not cursor:
+                    break
+
+    async def inventory():
+        async with AsyncSession() as db:
+            await main.get_inventory(BENCH_USER_ID, format="records", db=db)
+
+    results["get_dashboard"] = await measure_async(dashboard_first_page, runs)
+    results["get_dashboard_5_pages"] = await measure_async(dashboard_five_pages, runs)
+    results["get_inventory"] = await measure_async(inventory, max(3, runs // 4))
+
+    # Moteur 3 : facture de 50 lignes, moitié articles connus, moitié nouveaux ; annulée à chaque fois
+    db = Session()
+    company_id = db.query(models.Company.id).filter(models.Company.owner_id == BENCH_USER_ID).scalar()
+    invoice = {"line_items": [
+        {"name": f"Produit {i + 1}" if i % 2 == 0 else f"Nouveau produit {i}", "sku": f"SKU-{i}",
+         "quantity": 2, "unit_price": 10.0}
+        for i in range(INVOICE_LINES)
+    ]}
+
+    def inventory_updates():
+        process_inventory_updates(db, company_id, invoice)
+        db.flush()
+        db.rollback()
+
+    results["process_inventory_updates"] = measure(inventory_updates, runs)
+
+    # Clôture mensuelle complète de la table des immobilisations ; annulée à chaque fois
+    def depreciation():
+        run_depreciation(db, full=True)
+        db.rollback()
+
+    results["run_depreciation"] = measure(depreciation, max(3, runs // 4))
+    db.close()
+
+    # Inscription / connexion : bcrypt domine, mesuré par la route complète
+    async def register():
+        email = f"bench-{os.urandom(6).hex()}@example.com"
+        async with AsyncSession() as db:
+            await main.register(main.UserCreate(email=email, password=BENCH_PASSWORD, full_name="Bench"), db=db)
+
+    async def login():
+        async with AsyncSession() as db:
+            await main.login(main.LoginRequest(email=BENCH_EMAIL, password=BENCH_PASSWORD), db=db)
+
+    hash_runs = max(3, runs // 4)
+    results["register"] = await measure_async(register, hash_runs)
+    results["login"] = await measure_async(login, hash_runs)
+
+    await async_engine.dispose()
+    engine.dispose()
+    return results
+
+
+def run_tax_free(runs: int) -> dict:
+    import main
+    request = main.TaxFreeRequest(amount_total=1250.0, merchant_name="Dubai Duty Free")
+    return measure(lambda: main.calculate_tax_free(request), runs * 50)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Liste des régressions (médiane au-delà de la tolérance et du seuil de bruit)."""
+    regressions = []
+    for scale, benches in current["results"].items():
+        for name, stats in benches.items():
+            base = baseline.get("results", {}).get(scale, {}).get(name)
+            if not base:
+                continue
+            before, after = base["median_ms"], stats["median_ms"]
+            ratio = after / before if before else float("inf")
+            if ratio > 1 + tolerance and after - before > NOISE_FLOOR_MS:
+                regressions.append({"scale": scale, "benchmark": name, "baseline_ms": before,
+                                    "current_ms": after, "ratio": round(ratio, 3)})
+    return regressions
+
+
+def print_report(report: dict, baseline: dict = None):
+    for scale, benches in report["results"].items():
+        print(f"\n[{scale}]", file=sys.stderr)
+        for name, stats in benches.items():
+            line = f"  {name:<28} médiane {stats['median_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms"
+            base = (baseline or {}).get("results", {}).get(scale, {}).get(name)
+            if base and base["median_ms"]:
+                line += f"   ({stats['median_ms'] / base['median_ms'] - 1:+.0%} vs référence)"
+            print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default="1k,100k", help="échelles en transactions (1k ... 10M)")
+    parser.add_argument("--runs", type=int, default=20, help="mesures par benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "aura-bench"),
+                        help="cache des bases générées")
+    parser.add_argument("--output", help="fichier JSON des résultats (sinon stdout)")
+    parser.add_argument("--baseline", help="référence JSON à comparer")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", help="enregistrer les résultats comme nouvelle référence")
+    parser.add_argument("--verbose", action="store_true", help="afficher les logs de l'API")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    # main ouvre sa propre base à l'import : base et uploads jetables, analyseur hors ligne
+    os.environ.setdefault("AURA_DATABASE_URL", f"sqlite:///{data_dir / 'main.db'}")
+    os.environ.setdefault("AURA_UPLOAD_DIR", str(data_dir / "uploads"))
+    os.environ.setdefault("AURA_ANALYZER", "simulation")
+    # stdout est réservé au JSON ; les logs de l'API (un par appel) sont masqués
+    app_logs = sys.stderr if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(app_logs):
+        import main as app_main  # noqa: F401  (environnement temporaire déjà en place)
+        from auth import hash_password
+        from database import build_engine
+        from migrations import upgrade
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "runs": args.runs,
+        },
+        "results": {},
+    }
+
+    for scale in (parse_scale(s) for s in args.scales.split(",")):
+        label = format_scale(scale)
+        db_path = data_dir / f"aura-{label}-seed{args.seed}.db"
+        if not db_path.exists():
+            print(f"🛠️ Génération du jeu {label} -> {db_path}", file=sys.stderr)
+            start = time.perf_counter()
+            generate(f"sqlite:///{db_path}", scale, args.seed,
+                     password_hash=hash_password(BENCH_PASSWORD))
+            print(f"   {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        with contextlib.redirect_stdout(app_logs):
+            # Base en cache générée par une version antérieure : schéma mis à niveau
+            cached_engine = build_engine(f"sqlite:///{db_path}")
+            upgrade(cached_engine)
+            cached_engine.dispose()
+            report["results"][label] = asyncio.run(run_scale(f"sqlite:///{db_path}", args.runs))
+
+    report["results"]["no-db"] = {"calculate_tax_free": run_tax_free(args.runs)}
+
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        report["regressions"] = compare(report, baseline, args.tolerance)
+
+    print_report(report, baseline)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload)
+    else:
+        print(payload)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(payload)
+        print(f"\n💾 Référence enregistrée : {args.save_baseline}", file=sys.stderr)
+
+    if report.get("regressions"):
+        print(f"\n❌ {len(report['regressions'])} régression(s) au-delà de +{args.tolerance:.0%} :", file=sys.stderr)
+        for r in report["regressions"]:
+            print(f"   [{r['scale']}] {r['benchmark']} : {r['baseline_ms']} -> {r['current_ms']} ms "
+                  f"(x{r['ratio']})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,110 @@
-from sqlalchemy import create_engine
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-# URL de la base de données (SQLite pour le développement local)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./aura.db"
+load_dotenv(dotenv_path=Path(__file__).resolve().parent / '.env')
 
-# Création du moteur
-# check_same_thread=False est nécessaire uniquement pour SQLite
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# URL de la base de données (SQLite pour le développement local, PostgreSQL en production)
+SQLALCHEMY_DATABASE_URL = os.getenv("AURA_DATABASE_URL", "sqlite:///./aura.db")
+
+# Réglages SQLite : WAL (lecteurs et écrivain ne se bloquent plus), attente
+# sur verrou au lieu de "database is locked", lectures via mmap
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("AURA_SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_MMAP_SIZE = int(os.getenv("AURA_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Réglages du pool PostgreSQL
+PG_POOL_SIZE = int(os.getenv("AURA_DB_POOL_SIZE", "10"))
+PG_MAX_OVERFLOW = int(os.getenv("AURA_DB_MAX_OVERFLOW", "20"))
+PG_POOL_TIMEOUT = int(os.getenv("AURA_DB_POOL_TIMEOUT", "30"))
+PG_POOL_RECYCLE = int(os.getenv("AURA_DB_POOL_RECYCLE", "1800"))
+
+
+def normalize_url(url: str) -> str:
+    # Render / Heroku fournissent encore le schéma "postgres://"
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def build_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    url = normalize_url(url)
+    if url.startswith("sqlite"):
+        # check_same_thread=False est nécessaire uniquement pour SQLite
+        engine = create_engine(
+            url, connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        event.listen(engine, "connect", _sqlite_pragmas)
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=PG_POOL_SIZE,
+        max_overflow=PG_MAX_OVERFLOW,
+        pool_timeout=PG_POOL_TIMEOUT,
+        pool_recycle=PG_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def async_url(url: str) -> str:
+    # Même base, pilotes asynchrones : aiosqlite en local, asyncpg pour PostgreSQL
+    url = normalize_url(url)
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme.startswith("postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+def build_async_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    url = async_url(url)
+    if url.startswith("sqlite"):
+        engine = create_async_engine(url, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+        return engine
+
+    return create_async_engine(
+        url,
+        pool_size=PG_POOL_SIZE,
+        max_overflow=PG_MAX_OVERFLOW,
+        pool_timeout=PG_POOL_TIMEOUT,
+        pool_recycle=PG_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+# Création du moteur (synchrone : workers de scan, scripts, migrations)
+engine = build_engine()
 
 # Création de la session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Moteur et sessions asynchrones (routes API sur la boucle d'événements)
+async_engine = build_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # C'est ici que l'on définit Base (ce qui manquait et causait l'erreur)
 Base = declarative_base()
+
+# INSERT spécifique au dialecte (nécessaire pour ON CONFLICT / upsert)
+def dialect_insert(db, table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upsert non supporté pour le dialecte {dialect}")
@@ -0,0 +1,209 @@
+import argparse
+import os
+import time
+from datetime import date, datetime
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import select, update, extract, func, case, or_, and_, bindparam
+from sqlalchemy.orm import Session
+
+import models
+
+# --- MOTEUR D'AMORTISSEMENT DES IMMOBILISATIONS ---
+# Valeur nette comptable (current_value) de chaque FixedAsset à une date de
+# clôture, au mois près : un mois d'amortissement par mois calendaire écoulé
+# depuis le mois d'achat, sur lifespan_years * 12 mois.
+#   - linéaire : (prix - valeur résiduelle) réparti également sur la durée ;
+#   - dégressif : taux mensuel facteur / durée en mois (double dégressif par
+#     défaut), bascule en linéaire sur la durée restante quand celui-ci devient
+#     plus favorable, jamais sous la valeur résiduelle.
+# Les immobilisations sont lues par lots (pagination par id) en colonnes
+# NumPy, valorisées en une passe vectorielle et réécrites par un UPDATE
+# executemany : pas d'objet ORM, pas de save() un par un.
+# Incrémental : chaque ligne garde sa période de valorisation (YYYY-MM) et ses
+# mois amortis ; seuls les actifs jamais valorisés, ou pas encore totalement
+# amortis et valorisés pour une autre période, sont relus. full=True revalorise
+# tout (après correction d'un prix, d'une durée ou d'une méthode).
+#
+# Clôture mensuelle (depuis backend/, à planifier en cron ou via le job intégré) :
+#     python depreciation.py run [--as-of 2025-06-30] [--company ID] [--full]
+
+STRAIGHT_LINE = "straight_line"
+DECLINING_BALANCE = "declining_balance"
+METHODS = (STRAIGHT_LINE, DECLINING_BALANCE)
+DECLINING_FACTOR = float(os.getenv("AURA_DECLINING_BALANCE_FACTOR", "2.0"))
+CHUNK_SIZE = 10_000
+
+
+def period_of(as_of: date) -> str:
+    return f"{as_of.year:04d}-{as_of.month:02d}"
+
+
+def book_values(price, salvage, purchase_month, lifespan_months, declining, as_of_month: int,
+                factor: float = DECLINING_FACTOR):
+    """
+    Valeurs nettes et mois amortis, en tableaux. Les mois sont des indices
+    année * 12 + (mois - 1) ; declining est un tableau de booléens.
+    """
+    salvage = np.clip(salvage, 0.0, price)
+    elapsed = np.clip(as_of_month - purchase_month, 0, lifespan_months)
+    base = price - salvage
+
+    straight = price - base * elapsed / lifespan_months
+
+    # Dégressif : bascule en linéaire au premier mois j où le linéaire sur la
+    # durée restante l'emporte, i.e. B_j * (1 - taux * (N - j)) >= résiduelle.
+    # Ce critère est croissant en j : recherche dichotomique vectorisée.
+    rate = np.minimum(factor / lifespan_months, 1.0)
+    lo = np.zeros(len(price))
+    switch = lifespan_months.astype(np.float64)  # N : pas de bascule
+    while np.any(lo < switch):
+        mid = np.floor((lo + switch) / 2)
+        wins = price * (1 - rate) ** mid * (1 - rate * (lifespan_months - mid)) >= salvage
+        switch = np.where(wins, mid, switch)
+        lo = np.where(wins, lo, mid + 1)
+    declined = price * (1 - rate) ** np.minimum(elapsed, switch)
+    remaining = np.maximum(lifespan_months - switch, 1)
+    after_switch = declined - (declined - salvage) * np.maximum(elapsed - switch, 0) / remaining
+    degressive = np.maximum(np.where(elapsed <= switch, declined, after_switch), salvage)
+
+    values = np.where(declining, degressive, straight)
+    values = np.where(elapsed >= lifespan_months, salvage, values)
+    return values, elapsed
+
+
+def _eligible(company_id: str = None):
+    F = models.FixedAsset
+    conditions = [
+        F.purchase_date.isnot(None),
+        F.purchase_price.isnot(None),
+        F.lifespan_years > 0,
+    ]
+    if company_id:
+        conditions.append(F.company_id == company_id)
+    return conditions
+
+
+def _stale(period: str):
+    """Jamais valorisé, ou valorisé pour une autre période et pas encore totalement amorti."""
+    F = models.FixedAsset
+    return or_(
+        F.depreciated_through.is_(None),
+        and_(F.depreciated_through != period,
+             func.coalesce(F.depreciation_months, 0) < F.lifespan_years * 12),
+    )
+
+
+def _chunks(db: Session, conditions: list, chunk_size: int):
+    """Lots (ids, colonnes float64 de forme (n, 6)), pagination par id : aucun curseur ouvert pendant l'UPDATE."""
+    F = models.FixedAsset
+    query = select(
+        F.id,
+        extract("year", F.purchase_date),
+        extract("month", F.purchase_date),
+        F.purchase_price,
+        func.coalesce(F.salvage_value, 0.0),
+        F.lifespan_years,
+        case((F.depreciation_method == DECLINING_BALANCE, 1.0), else_=0.0),
+    ).where(*conditions).order_by(F.id).limit(chunk_size)
+
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(F.id > last_id)
+        rows = db.execute(page).all()
+        if not rows:
+            return
+        ids = [row[0] for row in rows]
+        flat = np.fromiter(chain.from_iterable(row[1:] for row in rows), dtype=np.float64, count=len(rows) * 6)
+        yield ids, flat.reshape(-1, 6)
+        last_id = ids[-1]
+
+
+def run_depreciation(db: Session, as_of: date = None, company_id: str = None, full: bool = False,
+                     chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Revalorise les immobilisations d'une société (ou de toute la table) à la
+    date as_of (aujourd'hui par défaut). Sans commit : l'appelant valide la
+    clôture en une transaction.
+    """
+    start = time.perf_counter()
+    as_of = as_of or date.today()
+    period = period_of(as_of)
+    as_of_month = as_of.year * 12 + as_of.month - 1
+
+    conditions = _eligible(company_id)
+    if not full:
+        conditions.append(_stale(period))
+
+    table = models.FixedAsset.__table__
+    stmt = update(table).where(table.c.id == bindparam("b_id")).values(
+        current_value=bindparam("b_value"),
+        depreciation_months=bindparam("b_months"),
+        depreciated_through=bindparam("b_period"),
+    )
+
+    assets, book_total, cost_total = 0, 0.0, 0.0
+    for ids, chunk in _chunks(db, conditions, chunk_size):
+        year, month, price, salvage, lifespan_years, declining = chunk.T
+        values, elapsed = book_values(
+            price, salvage, (year * 12 + month - 1).astype(np.int64),
+            (lifespan_years * 12).astype(np.int64), declining.astype(bool), as_of_month,
+        )
+        # Arrondi au fils par round() de Python (np.round diffère sur les demi-fils)
+        rounded = [round(v, 2) for v in values.tolist()]
+        db.execute(stmt, [
+            {"b_id": asset_id, "b_value": value, "b_months": months, "b_period": period}
+            for asset_id, value, months in zip(ids, rounded, elapsed.astype(np.int64).tolist())
+        ])
+        assets += len(ids)
+        book_total += sum(rounded)
+        cost_total += float(price.sum())
+
+    return {
+        "period": period,
+        "as_of": as_of.isoformat(),
+        "full": full,
+        "assets_revalued": assets,
+        "book_value": round(book_total, 2),
+        "accumulated_depreciation": round(cost_total - book_total, 2),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_scheduled(session_factory):
+    """Passe incrémentale de toute la table (job planifié)."""
+    db = session_factory()
+    try:
+        report = run_depreciation(db)
+        db.commit()
+    finally:
+        db.close()
+    if report["assets_revalued"]:
+        print(f"📉 AMORTISSEMENTS {report['period']} : {report['assets_revalued']} immobilisations "
+              f"revalorisées en {report['seconds']}s.")
+    return report
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Amortissement des immobilisations AURA")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--as-of", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(), default=None,
+                        help="date de clôture YYYY-MM-DD (défaut : aujourd'hui)")
+    parser.add_argument("--company", default=None)
+    parser.add_argument("--full", action="store_true", help="revaloriser toutes les immobilisations")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = run_depreciation(db, args.as_of, args.company, args.full, args.chunk_size)
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"✅ Période {report['period']} : {report['assets_revalued']} immobilisations revalorisées "
+          f"en {report['seconds']}s (VNC {report['book_value']} AED, "
+          f"amortissements cumulés {report['accumulated_depreciation']} AED).")
@@ -0,0 +1,251 @@
+import argparse
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+
+# --- EXPORT DE LA BLACK BOX (DONNÉES D'ENTRAÎNEMENT) ---
+# Parcourt AuraMemory côté serveur par lots (yield_per), joint les métadonnées
+# du FinancialDocument source et écrit des fichiers JSONL compressés (gzip) ou
+# Parquet (pyarrow, optionnel). Mémoire constante quelle que soit la taille de
+# la table : un lot de lignes et un fichier en cours d'écriture au plus.
+# Exports incrémentaux : le filigrane (dernier id exporté) est conservé dans un
+# fichier d'état ; un export de nuit ne relit que les nouvelles lignes.
+#
+# Export (depuis backend/) :
+#     python export.py --out exports/ [--format jsonl|parquet] [--state exports/watermark.json]
+
+EXPORT_BATCH_SIZE = int(os.getenv("AURA_EXPORT_BATCH_SIZE", "1000"))
+EXPORT_SHARD_SIZE = int(os.getenv("AURA_EXPORT_SHARD_SIZE", "100000"))
+PARQUET_ROW_GROUP = 10_000
+
+
+class ExportError(Exception):
+    pass
+
+
+def iter_memory(db: Session, after_id: int = 0, since: datetime = None, company_id: str = None,
+                batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Enregistrements de la Black Box par id croissant, documents joints.
+    after_id : filigrane exclusif ; since : created_at strictement postérieur.
+    """
+    M, D = models.AuraMemory, models.FinancialDocument
+    query = select(
+        M.id, M.created_at, M.raw_text_input, M.ai_json_output, M.human_corrected_json,
+        D.id.label("document_id"), D.company_id, D.filename, D.file_type, D.content_hash,
+        D.upload_date, D.status,
+    ).outerjoin(D, D.id == M.document_id).where(M.id > after_id).order_by(M.id)
+    if since is not None:
+        query = query.where(M.created_at > since)
+    if company_id:
+        query = query.where(D.company_id == company_id)
+
+    # yield_per : curseur serveur sur PostgreSQL, lecture par lots sur SQLite
+    for row in db.execute(query.execution_options(yield_per=batch_size)):
+        yield {
+            "id": row.id,
+            "created_at": row.created_at,
+            "document": {
+                "id": row.document_id, "company_id": row.company_id, "filename": row.filename,
+                "file_type": row.file_type, "content_hash": row.content_hash,
+                "upload_date": row.upload_date, "status": row.status,
+            },
+            "raw_text_input": row.raw_text_input,
+            "ai_json_output": row.ai_json_output,
+            "human_corrected_json": row.human_corrected_json,
+            "corrected": row.human_corrected_json is not None,
+        }
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def to_json_line(record: dict) -> bytes:
+    return (json.dumps(record, default=_json_default, ensure_ascii=False) + "\n").encode()
+
+
+def gzip_stream(records, flush_every: int = 500):
+    """Flux JSONL gzip incrémental (pour StreamingResponse)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 : en-tête gzip
+    pending = []
+    for n, record in enumerate(records, 1):
+        pending.append(compressor.compress(to_json_line(record)))
+        if n % flush_every == 0:
+            pending.append(compressor.flush(zlib.Z_SYNC_FLUSH))
+            yield b"".join(pending)
+            pending = []
+    pending.append(compressor.flush())
+    yield b"".join(pending)
+
+
+class _JsonlShard:
+    suffix = ".jsonl.gz"
+
+    def __init__(self, path: Path):
+        self.file = gzip.open(path, "wb")
+
+    def write(self, record: dict):
+        self.file.write(to_json_line(record))
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetShard:
+    suffix = ".parquet"
+
+    def __init__(self, path: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError("Le format Parquet nécessite pyarrow (pip install pyarrow).")
+        self.pa = pa
+        # Les JSON (sortie IA, correction) sont stockés en texte
+        self.schema = pa.schema([
+            ("id", pa.int64()), ("created_at", pa.timestamp("us")), ("document_id", pa.string()),
+            ("company_id", pa.string()), ("filename", pa.string()), ("file_type", pa.string()),
+            ("content_hash", pa.string()), ("upload_date", pa.timestamp("us")), ("status", pa.string()),
+            ("raw_text_input", pa.string()), ("ai_json_output", pa.string()),
+            ("human_corrected_json", pa.string()), ("corrected", pa.bool_()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self.rows = []
+
+    def write(self, record: dict):
+        document = record["document"]
+        self.rows.append({
+            **{k: record[k] for k in ("id", "created_at", "raw_text_input", "corrected")},
+            "document_id": document["id"],
+            **{k: document[k] for k in ("company_id", "filename", "file_type", "content_hash", "upload_date", "status")},
+            "ai_json_output": json.dumps(record["ai_json_output"], default=_json_default, ensure_ascii=False),
+            "human_corrected_json": (
+                json.dumps(record["human_corrected_json"], default=_json_default, ensure_ascii=False)
+                if record["human_corrected_json"] is not None else None
+            ),
+        })
+        if len(self.rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+SHARD_WRITERS = {"jsonl": _JsonlShard, "parquet": _ParquetShard}
+
+
+def write_shards(records, out_dir: Path, fmt: str = "jsonl", shard_size: int = EXPORT_SHARD_SIZE) -> list:
+    """
+    Répartit les enregistrements en fichiers de shard_size lignes au plus,
+    nommés par plage d'id (aura_memory-<premier>-<dernier>). Chaque fichier
+    est écrit sous un nom temporaire puis renommé : pas de fichier partiel visible.
+    Retourne [{"path", "rows", "first_id", "last_id"}].
+    """
+    writer_cls = SHARD_WRITERS[fmt]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shards = []
+    shard, tmp_path, rows, first_id, last_id = None, None, 0, None, None
+
+    def close_shard():
+        shard.close()
+        path = out_dir / f"aura_memory-{first_id:012d}-{last_id:012d}{writer_cls.suffix}"
+        os.replace(tmp_path, path)
+        shards.append({"path": str(path), "rows": rows, "first_id": first_id, "last_id": last_id})
+
+    try:
+        for record in records:
+            if shard is None:
+                first_id, rows = record["id"], 0
+                tmp_path = out_dir / f".aura_memory-{first_id:012d}{writer_cls.suffix}.tmp"
+                shard = writer_cls(tmp_path)
+            shard.write(record)
+            rows += 1
+            last_id = record["id"]
+            if rows >= shard_size:
+                close_shard()
+                shard = None
+        if shard is not None:
+            close_shard()
+            shard = None
+    finally:
+        if shard is not None:
+            shard.close()
+            tmp_path.unlink(missing_ok=True)
+    return shards
+
+
+def read_watermark(state_path: Path) -> int:
+    if state_path and state_path.exists():
+        return json.loads(state_path.read_text()).get("last_id", 0)
+    return 0
+
+
+def save_watermark(state_path: Path, last_id: int, shards: list):
+    tmp_path = state_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({
+        "last_id": last_id,
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+        "shards": [s["path"] for s in shards],
+    }, indent=2))
+    os.replace(tmp_path, state_path)
+
+
+def export_memory(db: Session, out_dir: Path, fmt: str = "jsonl", state_path: Path = None,
+                  after_id: int = None, since: datetime = None, company_id: str = None,
+                  batch_size: int = EXPORT_BATCH_SIZE, shard_size: int = EXPORT_SHARD_SIZE) -> list:
+    """
+    Export incrémental : reprend après le filigrane de state_path (ou after_id)
+    et ne l'avance qu'une fois tous les fichiers écrits.
+    """
+    if after_id is None:
+        after_id = read_watermark(state_path)
+    records = iter_memory(db, after_id=after_id, since=since, company_id=company_id, batch_size=batch_size)
+    shards = write_shards(records, out_dir, fmt, shard_size)
+    if state_path and shards:
+        save_watermark(state_path, shards[-1]["last_id"], shards)
+    return shards
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Export de la Black Box AURA")
+    parser.add_argument("--out", required=True, help="dossier des fichiers exportés")
+    parser.add_argument("--format", choices=sorted(SHARD_WRITERS), default="jsonl")
+    parser.add_argument("--state", default=None, help="fichier de filigrane (export incrémental)")
+    parser.add_argument("--after-id", type=int, default=None, help="exporter les id > N (ignore --state)")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="created_at > date ISO")
+    parser.add_argument("--company", default=None)
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--shard-size", type=int, default=EXPORT_SHARD_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        shards = export_memory(
+            db, Path(args.out), args.format, Path(args.state) if args.state else None,
+            args.after_id, args.since, args.company, args.batch_size, args.shard_size,
+        )
+    except ExportError as e:
+        raise SystemExit(f"❌ {e}")
+    finally:
+        db.close()
+
+    for shard in shards:
+        print(f"📦 {shard['path']} : {shard['rows']} lignes (id {shard['first_id']} -> {shard['last_id']})")
+    print(f"✅ {sum(s['rows'] for s in shards)} lignes exportées." if shards else "✅ Rien de nouveau à exporter.")
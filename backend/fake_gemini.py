@@ -0,0 +1,210 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# --- FAUX GEMINI LOCAL ---
+# Remplace google.generativeai (upload_file / get_file) et GenerativeModel
+# (generate_content) pour tester hors ligne et dimensionner la plateforme :
+#   - latences tirées d'une distribution (constant, uniform, lognormal, exponential)
+#   - phase PROCESSING et erreurs de quota / indisponibilité réglables
+#   - coût proportionnel à la taille du fichier (envoi, analyse), optionnel
+#   - reçus réalistes et déterministes : même graine + même fichier = même reçu
+#
+# Activation dans l'API : AURA_ANALYZER=fake (voir from_env pour les réglages).
+
+
+class ResourceExhausted(Exception):
+    code = 429
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class LatencyModel:
+    """
+    Distribution de latence en secondes, décrite par une chaîne :
+    "0.2" ou "constant:0.2", "uniform:0.5:2.0", "lognormal:1.2:0.4"
+    (médiane, sigma), "exponential:1.0" (moyenne).
+    """
+
+    def __init__(self, spec):
+        if isinstance(spec, (int, float)):
+            spec = f"constant:{spec}"
+        kind, *params = str(spec).split(":")
+        if not params:
+            kind, params = "constant", [kind]
+        if kind not in ("constant", "uniform", "lognormal", "exponential"):
+            raise ValueError(f"Distribution de latence inconnue : {spec}")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "constant":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma)
+        return rng.expovariate(1 / self.params[0])
+
+
+# Marchands de Dubaï : (nom, catégorie, déductible, catalogue [(article, sku, prix unitaire HT)])
+MERCHANTS = [
+    ("Sharaf DG Mall of the Emirates", "Electronics", True, [
+        ("MacBook Air 13 M3", "MBA-13-M3", 4299.0), ("Dell 27 Monitor", "DEL-P2723", 1199.0),
+        ("Logitech MX Master 3S", "LOG-MX3S", 399.0), ("USB-C Hub 7-in-1", "HUB-7C", 149.0),
+    ]),
+    ("Carrefour City Centre Deira", "Groceries", False, [
+        ("Al Ain Water 24x500ml", "ALA-24", 22.5), ("Nescafé Gold 200g", "NES-G200", 54.0),
+        ("Almarai Milk 2L", "ALM-2L", 11.5), ("Dates Khalas 1kg", "DAT-KH1", 38.0),
+    ]),
+    ("ENOC Sheikh Zayed Road", "Fuel", True, [
+        ("Super 98 (litre)", "FUEL-98", 3.14), ("Special 95 (litre)", "FUEL-95", 3.02),
+    ]),
+    ("Office Depot Al Quoz", "Office Supplies", True, [
+        ("Papier A4 80g (ramette)", "PAP-A4", 19.5), ("Toner HP 26A", "HP-26A", 389.0),
+        ("Classeur à levier", "CLS-LEV", 12.0), ("Stylos Bic x50", "BIC-50", 35.0),
+    ]),
+    ("Emirates Airlines", "Travel", True, [
+        ("DXB-LHR Economy", "EK-ECO", 3150.0), ("Excess Baggage 10kg", "EK-BAG10", 450.0),
+    ]),
+    ("Nando's JBR", "Meals & Entertainment", False, [
+        ("Quarter Chicken Meal", "NAN-QCM", 48.0), ("Bottomless Drink", "NAN-BD", 16.0),
+    ]),
+]
+
+
+def make_receipt(rng: random.Random, min_items: int, max_items: int) -> dict:
+    merchant, category, deductible, catalog = rng.choice(MERCHANTS)
+    line_items = []
+    for _ in range(rng.randint(min_items, max_items)):
+        name, sku, price = rng.choice(catalog)
+        line_items.append({"name": name, "sku": sku, "quantity": rng.randint(1, 12), "unit_price": price})
+
+    subtotal = sum(item["quantity"] * item["unit_price"] for item in line_items)
+    tax = round(subtotal * 0.05, 2)
+    date = datetime(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    return {
+        "merchant": merchant,
+        "date": date.strftime("%Y-%m-%d"),
+        "total": round(subtotal + tax, 2),
+        "tax": tax,
+        "currency": "AED",
+        "category": category,
+        "description": f"{len(line_items)} article(s) chez {merchant}",
+        "is_deductible": deductible,
+        "tax_rule_applied": "Standard 5% VAT",
+        "justification": "Dépense professionnelle." if deductible else "Dépense personnelle, non déductible.",
+        "line_items": line_items,
+    }
+
+
+class _State:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FakeFile:
+    def __init__(self, name: str, state: str):
+        self.name = name
+        self.state = _State(state)
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiSDK:
+    def __init__(self, latency=0.05, processing_polls: int = 1, quota_error_rate: float = 0.0,
+                 unavailable_rate: float = 0.0, seed: int = None, seconds_per_mb: float = 0.0):
+        self.latency = LatencyModel(latency)
+        self.seconds_per_mb = seconds_per_mb
+        self.processing_polls = processing_polls
+        self.quota_error_rate = quota_error_rate
+        self.unavailable_rate = unavailable_rate
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._files = {}  # nom -> [chemin, polls restants]
+        self._lock = threading.Lock()
+
+    def sleep(self, model: LatencyModel, factor: float = 1.0):
+        with self._lock:
+            delay = model.sample(self.rng)
+        time.sleep(delay * factor)
+
+    def maybe_fail(self):
+        with self._lock:
+            draw = self.rng.random()
+        if draw < self.quota_error_rate:
+            raise ResourceExhausted("429 Quota exceeded (fake)")
+        if draw < self.quota_error_rate + self.unavailable_rate:
+            raise ServiceUnavailable("503 Service unavailable (fake)")
+
+    def upload_file(self, path, mime_type=None):
+        self.sleep(self.latency)
+        if self.seconds_per_mb:
+            time.sleep(os.path.getsize(path) / 1e6 * self.seconds_per_mb)
+        self.maybe_fail()
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._files[name] = [str(path), self.processing_polls]
+        return FakeFile(name, "PROCESSING" if self.processing_polls else "ACTIVE")
+
+    def get_file(self, name):
+        self.sleep(self.latency, factor=0.5)
+        with self._lock:
+            self._files[name][1] -= 1
+            remaining = self._files[name][1]
+        return FakeFile(name, "PROCESSING" if remaining > 0 else "ACTIVE")
+
+    def path_of(self, name) -> str:
+        with self._lock:
+            entry = self._files.pop(name, None)
+        return entry[0] if entry else name
+
+
+class FakeGeminiModel:
+    def __init__(self, sdk: FakeGeminiSDK, latency=0.2, line_items=(1, 8), seconds_per_mb: float = 0.0):
+        self.sdk = sdk
+        self.latency = LatencyModel(latency)
+        self.seconds_per_mb = seconds_per_mb
+        self.min_items, self.max_items = line_items
+
+    def generate_content(self, parts):
+        # Reçu dérivé de la graine et du fichier (chemin de blob = empreinte du contenu)
+        path = self.sdk.path_of(parts[-1].name)
+        self.sdk.sleep(self.latency)
+        if self.seconds_per_mb and os.path.exists(path):
+            time.sleep(os.path.getsize(path) / 1e6 * self.seconds_per_mb)
+        self.sdk.maybe_fail()
+        rng = random.Random(f"{self.sdk.seed}:{path}")
+        receipt = make_receipt(rng, self.min_items, self.max_items)
+        return FakeResponse("```json\n" + json.dumps(receipt) + "\n```")
+
+
+def from_env():
+    """SDK et modèle factices configurés par les variables AURA_FAKE_*."""
+    min_items, max_items = os.getenv("AURA_FAKE_LINE_ITEMS", "1:8").split(":")
+    sdk = FakeGeminiSDK(
+        latency=os.getenv("AURA_FAKE_UPLOAD_LATENCY", "lognormal:0.3:0.5"),
+        processing_polls=int(os.getenv("AURA_FAKE_PROCESSING_POLLS", "1")),
+        quota_error_rate=float(os.getenv("AURA_FAKE_QUOTA_ERROR_RATE", "0")),
+        unavailable_rate=float(os.getenv("AURA_FAKE_UNAVAILABLE_RATE", "0")),
+        seed=int(os.getenv("AURA_FAKE_SEED", "42")),
+        seconds_per_mb=float(os.getenv("AURA_FAKE_UPLOAD_SECONDS_PER_MB", "0")),
+    )
+    model = FakeGeminiModel(
+        sdk,
+        latency=os.getenv("AURA_FAKE_GENERATE_LATENCY", "lognormal:1.5:0.4"),
+        line_items=(int(min_items), int(max_items)),
+        seconds_per_mb=float(os.getenv("AURA_FAKE_GENERATE_SECONDS_PER_MB", "0")),
+    )
+    return sdk, model
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+from metrics import GEMINI_RETRIES, stage
+
+# --- CLIENT GEMINI RÉSILIENT ---
+# Enveloppe autour du SDK google.generativeai :
+#   - sémaphore global + sémaphore par société (une société ne monopolise pas le quota)
+#   - attente du traitement du fichier en asyncio, avec backoff exponentiel
+#   - nouvelles tentatives avec jitter sur quota / erreurs transitoires
+#   - disjoncteur : après trop d'échecs de disponibilité ou de quota, on
+#     échoue vite avec un statut clair au lieu d'inventer un reçu (un document
+#     refusé ou une réponse illisible ne compte pas : c'est le document, pas
+#     le service).
+# Les appels du SDK sont bloquants : ils passent par asyncio.to_thread.
+# Le SDK et le modèle sont injectés, ce qui permet de brancher un faux Gemini local.
+
+MAX_CONCURRENCY = int(os.getenv("AURA_GEMINI_MAX_CONCURRENCY", "8"))
+COMPANY_CONCURRENCY = int(os.getenv("AURA_GEMINI_COMPANY_CONCURRENCY", "2"))
+MAX_RETRIES = int(os.getenv("AURA_GEMINI_MAX_RETRIES", "4"))
+RETRY_BASE_DELAY = float(os.getenv("AURA_GEMINI_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("AURA_GEMINI_RETRY_MAX_DELAY", "30.0"))
+POLL_INITIAL_DELAY = float(os.getenv("AURA_GEMINI_POLL_INITIAL_DELAY", "0.5"))
+POLL_MAX_DELAY = float(os.getenv("AURA_GEMINI_POLL_MAX_DELAY", "8.0"))
+POLL_TIMEOUT = float(os.getenv("AURA_GEMINI_POLL_TIMEOUT", "120.0"))
+BREAKER_THRESHOLD = int(os.getenv("AURA_GEMINI_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("AURA_GEMINI_BREAKER_RESET", "60.0"))
+
+# Erreurs google.api_core reconnues par leur nom (pas d'import dur du SDK)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "Aborted", "TimeoutError", "ConnectionError",
+}
+QUOTA_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+
+
+class AnalyzerError(Exception):
+    """Échec d'analyse. status est écrit dans FinancialDocument.status."""
+    status = "FAILED"
+
+
+class AnalyzerUnavailable(AnalyzerError):
+    """Disjoncteur ouvert ou quota épuisé après les nouvelles tentatives."""
+    status = "AI_UNAVAILABLE"
+
+
+class TransientAnalyzerError(Exception):
+    pass
+
+
+def is_unavailable(error: Exception) -> bool:
+    """Service indisponible ou quota : seules ces erreurs comptent pour le disjoncteur."""
+    if isinstance(error, TransientAnalyzerError):
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return getattr(error, "code", None) in (429, 500, 502, 503, 504)
+
+
+def is_retryable(error: Exception) -> bool:
+    # Réponse JSON illisible : souvent passagère, mais propre au document
+    return isinstance(error, json.JSONDecodeError) or is_unavailable(error)
+
+
+def is_quota_error(error: Exception) -> bool:
+    return type(error).__name__ in QUOTA_ERRORS or getattr(error, "code", None) == 429
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            # Une seule requête d'essai pour tester le rétablissement
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Essai terminé sans verdict (annulé, erreur propre au document) : un autre pourra tester."""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class GeminiClient:
+    def __init__(
+        self,
+        sdk,
+        model,
+        prompt: str,
+        max_concurrency: int = MAX_CONCURRENCY,
+        company_concurrency: int = COMPANY_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        retry_base_delay: float = RETRY_BASE_DELAY,
+        retry_max_delay: float = RETRY_MAX_DELAY,
+        poll_initial_delay: float = POLL_INITIAL_DELAY,
+        poll_max_delay: float = POLL_MAX_DELAY,
+        poll_timeout: float = POLL_TIMEOUT,
+        breaker: CircuitBreaker = None,
+    ):
+        self.sdk = sdk
+        self.model = model
+        self.prompt = prompt
+        self.max_concurrency = max_concurrency
+        self.company_concurrency = company_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_initial_delay = poll_initial_delay
+        self.poll_max_delay = poll_max_delay
+        self.poll_timeout = poll_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._company_slots = {}  # company_id -> [Semaphore, utilisateurs]
+
+    def is_available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    async def analyze(self, file_path: str, mime_type: str, company_id: str = None) -> dict:
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if not self.breaker.allow():
+            raise AnalyzerUnavailable("Cerveau UHG indisponible (disjoncteur ouvert).")
+
+        slot = self._company_slots.setdefault(company_id, [asyncio.Semaphore(self.company_concurrency), 0])
+        slot[1] += 1
+        try:
+            async with slot[0], self._global_slots:
+                return await self._analyze_with_retries(file_path, mime_type)
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self._company_slots[company_id]
+            # Y compris sur CancelledError : sinon le disjoncteur resterait bloqué
+            if probe:
+                self.breaker.release_probe()
+
+    async def _analyze_with_retries(self, file_path: str, mime_type: str) -> dict:
+        attempt = 0
+        while True:
+            try:
+                result = await self._analyze_once(file_path, mime_type)
+                self.breaker.record_success()
+                return result
+            except AnalyzerError:
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    if is_quota_error(e) or is_unavailable(e):
+                        self.breaker.record_failure()
+                        raise AnalyzerUnavailable(f"Gemini indisponible après {attempt + 1} essais : {e}") from e
+                    raise AnalyzerError(f"Erreur Gemini : {e}") from e
+
+                # Backoff exponentiel, "full jitter" pour désynchroniser les workers
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                attempt += 1
+                GEMINI_RETRIES.labels(type(e).__name__).inc()
+                print(f"🔁 Gemini ({type(e).__name__}) : nouvel essai {attempt}/{self.max_retries} dans {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _analyze_once(self, file_path: str, mime_type: str) -> dict:
+        print(f"⚡ Envoi au Cloud UHG (Gemini 2.0)...")
+        with stage("gemini_upload"):
+            uploaded_file = await asyncio.to_thread(self.sdk.upload_file, file_path, mime_type=mime_type)
+
+        # Attente du traitement côté Google, sans bloquer la boucle
+        with stage("gemini_processing"):
+            delay = self.poll_initial_delay
+            deadline = time.monotonic() + self.poll_timeout
+            while uploaded_file.state.name == "PROCESSING":
+                if time.monotonic() > deadline:
+                    raise TransientAnalyzerError("Traitement du fichier trop long côté Gemini.")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.poll_max_delay)
+                uploaded_file = await asyncio.to_thread(self.sdk.get_file, uploaded_file.name)
+
+        if uploaded_file.state.name == "FAILED":
+            raise AnalyzerError("Fichier refusé par Gemini.")
+
+        with stage("gemini_generate"):
+            response = await asyncio.to_thread(self.model.generate_content, [self.prompt, uploaded_file])
+        with stage("json_parse"):
+            json_str = response.text.replace("```json", "").replace("```", "").strip()
+            data = json.loads(json_str)
+        print("✅ Analyse Fiscale Gemini 2.0 réussie.")
+        return data
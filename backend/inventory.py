@@ -0,0 +1,183 @@
+import argparse
+import uuid
+
+from sqlalchemy import select, update, func, union, bindparam
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+# --- MOTEUR 3 : GESTION DES STOCKS ---
+# Registre en ajout seul : un scan agrège ses lignes par produit, crée les
+# articles inconnus (INSERT ... ON CONFLICT DO NOTHING, sans toucher aux
+# articles existants) puis insère un StockMovement par produit, rattaché au
+# document source. Aucune ligne d'InventoryItem n'est modifiée par les scans :
+# des scans concurrents de la même société n'attendent plus les mêmes verrous.
+#
+# Compactage périodique : compact_movements() réserve les mouvements en
+# attente (UPDATE ... RETURNING, un lot par passe) et les reporte dans
+# InventoryItem.quantity_on_hand / unit_price, dans la même transaction.
+# Lecture du stock disponible = stock compacté + queue non compactée
+# (on_hand_query), jamais un état intermédiaire.
+#
+# Compactage manuel (depuis backend/) :
+#     python inventory.py compact [--company ID]
+
+UPSERT_BATCH_SIZE = 500  # reste sous la limite de paramètres SQLite
+
+
+def process_inventory_updates(db: Session, company_id: str, ai_data: dict, document_id: str = None):
+    """Enregistre les entrées de stock des line_items. Le commit est laissé à l'appelant."""
+    items_extracted = ai_data.get("line_items", [])
+    if not items_extracted: return
+
+    print(f"📦 MOTEUR 3 : Traitement de {len(items_extracted)} articles de stock...")
+
+    rows = {}
+    for item in items_extracted:
+        p_name = item.get("name")
+        p_qty = item.get("quantity", 0)
+        p_price = item.get("unit_price", 0.0)
+        p_sku = item.get("sku")
+        if not p_sku: p_sku = "GEN-" + str(uuid.uuid4())[:8].upper()
+
+        if p_qty > 0 and p_name:
+            row = rows.get(p_name)
+            if row:
+                row["quantity"] += p_qty
+                row["unit_price"] = p_price
+            else:
+                rows[p_name] = {"sku": p_sku, "quantity": p_qty, "unit_price": p_price}
+    if not rows:
+        return
+
+    # 1. Articles inconnus : créés à stock compacté nul, les existants ne sont pas touchés
+    table = models.InventoryItem.__table__
+    names = list(rows)
+    for start in range(0, len(names), UPSERT_BATCH_SIZE):
+        stmt = dialect_insert(db, table).values([
+            {"id": models.generate_uuid(), "company_id": company_id, "product_name": name,
+             "sku": rows[name]["sku"], "quantity_on_hand": 0, "unit_price": rows[name]["unit_price"],
+             "low_stock_threshold": 5}
+            for name in names[start:start + UPSERT_BATCH_SIZE]
+        ])
+        db.execute(stmt.on_conflict_do_nothing(index_elements=[table.c.company_id, table.c.product_name]))
+
+    # 2. Mouvements (ajout seul)
+    item_ids = {}
+    for start in range(0, len(names), UPSERT_BATCH_SIZE):
+        item_ids.update(db.execute(
+            select(table.c.product_name, table.c.id)
+            .where(table.c.company_id == company_id, table.c.product_name.in_(names[start:start + UPSERT_BATCH_SIZE]))
+        ).all())
+
+    db.execute(models.StockMovement.__table__.insert(), [
+        {"company_id": company_id, "item_id": item_ids[name], "document_id": document_id,
+         "quantity": row["quantity"], "unit_price": row["unit_price"]}
+        for name, row in rows.items()
+    ])
+
+
+def compact_movements(db: Session, company_id: str = None) -> dict:
+    """
+    Reporte les mouvements non compactés dans InventoryItem (sans commit).
+    Les mouvements insérés pendant la passe (non encore visibles) restent en
+    attente pour la suivante : rien n'est compté deux fois ni perdu.
+    """
+    M = models.StockMovement
+    batch = models.generate_uuid()
+    claim = update(M).where(M.compaction_id.is_(None)).values(compaction_id=batch)
+    if company_id:
+        claim = claim.where(M.company_id == company_id)
+    claimed = db.execute(claim.returning(M.id, M.item_id, M.quantity, M.unit_price)).all()
+    if not claimed:
+        return {"batch": None, "movements": 0, "items": 0}
+
+    # Par article : somme des quantités, prix du dernier mouvement
+    totals = {}
+    for movement_id, item_id, quantity, unit_price in sorted(claimed):
+        total = totals.setdefault(item_id, {"b_id": item_id, "b_quantity": 0, "b_price": None})
+        total["b_quantity"] += quantity or 0
+        if unit_price is not None:
+            total["b_price"] = unit_price
+
+    # Ordre des ids fixe : deux compactages concurrents verrouillent les articles dans le même ordre
+    table = models.InventoryItem.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("b_id")).values(
+            quantity_on_hand=func.coalesce(table.c.quantity_on_hand, 0) + bindparam("b_quantity"),
+            unit_price=func.coalesce(bindparam("b_price"), table.c.unit_price),
+        ),
+        [totals[item_id] for item_id in sorted(totals)],
+    )
+    return {"batch": batch, "movements": len(claimed), "items": len(totals)}
+
+
+def compact_scheduled(session_factory):
+    """Compactage de toutes les sociétés (job planifié)."""
+    db = session_factory()
+    try:
+        report = compact_movements(db)
+        db.commit()
+    finally:
+        db.close()
+    if report["movements"]:
+        print(f"🗜️ STOCK : {report['movements']} mouvements compactés sur {report['items']} articles.")
+    return report
+
+
+# --- LECTURES (STOCK COMPACTÉ + QUEUE) ---
+
+def pending_quantities(company_id: str):
+    """Sous-requête (item_id, quantity) : mouvements non compactés, agrégés par article."""
+    M = models.StockMovement
+    return select(M.item_id, func.sum(M.quantity).label("quantity"))\
+        .where(M.company_id == company_id, M.compaction_id.is_(None))\
+        .group_by(M.item_id)\
+        .subquery()
+
+
+def on_hand_query(company_id: str, fields):
+    """
+    SELECT des champs demandés d'InventoryItem, quantity_on_hand remplacé par
+    le stock disponible. Retourne (requête, expression du stock disponible).
+    """
+    I = models.InventoryItem
+    tail = pending_quantities(company_id)
+    on_hand = func.coalesce(I.quantity_on_hand, 0) + func.coalesce(tail.c.quantity, 0)
+    columns = [on_hand.label(name) if name == "quantity_on_hand" else getattr(I, name) for name in fields]
+    query = select(*columns).outerjoin(tail, tail.c.item_id == I.id).where(I.company_id == company_id)
+    return query, on_hand
+
+
+def low_stock_query(company_id: str, fields):
+    """
+    Articles au seuil d'alerte ou en dessous. Candidats : stock compacté sous
+    le seuil (index ix_inventory_items_company_low_stock) ou queue en attente
+    (index partiel) ; le stock disponible tranche ensuite.
+    """
+    I, M = models.InventoryItem, models.StockMovement
+    query, on_hand = on_hand_query(company_id, fields)
+    candidates = union(
+        select(I.id).where(I.company_id == company_id, I.quantity_on_hand - I.low_stock_threshold <= 0),
+        select(M.item_id).where(M.company_id == company_id, M.compaction_id.is_(None)),
+    )
+    return query.where(I.id.in_(candidates), on_hand <= I.low_stock_threshold)\
+        .order_by(on_hand - I.low_stock_threshold, I.product_name)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Registre des stocks AURA")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--company", default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = compact_movements(db, args.company)
+        db.commit()
+    finally:
+        db.close()
+    print(f"✅ {report['movements']} mouvements compactés sur {report['items']} articles.")
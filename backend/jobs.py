@@ -0,0 +1,113 @@
+import asyncio
+import os
+
+# --- FILE D'ATTENTE DES SCANS (WORKERS BORNÉS) ---
+# Les analyses du Cerveau UHG (upload Gemini, polling, génération) sont longues :
+# elles ne doivent pas retenir la requête. Les routes déposent un job (une
+# coroutine) dans une file bornée, un nombre fixe de workers la consomme. Les
+# appels bloquants du SDK passent par asyncio.to_thread dans gemini_client.py,
+# le CPU du prétraitement par le pool de processus de preprocess.py.
+
+SCAN_WORKERS = int(os.getenv("AURA_SCAN_WORKERS", "4"))
+SCAN_QUEUE_SIZE = int(os.getenv("AURA_SCAN_QUEUE_SIZE", "100"))
+
+
+class ScanJobQueue:
+    def __init__(self, workers: int = SCAN_WORKERS, max_pending: int = SCAN_QUEUE_SIZE):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = None
+        self._tasks = []
+
+    def _ensure_started(self):
+        # Démarrage paresseux : la file doit être créée dans la boucle qui l'utilise
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🧵 FILE SCAN : {self.workers} workers, {self.max_pending} jobs en attente max.")
+
+    async def _worker(self):
+        while True:
+            func, args = await self._queue.get()
+            try:
+                await func(*args)
+            except Exception as e:
+                print(f"❌ Job scan en échec ({e}).")
+            finally:
+                self._queue.task_done()
+
+    def is_full(self) -> bool:
+        self._ensure_started()
+        return self._queue.full()
+
+    def submit(self, func, *args) -> bool:
+        """
+        Dépose un job (fonction async) sans attendre. Retourne False si la file est pleine
+        (l'appelant répond alors 503 plutôt que de laisser la latence exploser).
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((func, args))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def put(self, func, *args):
+        """Dépose un job en attendant une place (reprise de fond ; les routes utilisent submit)."""
+        self._ensure_started()
+        await self._queue.put((func, args))
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def shutdown(self):
+        if self._queue is None:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue = None
+        self._tasks = []
+
+
+# --- TÂCHES PÉRIODIQUES ---
+# Travail de fond à intervalle fixe (clôture des amortissements...) : la
+# fonction bloquante tourne dans un thread, la boucle reste libre (une fonction
+# async est attendue directement). Première exécution après un intervalle
+# complet, pour ne pas alourdir le démarrage, sauf immediate=True.
+# Les fonctions planifiées doivent être idempotentes : chaque worker uvicorn
+# a son propre planificateur.
+
+class PeriodicJob:
+    def __init__(self, name: str, interval_seconds: float, func, *args, immediate: bool = False):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.args = args
+        self.immediate = immediate
+        self._task = None
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        if not self.immediate:
+            await asyncio.sleep(self.interval_seconds)
+        while True:
+            try:
+                if asyncio.iscoroutinefunction(self.func):
+                    await self.func(*self.args)
+                else:
+                    await asyncio.to_thread(self.func, *self.args)
+            except Exception as e:
+                print(f"❌ Tâche périodique {self.name} en échec ({e}).")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
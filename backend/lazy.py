@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+from metrics import LAZY_INIT_SECONDS
+
+# --- SINGLETONS PARESSEUX (DÉMARRAGE À FROID) ---
+# Les ressources coûteuses (SDK Google + modèle Gemini, contexte bcrypt) ne
+# sont plus construites à l'import de main : un worker ou un réplica ajouté
+# pendant un pic de trafic sert ses premières requêtes sans les attendre.
+# Construction au premier usage (get / aget), ou préchauffage en tâche de fond
+# depuis le lifespan (warm). Une seule construction même sous concurrence.
+
+
+class Lazy:
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._ready = False
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self):
+        """Valeur, construite au premier appel. Bloquant : threadpool ou aget()."""
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    start = time.perf_counter()
+                    self._value = self._factory()
+                    self._ready = True
+                    elapsed = time.perf_counter() - start
+                    LAZY_INIT_SECONDS.labels(self.name).set(elapsed)
+                    print(f"⚡ {self.name} initialisé en {elapsed:.2f}s")
+        return self._value
+
+    async def aget(self):
+        """Depuis une coroutine : la construction éventuelle passe par un thread."""
+        if self._ready:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    async def warm(self):
+        """Préchauffage en tâche de fond ; un échec laisse la construction au premier usage."""
+        try:
+            await self.aget()
+        except Exception as e:
+            print(f"⚠️ Préchauffage {self.name} impossible : {e}")
+
+    def set(self, value):
+        """Remplace la valeur (client injecté, tests de charge)."""
+        with self._lock:
+            self._value = value
+            self._ready = True
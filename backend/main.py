@@ -1,39 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Request, Response, Query, Header
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, desc, or_, and_, func
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
+from typing import List, Union
 import os
+import math
 import time
-import json
-import shutil
+import asyncio
+import anyio
+import secrets
 import uuid
+import zipfile
 from pathlib import Path
 from dotenv import load_dotenv
-from passlib.context import CryptContext
-from datetime import datetime
+from datetime import datetime, date, timedelta, timezone
+from contextlib import asynccontextmanager
 
 # --- IMPORTS LOCAUX (Connexion BDD) ---
 import models
-from database import engine, SessionLocal
+from database import engine, async_engine, SessionLocal, AsyncSessionLocal
+from jobs import ScanJobQueue, PeriodicJob
+from analysis_cache import AnalysisCache, find_cached_result
+from migrations import upgrade, missing_tables
+from storage import BlobStorage, UploadTooLarge
+from batch_scan import (
+    BATCH_MAX_DOCUMENTS, BATCH_CONCURRENCY, BATCH_COMMIT_SIZE, STREAM_MEDIA_TYPES,
+    BatchTooLarge, InvalidArchive, is_zip, open_archive, guess_type, encode_event
+)
+from inventory import process_inventory_updates, compact_scheduled, on_hand_query, low_stock_query
+from pagination import encode_cursor, decode_cursor
+from summaries import apply_transaction, read_summary
+from reports import compute_tax_report
+from depreciation import run_depreciation, run_scheduled
+from export import iter_memory, gzip_stream
+from tax_free import (
+    TAX_FREE_BATCH_MAX, QR_MEDIA_TYPES, QR_ROUTE, QRCodeCache, compute_refunds, qr_payload, qr_url
+)
+import numpy as np
+from gemini_client import GeminiClient, AnalyzerError, AnalyzerUnavailable
+import metrics
+from metrics import ANALYZER_OUTCOMES, AUTH_OUTCOMES, stage
+from lazy import Lazy
+from auth import PasswordHasher, LoginThrottle, SessionTokens, AuthBusy, LoginThrottled
+from sentinelle import SentinelleMiddleware
+from preprocess import DocumentPreprocessor, CorruptDocument, check_declared
+from schemas import (
+    TransactionOut, DashboardPage, InventoryItemOut, InventoryColumns, FastJSONResponse,
+    columns_for, as_records, as_columns
+)
 
 # 1. Chargement des variables d'environnement
 dotenv_path = Path(__file__).resolve().parent / '.env'
 load_dotenv(dotenv_path=dotenv_path)
 
-# 2. Création automatique des tables
-models.Base.metadata.create_all(bind=engine)
+# 2. SCHÉMA : étape de migration explicite (python migrations.py) avant le
+# démarrage des workers ; AURA_AUTO_MIGRATE=1 la lance dans le lifespan (dev local)
+AUTO_MIGRATE = os.getenv("AURA_AUTO_MIGRATE", "0") == "1"
+# Préchauffage de Gemini et bcrypt en tâche de fond au démarrage (sinon au premier usage)
+WARM_START = os.getenv("AURA_WARM_START", "1") == "1"
 
 # 3. CONFIGURATION SÉCURITÉ (Mots de passe)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def get_password_hash(password):
-    return pwd_context.hash(password[:72])
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password[:72], hashed_password)
+# bcrypt dans un pool de processus dédié, échecs répétés freinés par email,
+# jetons de session de courte durée : voir auth.py
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
+# Routes /{user_id} : jeton de session obligatoire (sinon seulement vérifié s'il est présenté)
+REQUIRE_SESSION = os.getenv("AURA_REQUIRE_SESSION", "0") == "1"
+session_tokens = SessionTokens.from_env()
 
 # --- DÉPENDANCE BDD ---
 def get_db():
@@ -43,37 +80,158 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_company_for_owner(db: AsyncSession, user_id: str):
+    result = await db.execute(select(models.Company).where(models.Company.owner_id == user_id))
+    return result.scalars().first()
+
+# --- PROMPT EXPERT FISCAL 2025 ---
+UHG_TAX_PROMPT = """
+    You are AURA, the elite AI Tax Auditor for Dubai (UAE).
+    Analyze this financial document.
+   
+    APPLY UAE TAX LAWS STRICTLY:
+    1. VAT (Value Added Tax): Standard rate is 5%.
+    2. CORPORATE TAX:
+       - 0% on Net Profit up to 375,000 AED.
+       - 9% on Net Profit exceeding 375,000 AED.
+    3. EXCISE TAX (Sin Tax):
+       - 50% on Carbonated drinks.
+       - 100% on Energy drinks, Tobacco, Vapes.
+    4. DEDUCTIBILITY: Only legitimate business expenses are deductible.
+   
+    Respond ONLY with this JSON format (no markdown):
+    {
+        "merchant": "Vendor Name",
+        "date": "YYYY-MM-DD",
+        "total": 0.00,
+        "tax": 0.00,
+        "currency": "AED",
+        "category": "Category",
+        "description": "Short description",
+        "is_deductible": true/false,
+        "tax_rule_applied": "e.g. 'Standard 5% VAT'",
+        "justification": "Why based on UAE Law",
+        "line_items": [{"name": "Product", "sku": "Ref", "quantity": 0, "unit_price": 0.00}]
+    }
+    """
+
 # 4. INITIALISATION DU CERVEAU UHG (VERSION GEMINI 2.0)
-client_gemini = None
-mode_ia = "GEMINI"  # On tente le vrai mode par défaut
+# Backend d'analyse : "gemini" (défaut), "fake" (faux Gemini local, tests de charge
+# hors ligne, voir fake_gemini.py) ou "simulation" (reçu de démonstration fixe)
+ANALYZER_BACKEND = os.getenv("AURA_ANALYZER", "gemini").lower()
 
 print("--- DÉMARRAGE DU SYSTÈME UHG ---")
 
-try:
-    import google.generativeai as genai
+def build_analyzer():
+    """
+    (mode_ia, client Gemini résilient ou None). Le SDK Google n'est importé et
+    configuré qu'ici : au premier scan, ou en tâche de fond depuis le lifespan.
+    """
+    if ANALYZER_BACKEND == "fake":
+        import fake_gemini
+        genai, client_gemini = fake_gemini.from_env()
+        print("🧪 MOTEUR IA : faux Gemini local (hors ligne)")
+        return "FAKE", GeminiClient(genai, client_gemini, UHG_TAX_PROMPT)
+    if ANALYZER_BACKEND == "simulation":
+        return "SIMULATION", None
+
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        print("⚠️ Module Google non installé ou obsolète.")
+        return "SIMULATION", None
+
     api_key_google = os.getenv("GOOGLE_API_KEY")
-    if api_key_google:
-        genai.configure(api_key=api_key_google)
-        try:
-            # --- ALIGNEMENT SUR LE PROJET L'OMBRE ---
-            client_gemini = genai.GenerativeModel('gemini-2.0-flash')
-            print(f"✅ MOTEUR IA ACTIF : Gemini 2.0 Flash (Héritage L'Ombre)")
-        except Exception as e:
-            print(f"⚠️ Erreur initialisation modèle : {e}")
-            print("👉 Passage en mode SIMULATION de secours.")
-            mode_ia = "SIMULATION"
-    else:
+    if not api_key_google:
         print("⚠️ ERREUR : Clé GOOGLE_API_KEY introuvable.")
-        mode_ia = "SIMULATION"
-except ImportError:
-    print("⚠️ Module Google non installé ou obsolète.")
-    mode_ia = "SIMULATION"
+        return "SIMULATION", None
+
+    genai.configure(api_key=api_key_google)
+    try:
+        # --- ALIGNEMENT SUR LE PROJET L'OMBRE ---
+        client_gemini = genai.GenerativeModel('gemini-2.0-flash')
+        print(f"✅ MOTEUR IA ACTIF : Gemini 2.0 Flash (Héritage L'Ombre)")
+    except Exception as e:
+        print(f"⚠️ Erreur initialisation modèle : {e}")
+        print("👉 Passage en mode SIMULATION de secours.")
+        return "SIMULATION", None
+
+    # Client Gemini résilient (concurrence bornée, retries, disjoncteur)
+    return "GEMINI", GeminiClient(genai, client_gemini, UHG_TAX_PROMPT)
+
+analyzer = Lazy("analyzer", build_analyzer)
+
+# File d'analyse asynchrone (les scans ne bloquent plus la boucle d'événements)
+scan_jobs = ScanJobQueue()
+
+# Reprise des jobs orphelins (file perdue à l'arrêt, file pleine) : au démarrage
+# puis périodiquement, les documents PENDING / ANALYZING sans nouvelles depuis
+# AURA_SCAN_STALE_SECONDS (au-delà de la plus longue analyse, nouvelles
+# tentatives comprises) sont remis dans la file. 0 = désactivée.
+SCAN_STALE_SECONDS = float(os.getenv("AURA_SCAN_STALE_SECONDS", "1800"))
+SCAN_RECOVERY_INTERVAL = float(os.getenv("AURA_SCAN_RECOVERY_INTERVAL_SECONDS", "300"))
+
+# Clôture des amortissements : passe incrémentale planifiée (0 = désactivée, cron
+# `python depreciation.py run` à la place). Idempotente : sans risque multi-workers.
+DEPRECIATION_INTERVAL_HOURS = float(os.getenv("AURA_DEPRECIATION_INTERVAL_HOURS", "24"))
+depreciation_job = PeriodicJob("amortissements", DEPRECIATION_INTERVAL_HOURS * 3600, run_scheduled, SessionLocal)
+
+# Compactage du registre des stocks dans les soldes d'InventoryItem (0 = désactivé)
+STOCK_COMPACTION_INTERVAL = float(os.getenv("AURA_STOCK_COMPACTION_INTERVAL_SECONDS", "300"))
+stock_compaction_job = PeriodicJob("compactage stock", STOCK_COMPACTION_INTERVAL, compact_scheduled, SessionLocal)
+
+# Métriques : requêtes SQL des deux moteurs, profondeur de la file de scan
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+metrics.SCAN_QUEUE_PENDING.set_function(scan_jobs.pending)
+
+# Cache des analyses par empreinte SHA-256 (évite de repayer Gemini pour un doublon)
+analysis_cache = AnalysisCache()
+
+# Stockage des pièces justificatives (adressage par contenu, taille bornée)
+blob_storage = BlobStorage()
+
+# Prétraitement avant envoi au Cerveau UHG (pool de processus, voir preprocess.py)
+preprocessor = DocumentPreprocessor()
+
+# QR codes Tax Free générés localement (cache LRU par empreinte du contenu)
+qr_cache = QRCodeCache()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE:
+        await asyncio.to_thread(upgrade, engine)
+    else:
+        missing = await asyncio.to_thread(missing_tables, engine)
+        if missing:
+            print(f"⚠️ Schéma incomplet ({', '.join(missing)}) : lancez `python migrations.py` "
+                  "(ou AURA_AUTO_MIGRATE=1).")
+    # Le worker accepte les requêtes pendant que Gemini et bcrypt se préparent
+    warmups = [asyncio.create_task(r.warm()) for r in (analyzer, password_hasher)] if WARM_START else []
+    if WARM_START:
+        preprocessor.warm()
+    scan_recovery_job.start()
+    depreciation_job.start()
+    stock_compaction_job.start()
+    yield
+    await scan_recovery_job.stop()
+    await stock_compaction_job.stop()
+    await depreciation_job.stop()
+    await asyncio.gather(*warmups)
+    await scan_jobs.shutdown()
+    await asyncio.to_thread(preprocessor.shutdown)
+    await asyncio.to_thread(password_hasher.shutdown)
 
 # 5. CONFIGURATION API
 app = FastAPI(
     title="AURA Financial Core",
     description="API du Directeur Financier Artificiel - Engineered by UHG-Tech Corp",
-    version="2.5.0" # VERSION FINALE MVP (Partner Ready)
+    version="2.5.0", # VERSION FINALE MVP (Partner Ready)
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -85,20 +243,12 @@ app.add_middleware(
 )
 
 # --- SÉCURITÉ SENTINELLE ---
-BANNED_IPS = ["1.2.3.4", "bad.actor.ip"]
-
-class SentinelleMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        if client_ip in BANNED_IPS:
-            return JSONResponse(status_code=403, content={"error": "Sentinelle Block: IP Banned"})
-       
-        response = await call_next(request)
-        response.headers["X-Security-By"] = "UHG-Sentinelle-AI"
-        return response
-
+# Bannissements CIDR rechargeables et limitation de débit du scan : voir sentinelle.py
 app.add_middleware(SentinelleMiddleware)
 
+# Latence par route (ajouté en dernier = le plus externe : inclut les autres middlewares)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # --- MODÈLES DE DONNÉES ---
 
 class UserCreate(BaseModel):
@@ -114,69 +264,32 @@ class TaxFreeRequest(BaseModel):
     amount_total: float
     merchant_name: str
 
+class TaxFreeBatchRequest(BaseModel):
+    receipts: List[TaxFreeRequest]
+
 # --- FONCTION D'ANALYSE (HYBRIDE) ---
 
-def analyze_document_with_uhg_brain(file_path: str, mime_type: str):
+async def analyze_document_with_uhg_brain(file_path: str, mime_type: str, company_id: str = None):
     """
     Envoie le document à Gemini 2.0 avec les règles fiscales EAU 2025.
-    Si échec (Quota), bascule en simulation.
+    En cas d'échec (quota, disjoncteur ouvert), lève AnalyzerError :
+    aucune donnée simulée n'est écrite dans les livres.
+    Le mode SIMULATION ne sert que sans clé Gemini (démo hors ligne).
     """
-   
-    # 1. TENTATIVE RÉELLE (GEMINI 2.0)
-    if mode_ia == "GEMINI":
-        try:
-            print(f"⚡ Envoi au Cloud UHG (Gemini 2.0)...")
-            uploaded_file = genai.upload_file(file_path, mime_type=mime_type)
-           
-            # Attente active si le fichier est gros
-            while uploaded_file.state.name == "PROCESSING":
-                time.sleep(1)
-                uploaded_file = genai.get_file(uploaded_file.name)
-
-            # --- PROMPT EXPERT FISCAL 2025 ---
-            prompt = """
-            You are AURA, the elite AI Tax Auditor for Dubai (UAE).
-            Analyze this financial document.
-           
-            APPLY UAE TAX LAWS STRICTLY:
-            1. VAT (Value Added Tax): Standard rate is 5%.
-            2. CORPORATE TAX:
-               - 0% on Net Profit up to 375,000 AED.
-               - 9% on Net Profit exceeding 375,000 AED.
-            3. EXCISE TAX (Sin Tax):
-               - 50% on Carbonated drinks.
-               - 100% on Energy drinks, Tobacco, Vapes.
-            4. DEDUCTIBILITY: Only legitimate business expenses are deductible.
-           
-            Respond ONLY with this JSON format (no markdown):
-            {
-                "merchant": "Vendor Name",
-                "date": "YYYY-MM-DD",
-                "total": 0.00,
-                "tax": 0.00,
-                "currency": "AED",
-                "category": "Category",
-                "description": "Short description",
-                "is_deductible": true/false,
-                "tax_rule_applied": "e.g. 'Standard 5% VAT'",
-                "justification": "Why based on UAE Law",
-                "line_items": [{"name": "Product", "sku": "Ref", "quantity": 0, "unit_price": 0.00}]
-            }
-            """
-           
-            response = client_gemini.generate_content([prompt, uploaded_file])
-            json_str = response.text.replace("```json", "").replace("```", "").strip()
-            data = json.loads(json_str)
-            print("✅ Analyse Fiscale Gemini 2.0 réussie.")
-            return data
+    # 0. PRÉTRAITEMENT (réduction, EXIF retiré, pages utiles ; CorruptDocument si illisible)
+    prepared = await preprocessor.prepare(file_path, mime_type)
 
-        except Exception as e:
-            print(f"❌ Erreur Gemini 2.0 ({e}). Bascule automatique en Simulation.")
-            pass
+    # 1. ANALYSE RÉELLE (GEMINI 2.0)
+    _, gemini = await analyzer.aget()
+    if gemini is not None:
+        result = await gemini.analyze(prepared.path, prepared.mime_type, company_id)
+        ANALYZER_OUTCOMES.labels("real").inc()
+        return result
 
-    # 2. FALLBACK SIMULATION
-    print("⚡ Mode Simulation (Secours) activé.")
-    time.sleep(1.5)
+    # 2. MODE SIMULATION (pas de clé API)
+    print("⚡ Mode Simulation activé.")
+    await asyncio.sleep(1.5)
+    ANALYZER_OUTCOMES.labels("simulated").inc()
     return {
         "merchant": "Apple Store Dubai Mall (Sim)",
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -184,61 +297,40 @@ def analyze_document_with_uhg_brain(file_path: str, mime_type: str):
         "tax": 400.00,
         "currency": "AED",
         "category": "Inventory",
-        "description": "Achat Stock iPhone 15 Pro Max (Backup)",
+        "description": "Achat Stock iPhone 15 Pro Max (Simulation)",
         "is_deductible": True,
         "tax_rule_applied": "Standard 5% VAT",
-        "justification": "Achat de marchandises (Mode Secours).",
+        "justification": "Achat de marchandises (Mode Simulation).",
         "line_items": [
             {"name": "iPhone 15 Pro Max 256GB", "quantity": 2, "unit_price": 4200.0, "sku": "IPH-15PM-256"}
         ]
     }
 
-# --- MOTEUR 3 : GESTION DES STOCKS ---
-
-def process_inventory_updates(db: Session, company_id: str, ai_data: dict):
-    items_extracted = ai_data.get("line_items", [])
-    if not items_extracted: return
-
-    print(f"📦 MOTEUR 3 : Traitement de {len(items_extracted)} articles de stock...")
-
-    for item in items_extracted:
-        p_name = item.get("name")
-        p_qty = item.get("quantity", 0)
-        p_price = item.get("unit_price", 0.0)
-        p_sku = item.get("sku")
-        if not p_sku: p_sku = "GEN-" + str(uuid.uuid4())[:8].upper()
-
-        if p_qty > 0 and p_name:
-            existing_item = db.query(models.InventoryItem).filter(
-                models.InventoryItem.company_id == company_id,
-                models.InventoryItem.product_name == p_name
-            ).first()
-
-            if existing_item:
-                existing_item.quantity_on_hand += p_qty
-                existing_item.unit_price = p_price
-            else:
-                new_item = models.InventoryItem(
-                    company_id=company_id,
-                    product_name=p_name,
-                    sku=p_sku,
-                    quantity_on_hand=p_qty,
-                    unit_price=p_price,
-                    low_stock_threshold=5
-                )
-                db.add(new_item)
-    db.commit()
-
 # --- ROUTES API ---
 
 @app.get("/")
 def home():
-    return {"system": "UHG-Tech AURA", "status": "Online", "ai_engine": mode_ia, "version": "2.5.0"}
+    # Sonde de santé : ne déclenche pas l'initialisation de Gemini
+    mode_ia, gemini = analyzer.get() if analyzer.ready else ("STARTING", None)
+    return {
+        "system": "UHG-Tech AURA",
+        "status": "Online",
+        "ai_engine": mode_ia,
+        "ai_circuit": gemini.breaker.state if gemini else None,
+        "version": "2.5.0"
+    }
+
+# 0. MÉTRIQUES (PROMETHEUS)
+@app.get("/metrics")
+def get_metrics():
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
 
 # 1. INSCRIPTION
 @app.post("/auth/register", status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.User).where(models.User.email == user_data.email))
+    existing_user = result.scalars().first()
     if existing_user:
         if user_data.email == "franck.abe@uhg-demo.com":
              return {"success": True, "message": "Demo User OK.", "user_id": existing_user.id}
@@ -248,137 +340,693 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     if user_data.email == "franck.abe@uhg-demo.com":
         custom_id = "user_demo_franck_abe"
 
+    # bcrypt est coûteux en CPU : pool de processus dédié, pas le threadpool partagé,
+    # et sans garder de connexion pendant l'attente
+    await db.rollback()
+    try:
+        password_hash = await password_hasher.hash(user_data.password)
+    except AuthBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
     new_user = models.User(
         id=custom_id,
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password)
+        password_hash=password_hash
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    profile = models.Profile(id=new_user.id, full_name=user_data.full_name)
-    db.add(profile)
-
-    company = models.Company(
+    db.add(models.Profile(id=new_user.id, full_name=user_data.full_name))
+    db.add(models.Company(
         owner_id=new_user.id,
         name=f"{user_data.full_name} Global Ltd",
         is_free_zone=True
-    )
-    db.add(company)
-    db.commit()
+    ))
+    await db.commit()
+    # Échecs enregistrés avant l'inscription : ils ne visaient aucun compte
+    login_throttle.record_success(user_data.email)
 
     return {"success": True, "message": "Compte créé.", "user_id": new_user.id}
 
 # 2. CONNEXION
 @app.post("/auth/login")
-def login(creds: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == creds.email).first()
-    if not user or not verify_password(creds.password, user.password_hash):
+async def login(creds: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    # Email en attente après trop d'échecs : refus immédiat, sans base ni bcrypt
+    try:
+        known_failure = login_throttle.check(creds.email, creds.password)
+    except LoginThrottled as e:
+        AUTH_OUTCOMES.labels("throttled").inc()
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+    result = await db.execute(
+        select(models.User.id, models.User.password_hash, models.Profile.full_name)
+        .outerjoin(models.Profile, models.Profile.id == models.User.id)
+        .where(models.User.email == creds.email)
+    )
+    user = result.first()
+    # Connexion rendue au pool avant bcrypt : les connexions en file n'immobilisent pas la base
+    await db.rollback()
+    try:
+        # Mot de passe déjà refusé pour cet email : pas de nouveau calcul bcrypt
+        valid = bool(user) and not known_failure and await password_hasher.verify(creds.password, user.password_hash)
+    except AuthBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if not valid:
+        # Email inconnu : rien à protéger, et rien à garder qui bloquerait une inscription future
+        if user:
+            login_throttle.record_failure(creds.email, creds.password)
+        AUTH_OUTCOMES.labels("cached_failure" if known_failure else "failure").inc()
         raise HTTPException(status_code=400, detail="Accès refusé.")
-    return {"success": True, "user_id": user.id, "name": user.profile.full_name}
+
+    login_throttle.record_success(creds.email)
+    AUTH_OUTCOMES.labels("success").inc()
+    return {"success": True, "user_id": user.id, "name": user.full_name, **session_tokens.issue(user.id)}
+
+def require_session(authorization: str = Header(None)) -> str:
+    """user_id du jeton de session "Authorization: Bearer ..." (401 sinon)."""
+    scheme, _, token = (authorization or "").partition(" ")
+    user_id = session_tokens.verify(token) if scheme.lower() == "bearer" else None
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Session invalide ou expirée.", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+def check_owner(user_id: str, authorization: str = None):
+    """
+    Un jeton présenté doit appartenir à user_id (401 invalide, 403 autre utilisateur).
+    Sans jeton, l'accès reste permis tant que AURA_REQUIRE_SESSION=0.
+    """
+    if authorization is None and not REQUIRE_SESSION:
+        return
+    if require_session(authorization) != user_id:
+        raise HTTPException(status_code=403, detail="Session d'un autre utilisateur.")
+
+async def session_owner(user_id: str, authorization: str = Header(None)):
+    """Routes /{user_id} : voir check_owner."""
+    check_owner(user_id, authorization)
+
+# 2b. SESSION : vérification et renouvellement du jeton, sans renvoyer les identifiants
+@app.get("/auth/session")
+def get_session(user_id: str = Depends(require_session)):
+    return {"success": True, "user_id": user_id}
+
+@app.post("/auth/session/refresh")
+def refresh_session(user_id: str = Depends(require_session)):
+    return {"success": True, "user_id": user_id, **session_tokens.issue(user_id)}
 
 # 3. UPLOAD & ANALYSE (BLACK BOX)
-@app.post("/api/aura/scan/{user_id}")
+
+def record_scan_result(db: Session, doc_entry: models.FinancialDocument, ai_result: dict, remember: bool = True):
+    """
+    Passe l'écriture comptable, met à jour le stock et alimente la Black Box.
+    remember=False pour un résultat servi par le cache (déjà présent en Black Box).
+    """
+    entry_ref = f"J-{time.strftime('%Y')}-{doc_entry.id[:8].upper()}"
+    try:
+        tx_date = datetime.strptime(ai_result.get("date"), "%Y-%m-%d")
+    except:
+        tx_date = datetime.now()
+
+    new_tx = models.Transaction(
+        company_id=doc_entry.company_id,
+        document_id=doc_entry.id,
+        entry_number=entry_ref,
+        date=tx_date,
+        merchant_name=ai_result.get("merchant"),
+        description=ai_result.get("description"),
+        amount_total=ai_result.get("total"),
+        amount_tax=ai_result.get("tax"),
+        currency=ai_result.get("currency"),
+        category=ai_result.get("category"),
+        is_tax_deductible=ai_result.get("is_deductible"),
+        deduction_justification=ai_result.get("justification")
+    )
+    db.add(new_tx)
+
+    # Agrégats du tableau de bord (même transaction que l'écriture)
+    apply_transaction(db, new_tx)
+
+    # Moteur 3
+    if ai_result.get("line_items"):
+        with stage("inventory_update"):
+            process_inventory_updates(db, doc_entry.company_id, ai_result, document_id=doc_entry.id)
+
+    if not remember:
+        return
+
+    # BLACK BOX STRATEGY
+    memory = models.AuraMemory(
+        document_id=doc_entry.id,
+        raw_text_input=f"Prompt: Expert Fiscal UAE 2025 | File: {doc_entry.filename}",
+        ai_json_output=ai_result
+    )
+    db.add(memory)
+    print(f"💎 BLACK BOX : Donnée d'entraînement sauvegardée (Ref: {doc_entry.id})")
+
+async def process_scan_job(document_id: str):
+    """
+    Job exécuté par un worker de la file d'analyse.
+    La progression est suivie dans FinancialDocument.status :
+    PENDING -> ANALYZING -> COMPLETED | FAILED | AI_UNAVAILABLE.
+    """
+    async with AsyncSessionLocal() as db:
+        # Prise en charge atomique : un document remis en file deux fois (reprise,
+        # plusieurs workers uvicorn) n'est analysé qu'une fois
+        claimed = await db.execute(
+            update(models.FinancialDocument)
+            .where(models.FinancialDocument.id == document_id, models.FinancialDocument.status == "PENDING")
+            .values(status="ANALYZING", status_updated=utc_now())
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return
+        doc_entry = await db.get(models.FinancialDocument, document_id)
+
+        try:
+            # APPEL CERVEAU (attente des quotas et nouvelles tentatives comprises)
+            with stage("analysis"):
+                ai_result = await analyze_document_with_uhg_brain(
+                    doc_entry.file_path, doc_entry.file_type, doc_entry.company_id
+                )
+            if not ai_result:
+                raise AnalyzerError("Réponse IA vide.")
+            await db.run_sync(lambda sync_db: record_scan_result(sync_db, doc_entry, ai_result))
+            doc_entry.status = "COMPLETED"
+            with stage("db_commit"):
+                await db.commit()
+        except Exception as e:
+            print(f"❌ Job {document_id} en échec ({e}).")
+            if isinstance(e, AnalyzerError):
+                ANALYZER_OUTCOMES.labels("unavailable" if isinstance(e, AnalyzerUnavailable) else "failed").inc()
+            await db.rollback()
+            doc_entry.status = e.status if isinstance(e, AnalyzerError) else "FAILED"
+            await db.commit()
+            return
+
+        if doc_entry.content_hash:
+            analysis_cache.put(doc_entry.content_hash, doc_entry.company_id, ai_result)
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+async def recover_scan_jobs():
+    """
+    Remet dans la file les documents en attente dont plus aucun job ne
+    s'occupe. La remise à jour de status_updated sert de réservation : un
+    autre worker uvicorn qui balaie en même temps ne les reprend pas.
+    """
+    doc = models.FinancialDocument
+    now = utc_now()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(doc)
+            .where(
+                doc.status.in_(("PENDING", "ANALYZING")),
+                func.coalesce(doc.status_updated, doc.upload_date) < now - timedelta(seconds=SCAN_STALE_SECONDS),
+            )
+            .values(status="PENDING", status_updated=now)
+            .returning(doc.id)
+        )
+        orphans = list(result.scalars())
+        await db.commit()
+    for document_id in orphans:
+        await scan_jobs.put(process_scan_job, document_id)
+    if orphans:
+        print(f"🗂️ REPRISE : {len(orphans)} document(s) orphelin(s) renvoyé(s) dans la file d'analyse.")
+
+scan_recovery_job = PeriodicJob(
+    "reprise des scans", SCAN_RECOVERY_INTERVAL if SCAN_STALE_SECONDS > 0 else 0, recover_scan_jobs, immediate=True
+)
+
+@app.post("/api/aura/scan/{user_id}", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(session_owner)])
 async def scan_document(
     user_id: str,
+    response: Response,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    company = db.query(models.Company).filter(models.Company.owner_id == user_id).first()
+    company = await get_company_for_owner(db, user_id)
     if not company:
         raise HTTPException(status_code=404, detail="Société introuvable.")
 
-    upload_dir = Path("uploads")
-    upload_dir.mkdir(exist_ok=True)
-    filename = f"{user_id}_{int(time.time())}_{file.filename}"
-    file_path = upload_dir / filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    if scan_jobs.is_full():
+        raise HTTPException(status_code=503, detail="File d'analyse saturée, réessayez plus tard.",
+                            headers={"Retry-After": "5"})
+
+    # Écriture par morceaux, empreinte calculée au fil de l'eau
+    try:
+        with stage("file_write"):
+            blob = await blob_storage.save_upload(file)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Fichier trop volumineux.")
+    content_hash = blob.content_hash
 
     doc_entry = models.FinancialDocument(
         company_id=company.id,
         filename=file.filename,
-        file_path=str(file_path),
+        file_path=str(blob.path),
         file_type=file.content_type,
-        status="ANALYZING"
+        content_hash=content_hash,
+        status="PENDING"
     )
     db.add(doc_entry)
-    db.commit()
 
-    # APPEL CERVEAU
-    ai_result = analyze_document_with_uhg_brain(str(file_path), file.content_type)
+    # Doublon déjà analysé : pas d'appel au Cerveau UHG
+    cached = await db.run_sync(analysis_cache.get, content_hash, company.id)
+    if cached is not None:
+        doc_entry.status = "COMPLETED"
+        await db.flush()
+        await db.run_sync(lambda sync_db: record_scan_result(sync_db, doc_entry, cached, remember=False))
+        with stage("db_commit"):
+            await db.commit()
+        ANALYZER_OUTCOMES.labels("cached").inc()
+        print(f"♻️ CACHE : Analyse réutilisée pour {file.filename} ({content_hash[:12]})")
+        response.status_code = status.HTTP_200_OK
+        return {"success": True, "job_id": doc_entry.id, "status": doc_entry.status, "cached": True, "data": cached}
+
+    # Disjoncteur ouvert : on échoue tout de suite plutôt que d'empiler des jobs voués à l'échec
+    _, gemini = await analyzer.aget()
+    if gemini and not gemini.is_available():
+        await db.rollback()
+        raise HTTPException(status_code=503, detail="Cerveau UHG momentanément indisponible, réessayez plus tard.")
+
+    # Contenu incohérent avec le type annoncé : refusé avant la file (quelques
+    # octets lus). Le prétraitement complet tourne dans le job.
+    try:
+        check_declared(doc_entry.file_path, doc_entry.file_type)
+    except CorruptDocument as e:
+        await db.rollback()
+        metrics.PREPROCESS_OUTCOMES.labels("rejected").inc()
+        raise HTTPException(status_code=422, detail=str(e))
+
+    await db.commit()
+
+    # File remplie pendant les await ci-dessus : pas de 202 pour un job qui ne tournerait jamais
+    if not scan_jobs.submit(process_scan_job, doc_entry.id):
+        await db.delete(doc_entry)
+        await db.commit()
+        raise HTTPException(status_code=503, detail="File d'analyse saturée, réessayez plus tard.",
+                            headers={"Retry-After": "5"})
+
+    return {
+        "success": True,
+        "job_id": doc_entry.id,
+        "status": doc_entry.status,
+        "status_url": f"/api/aura/scan/jobs/{doc_entry.id}"
+    }
+
+# 3a. SCAN PAR LOT (PLUSIEURS FICHIERS OU ARCHIVE ZIP)
+
+async def save_batch_files(files: List[UploadFile]) -> list:
+    """
+    Stocke chaque fichier du lot, archives ZIP dépliées.
+    Retourne [(nom, type MIME, StoredBlob ou None, erreur ou None)].
+    """
+    stored = []
+    for upload in files:
+        if not is_zip(upload):
+            if len(stored) >= BATCH_MAX_DOCUMENTS:
+                raise BatchTooLarge(f"plus de {BATCH_MAX_DOCUMENTS} documents")
+            try:
+                with stage("file_write"):
+                    blob = await blob_storage.save_upload(upload)
+                stored.append((upload.filename, upload.content_type, blob, None))
+            except UploadTooLarge:
+                stored.append((upload.filename, upload.content_type, None, "Fichier trop volumineux."))
+            continue
+
+        archive, members = await run_in_threadpool(open_archive, upload.file, BATCH_MAX_DOCUMENTS - len(stored))
+        for info in members:
+            try:
+                member = await run_in_threadpool(archive.open, info)
+                try:
+                    with stage("file_write"):
+                        blob = await blob_storage.save_stream(member)
+                finally:
+                    member.close()
+                stored.append((info.filename, guess_type(info.filename), blob, None))
+            except UploadTooLarge:
+                stored.append((info.filename, guess_type(info.filename), None, "Fichier trop volumineux."))
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                stored.append((info.filename, guess_type(info.filename), None, f"Membre d'archive illisible ({e})."))
+    return stored
+
+async def write_batch_results(db: AsyncSession, docs: dict, writes: list) -> int:
+    """
+    Écrit un lot de résultats (écritures, stock, Black Box, statuts) en un
+    seul commit. Si le commit groupé échoue, repli document par document :
+    un reçu défectueux ne fait pas perdre les autres.
+    """
+    def write(sync_db, entries):
+        for item, ai_result, doc_status, remember in entries:
+            doc_entry = docs[item["job_id"]]
+            doc_entry.status = doc_status
+            if ai_result is not None:
+                record_scan_result(sync_db, doc_entry, ai_result, remember=remember)
+
+    written = writes
+    try:
+        await db.run_sync(write, writes)
+        with stage("db_commit"):
+            await db.commit()
+    except Exception as e:
+        print(f"⚠️ LOT : commit groupé en échec ({e}), écriture document par document.")
+        await db.rollback()
+        written = []
+        for entry in writes:
+            try:
+                await db.run_sync(write, [entry])
+                await db.commit()
+                written.append(entry)
+            except Exception:
+                await db.rollback()
+                docs[entry[0]["job_id"]].status = "FAILED"
+                await db.commit()
+
+    for item, ai_result, doc_status, remember in written:
+        if remember and ai_result is not None:
+            analysis_cache.put(item["content_hash"], item["company_id"], ai_result)
+    return len(written)
+
+async def stream_batch_results(items: list, fmt: str):
+    """
+    Analyse les documents du lot en parallèle (BATCH_CONCURRENCY au plus),
+    envoie chaque résultat dès qu'il est prêt et écrit par lots de
+    BATCH_COMMIT_SIZE. Si le client se déconnecte, les résultats déjà
+    obtenus sont écrits et les documents restants repartent dans la file.
+    """
+    documents = [item for item in items if "job_id" in item]
+    yield encode_event(fmt, "accepted", {"documents": len(documents), "rejected": len(items) - len(documents)})
+    for item in items:
+        if "error" in item:
+            yield encode_event(fmt, "result", {
+                "index": item["index"], "filename": item["filename"], "status": "REJECTED", "error": item["error"]
+            })
+
+    # Un même contenu n'est analysé qu'une fois par lot
+    groups = {}
+    for item in documents:
+        groups.setdefault(item["content_hash"], []).append(item)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def analyze(group):
+        first = group[0]
+        async with semaphore:
+            try:
+                with stage("analysis"):
+                    return group, await analyze_document_with_uhg_brain(
+                        first["file_path"], first["file_type"], first["company_id"]
+                    )
+            except Exception as e:
+                return group, e
+
+    def outcome_entries(group, outcome):
+        if isinstance(outcome, Exception):
+            if isinstance(outcome, AnalyzerError):
+                ANALYZER_OUTCOMES.labels("unavailable" if isinstance(outcome, AnalyzerUnavailable) else "failed").inc()
+            doc_status = outcome.status if isinstance(outcome, AnalyzerError) else "FAILED"
+            return [(item, None, doc_status, False) for item in group]
+        # Seul le premier exemplaire alimente la Black Box
+        return [(item, outcome, "COMPLETED", position == 0) for position, item in enumerate(group)]
+
+    def result_event(entry, outcome):
+        item, ai_result, doc_status, _ = entry
+        payload = {"index": item["index"], "filename": item["filename"], "job_id": item["job_id"], "status": doc_status}
+        if ai_result is not None:
+            payload["data"] = ai_result
+        else:
+            payload["error"] = str(outcome)
+        return encode_event(fmt, "result", payload)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.FinancialDocument)
+            .where(models.FinancialDocument.id.in_([item["job_id"] for item in documents]))
+        )
+        docs = {doc.id: doc for doc in result.scalars()}
+        writes = []
+        totals = {}
+        pending = {}  # job_id du premier document -> (tâche, groupe)
 
-    if ai_result:
-        entry_ref = f"J-{time.strftime('%Y')}-{doc_entry.id[:8].upper()}"
         try:
-            tx_date = datetime.strptime(ai_result.get("date"), "%Y-%m-%d")
-        except:
-            tx_date = datetime.now()
+            for group in groups.values():
+                cached = group[0]["cached"]
+                if cached is None:
+                    pending[group[0]["job_id"]] = (asyncio.create_task(analyze(group)), group)
+                    continue
+                for item in group:
+                    ANALYZER_OUTCOMES.labels("cached").inc()
+                    entry = (item, cached, "COMPLETED", False)
+                    writes.append(entry)
+                    totals["COMPLETED"] = totals.get("COMPLETED", 0) + 1
+                    yield result_event(entry, cached)
+
+            for next_done in asyncio.as_completed([task for task, _ in pending.values()]):
+                group, outcome = await next_done
+                pending.pop(group[0]["job_id"])
+                for entry in outcome_entries(group, outcome):
+                    writes.append(entry)
+                    totals[entry[2]] = totals.get(entry[2], 0) + 1
+                    yield result_event(entry, outcome)
+
+                if len(writes) >= BATCH_COMMIT_SIZE:
+                    committed = await write_batch_results(db, docs, writes)
+                    writes = []
+                    yield encode_event(fmt, "committed", {"documents": committed})
+
+            if writes:
+                committed = await write_batch_results(db, docs, writes)
+                writes = []
+                yield encode_event(fmt, "committed", {"documents": committed})
+            yield encode_event(fmt, "done", {"documents": len(documents), "statuses": totals})
+        finally:
+            # Client parti en cours de route : rien d'analysé n'est perdu.
+            # Starlette annule alors la portée de la réponse, et tout await ici le
+            # serait aussi : l'écriture tourne dans une portée protégée.
+            with anyio.CancelScope(shield=True):
+                requeued = deferred = 0
+                for task, group in pending.values():
+                    if task.done() and not task.cancelled():
+                        writes.extend(outcome_entries(*task.result()))
+                        continue
+                    task.cancel()
+                    for item in group:
+                        if scan_jobs.submit(process_scan_job, item["job_id"]):
+                            requeued += 1
+                        else:
+                            # File pleine : reste PENDING, repris par recover_scan_jobs
+                            deferred += 1
+                if writes:
+                    await write_batch_results(db, docs, writes)
+                await db.close()
+                if requeued:
+                    print(f"🗂️ LOT : client déconnecté, {requeued} document(s) renvoyé(s) dans la file d'analyse.")
+                if deferred:
+                    print(f"⚠️ LOT : file d'analyse pleine, {deferred} document(s) laissé(s) en attente "
+                          f"pour la reprise des jobs orphelins.")
+
+@app.post("/api/aura/scan/batch/{user_id}", dependencies=[Depends(session_owner)])
+async def scan_batch(
+    user_id: str,
+    request: Request,
+    files: List[UploadFile] = File(...),
+    format: str = Query(None, pattern="^(ndjson|sse)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    company = await get_company_for_owner(db, user_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Société introuvable.")
+
+    _, gemini = await analyzer.aget()
+    if gemini and not gemini.is_available():
+        raise HTTPException(status_code=503, detail="Cerveau UHG momentanément indisponible, réessayez plus tard.")
 
-        new_tx = models.Transaction(
+    try:
+        stored = await save_batch_files(files)
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"Lot trop volumineux : {e}.")
+    except InvalidArchive as e:
+        raise HTTPException(status_code=400, detail=f"Archive ZIP invalide : {e}.")
+
+    # Tous les documents du lot en PENDING, un seul commit
+    items = []
+    for index, (filename, file_type, blob, error) in enumerate(stored):
+        item = {"index": index, "filename": filename}
+        if error:
+            item["error"] = error
+            items.append(item)
+            continue
+        doc_entry = models.FinancialDocument(
             company_id=company.id,
-            document_id=doc_entry.id,
-            entry_number=entry_ref,
-            date=tx_date,
-            merchant_name=ai_result.get("merchant"),
-            description=ai_result.get("description"),
-            amount_total=ai_result.get("total"),
-            amount_tax=ai_result.get("tax"),
-            currency=ai_result.get("currency"),
-            category=ai_result.get("category"),
-            is_tax_deductible=ai_result.get("is_deductible"),
-            deduction_justification=ai_result.get("justification")
+            filename=filename,
+            file_path=str(blob.path),
+            file_type=file_type,
+            content_hash=blob.content_hash,
+            status="PENDING"
         )
-        db.add(new_tx)
-       
-        # Moteur 3
-        if ai_result.get("line_items"):
-            process_inventory_updates(db, company.id, ai_result)
-
-        # BLACK BOX STRATEGY
-        memory = models.AuraMemory(
-            document_id=doc_entry.id,
-            raw_text_input=f"Prompt: Expert Fiscal UAE 2025 | File: {filename}",
-            ai_json_output=ai_result
+        db.add(doc_entry)
+        item.update(
+            doc_entry=doc_entry, file_path=doc_entry.file_path, file_type=file_type,
+            company_id=company.id, content_hash=blob.content_hash,
+            cached=await db.run_sync(analysis_cache.get, blob.content_hash, company.id),
         )
-        db.add(memory)
-        print(f"💎 BLACK BOX : Donnée d'entraînement sauvegardée (Ref: {doc_entry.id})")
+        items.append(item)
+    await db.commit()
+    for item in items:
+        if "doc_entry" in item:
+            item["job_id"] = item.pop("doc_entry").id
+    print(f"🗂️ LOT : {len(items)} document(s) reçu(s) pour {company.name}.")
 
-        doc_entry.status = "COMPLETED"
-        db.commit()
+    fmt = format or ("sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson")
+    return StreamingResponse(stream_batch_results(items, fmt), media_type=STREAM_MEDIA_TYPES[fmt])
 
-        return {"success": True, "data": ai_result}
-    else:
-        doc_entry.status = "FAILED"
-        db.commit()
-        raise HTTPException(status_code=500, detail="Erreur IA")
+# 3b. SUIVI D'UN JOB D'ANALYSE
+@app.get("/api/aura/scan/jobs/{job_id}")
+def get_scan_job(job_id: str, authorization: str = Header(None), db: Session = Depends(get_db)):
+    doc_entry = db.get(models.FinancialDocument, job_id)
+    if not doc_entry:
+        raise HTTPException(status_code=404, detail="Job introuvable.")
+    # Résultat d'analyse : même contrôle de session que les routes /{user_id}, via le propriétaire
+    owner_id = db.query(models.Company.owner_id).filter(models.Company.id == doc_entry.company_id).scalar()
+    check_owner(owner_id, authorization)
+
+    job = {"job_id": doc_entry.id, "status": doc_entry.status, "filename": doc_entry.filename}
+    if doc_entry.status == "COMPLETED":
+        memory = db.query(models.AuraMemory)\
+            .filter(models.AuraMemory.document_id == doc_entry.id)\
+            .first()
+        if memory:
+            job["data"] = memory.human_corrected_json or memory.ai_json_output
+        elif doc_entry.content_hash:
+            # Même portée que le cache qui a servi ce résultat : pas de données d'une autre société
+            scope_company = doc_entry.company_id if analysis_cache.scope == "company" else None
+            job["data"] = find_cached_result(db, doc_entry.content_hash, scope_company)
+    return job
+
+# 3c. STATISTIQUES DU CACHE D'ANALYSE
+@app.get("/api/aura/scan/cache/stats")
+def get_analysis_cache_stats():
+    return analysis_cache.stats()
 
 # 4. TABLEAU DE BORD
-@app.get("/api/aura/dashboard/{user_id}")
-def get_dashboard(user_id: str, db: Session = Depends(get_db)):
+DASHBOARD_PAGE_SIZE = int(os.getenv("AURA_DASHBOARD_PAGE_SIZE", "20"))
+DASHBOARD_MAX_PAGE_SIZE = int(os.getenv("AURA_DASHBOARD_MAX_PAGE_SIZE", "100"))
+
+@app.get("/api/aura/dashboard/{user_id}", response_model=DashboardPage, dependencies=[Depends(session_owner)])
+async def get_dashboard(
+    user_id: str,
+    cursor: str = None,
+    limit: int = Query(DASHBOARD_PAGE_SIZE, ge=1, le=DASHBOARD_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    company = await get_company_for_owner(db, user_id)
+    if not company: return FastJSONResponse({"error": "No company"})
+
+    # Ordre (date DESC, id) = ordre de l'index ix_transactions_company_date_id
+    # Seules les colonnes de TransactionOut sont lues (pas d'objet ORM, pas de relation)
+    query = select(*columns_for(models.Transaction, TransactionOut))\
+        .where(models.Transaction.company_id == company.id)\
+        .where(models.Transaction.date.isnot(None))\
+        .order_by(desc(models.Transaction.date), models.Transaction.id)
+
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur invalide.")
+        query = query.where(or_(
+            models.Transaction.date < cursor_date,
+            and_(models.Transaction.date == cursor_date, models.Transaction.id > cursor_id)
+        ))
+
+    result = await db.execute(query.limit(limit + 1))
+    transactions = result.all()
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        next_cursor = encode_cursor(last.date, last.id)
+
+    return FastJSONResponse({
+        "company": company.name,
+        "transactions": as_records(transactions, TransactionOut),
+        "next_cursor": next_cursor,
+    })
+
+# 4b. SYNTHÈSE FINANCIÈRE (AGRÉGATS PRÉCALCULÉS)
+@app.get("/api/aura/summary/{user_id}", dependencies=[Depends(session_owner)])
+def get_summary(user_id: str, db: Session = Depends(get_db)):
     company = db.query(models.Company).filter(models.Company.owner_id == user_id).first()
     if not company: return {"error": "No company"}
+    return {"company": company.name, **read_summary(db, company.id)}
 
-    transactions = db.query(models.Transaction)\
-        .filter(models.Transaction.company_id == company.id)\
-        .order_by(desc(models.Transaction.date))\
-        .limit(20)\
-        .all()
-    return {"company": company.name, "transactions": transactions}
+# 4c. DÉCLARATIONS FISCALES (TVA TRIMESTRIELLE + IS ANNUEL)
+@app.get("/api/aura/reports/tax/{user_id}", dependencies=[Depends(session_owner)])
+def get_tax_report(
+    user_id: str,
+    year: int = Query(None, ge=2000, le=2100),
+    revenue: float = Query(None, ge=0),
+    db: Session = Depends(get_db)
+):
+    company = db.query(models.Company).filter(models.Company.owner_id == user_id).first()
+    if not company: return {"error": "No company"}
 
-# 5. INVENTAIRE
-@app.get("/api/aura/inventory/{user_id}")
-def get_inventory(user_id: str, db: Session = Depends(get_db)):
+    year = year or datetime.now().year
+    revenue_by_year = {year: revenue} if revenue is not None else None
+    report = compute_tax_report(db, company.id, year, revenue_by_year=revenue_by_year)
+    return {"company": company.name, "year": year, **report}
+
+# 4d. AMORTISSEMENT DES IMMOBILISATIONS (CLÔTURE)
+@app.post("/api/aura/assets/depreciation/{user_id}", dependencies=[Depends(session_owner)])
+def close_depreciation(
+    user_id: str,
+    as_of: date = None,
+    full: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Revalorise les immobilisations de la société à la date de clôture
+    (aujourd'hui par défaut). full=true : toutes, pas seulement celles dont
+    la période a changé depuis la dernière valorisation.
+    """
     company = db.query(models.Company).filter(models.Company.owner_id == user_id).first()
-    if not company: return []
+    if not company: return {"error": "No company"}
+
+    report = run_depreciation(db, as_of, company.id, full)
+    db.commit()
+    return {"company": company.name, **report}
+
+# 5. INVENTAIRE
+@app.get("/api/aura/inventory/{user_id}", response_model=Union[List[InventoryItemOut], InventoryColumns],
+         dependencies=[Depends(session_owner)])
+async def get_inventory(
+    user_id: str,
+    format: str = Query("records", pattern="^(records|columnar)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    format=records (défaut) : un objet par article.
+    format=columnar : {"count", "columns", "data"}, une liste de valeurs par
+    champ ; plus compact et plus rapide à produire pour les gros stocks.
+    """
+    company = await get_company_for_owner(db, user_id)
+    if not company:
+        return FastJSONResponse(as_columns([], InventoryItemOut) if format == "columnar" else [])
 
-    items = db.query(models.InventoryItem)\
-        .filter(models.InventoryItem.company_id == company.id)\
-        .filter(models.InventoryItem.quantity_on_hand > 0)\
-        .order_by(desc(models.InventoryItem.quantity_on_hand))\
-        .all()
-    return items
+    # Stock disponible = solde compacté + mouvements en attente du registre
+    query, on_hand = on_hand_query(company.id, InventoryItemOut.model_fields)
+    result = await db.execute(query.where(on_hand > 0).order_by(desc(on_hand)))
+    rows = result.all()
+    if format == "columnar":
+        return FastJSONResponse(as_columns(rows, InventoryItemOut))
+    return FastJSONResponse(as_records(rows, InventoryItemOut))
+
+# 5b. ALERTES STOCK BAS (low_stock_threshold)
+@app.get("/api/aura/inventory/{user_id}/low-stock", response_model=List[InventoryItemOut], dependencies=[Depends(session_owner)])
+async def get_low_stock(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    company = await get_company_for_owner(db, user_id)
+    if not company: return FastJSONResponse([])
+
+    result = await db.execute(low_stock_query(company.id, InventoryItemOut.model_fields))
+    return FastJSONResponse(as_records(result.all(), InventoryItemOut))
 
 # 6. MODULE TOURISTE (TAX FREE CALCULATOR)
 @app.post("/api/aura/tax-free")
@@ -387,31 +1035,72 @@ def calculate_tax_free(request: TaxFreeRequest):
     Simule le calcul de remboursement Planet Tax Free UAE.
     Règle approx: 85% de la TVA est remboursée, moins frais admin (env. 4.80 AED par tag).
     """
-    vat_rate = 0.05
-    vat_amount = request.amount_total * (vat_rate / (1 + vat_rate)) # TVA incluse
-   
-    # Frais administratifs (Planet)
-    admin_fee = 4.80
-    refund_percentage = 0.85 # On récupère environ 85% de la TVA payée
-   
-    estimated_refund = (vat_amount * refund_percentage) - admin_fee
-   
-    if estimated_refund < 0:
-        estimated_refund = 0
+    refund = {name: values[0] for name, values in compute_refunds([request.amount_total]).items()}
 
-    # Génération d'un lien QR Code (API externe pour la démo)
-    qr_data = f"TAXFREE|{request.merchant_name}|{request.amount_total}|{round(estimated_refund, 2)}|AED"
-    qr_url = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={qr_data}&color=10b981&bgcolor=020617"
+    # QR Code généré localement (plus d'appel à une API externe)
+    qr_data = qr_payload(request.merchant_name, request.amount_total, refund["estimated_refund"])
 
     return {
         "total_paid": request.amount_total,
-        "vat_paid": round(vat_amount, 2),
-        "estimated_refund": round(estimated_refund, 2),
-        "admin_fees": round(vat_amount * (1-refund_percentage) + admin_fee, 2),
-        "qr_code_url": qr_url,
-        "status": "ELIGIBLE" if request.amount_total > 250 else "NOT_ELIGIBLE" # Seuil min 250 AED
+        "vat_paid": refund["vat_paid"],
+        "estimated_refund": refund["estimated_refund"],
+        "admin_fees": refund["admin_fees"],
+        "qr_code_url": qr_url(qr_data),
+        "status": "ELIGIBLE" if refund["eligible"] else "NOT_ELIGIBLE" # Seuil min 250 AED
+    }
+
+# 6b. TAX FREE PAR LOT (JOURNÉE COMPLÈTE D'UN COMPTOIR)
+@app.post("/api/aura/tax-free/batch")
+def calculate_tax_free_batch(request: TaxFreeBatchRequest, qr_format: str = Query("svg", pattern="^(png|svg)$")):
+    """
+    Mêmes règles que /api/aura/tax-free, calculées en une passe NumPy pour
+    tous les reçus. Les QR codes sont servis par /api/aura/tax-free/qr.
+    """
+    count = len(request.receipts)
+    if count > TAX_FREE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Lot trop volumineux (max {TAX_FREE_BATCH_MAX} reçus).")
+
+    amounts = np.fromiter((r.amount_total for r in request.receipts), dtype=np.float64, count=count)
+    columns = compute_refunds(amounts)
+
+    receipts = []
+    for i, receipt in enumerate(request.receipts):
+        refund = columns["estimated_refund"][i]
+        receipts.append({
+            "merchant_name": receipt.merchant_name,
+            "total_paid": receipt.amount_total,
+            "vat_paid": columns["vat_paid"][i],
+            "estimated_refund": refund,
+            "admin_fees": columns["admin_fees"][i],
+            "qr_code_url": qr_url(qr_payload(receipt.merchant_name, receipt.amount_total, refund), qr_format),
+            "status": "ELIGIBLE" if columns["eligible"][i] else "NOT_ELIGIBLE"
+        })
+
+    eligible = columns["eligible"]
+    return {
+        "count": count,
+        "eligible_count": sum(eligible),
+        "total_paid": round(float(amounts.sum()), 2),
+        "total_refund": round(sum(r for r, ok in zip(columns["estimated_refund"], eligible) if ok), 2),
+        "receipts": receipts
     }
 
+# 6c. QR CODE TAX FREE (PNG / SVG, GÉNÉRÉ LOCALEMENT)
+@app.get(QR_ROUTE)
+def get_tax_free_qr(
+    data: str = Query(..., max_length=512),
+    format: str = Query("svg", pattern="^(png|svg)$"),
+    if_none_match: str = Header(None)
+):
+    # Contenu identique = image identique : ETag = empreinte, cache navigateur illimité
+    etag = f'"{QRCodeCache.key(data, format)}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    image, _ = qr_cache.get(data, format)
+    return Response(content=image, media_type=QR_MEDIA_TYPES[format], headers=headers)
+
 # 7. MODULE PARTENAIRE (B2B COMMISSION DASHBOARD)
 @app.get("/api/aura/partner/stats/{partner_id}")
 def get_partner_stats(partner_id: str):
@@ -434,3 +1123,35 @@ def get_partner_stats(partner_id: str):
             {"date": "2025-11-29", "client": "CryptoKing Trading", "plan": "ENTERPRISE", "comm": "+$500"},
         ]
     }
+
+# 8. EXPORT DE LA BLACK BOX (DONNÉES D'ENTRAÎNEMENT)
+EXPORT_TOKEN = os.getenv("AURA_EXPORT_TOKEN")
+
+def require_export_token(authorization: str = Header(None)):
+    if not EXPORT_TOKEN:
+        raise HTTPException(status_code=503, detail="Export désactivé (AURA_EXPORT_TOKEN non défini).")
+    if not secrets.compare_digest(authorization or "", f"Bearer {EXPORT_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Jeton d'export invalide.")
+
+@app.get("/api/aura/export/memory", dependencies=[Depends(require_export_token)])
+def export_black_box(
+    after_id: int = Query(0, ge=0),
+    since: datetime = None,
+    company_id: str = None
+):
+    """
+    JSONL gzip de la Black Box, lu par lots côté serveur (mémoire constante).
+    Export incrémental : after_id = dernier id déjà reçu.
+    """
+    def stream():
+        db = SessionLocal()
+        try:
+            yield from gzip_stream(iter_memory(db, after_id=after_id, since=since, company_id=company_id))
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="aura_memory.jsonl.gz"'}
+    )
@@ -0,0 +1,123 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+# --- MÉTRIQUES (FORMAT PROMETHEUS) ---
+# Où passent les secondes d'un scan : histogramme par étape (écriture du
+# fichier, upload Gemini, polling, génération, parsing JSON, stock, commit),
+# latence par route, requêtes SQL (hooks SQLAlchemy) et issue des analyses.
+# Exposé sur GET /metrics. Coût : un perf_counter et un observe() par mesure.
+
+# Latences courtes (SQL, parsing) jusqu'aux appels Gemini de plusieurs secondes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SCAN_STAGE_SECONDS = Histogram(
+    "aura_scan_stage_seconds", "Durée de chaque étape du scan", ["stage"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "aura_http_request_duration_seconds", "Latence des requêtes HTTP par route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "aura_db_query_duration_seconds", "Durée des requêtes SQL par type d'instruction",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+ANALYZER_OUTCOMES = Counter(
+    "aura_analyzer_outcomes_total", "Issue des analyses (real, simulated, cached, failed, unavailable)", ["outcome"]
+)
+GEMINI_RETRIES = Counter("aura_gemini_retries_total", "Nouvelles tentatives Gemini par type d'erreur", ["error"])
+SCAN_QUEUE_PENDING = Gauge("aura_scan_queue_pending", "Jobs de scan en attente dans la file")
+LAZY_INIT_SECONDS = Gauge(
+    "aura_lazy_init_seconds", "Durée d'initialisation des ressources paresseuses (Gemini, bcrypt)", ["resource"]
+)
+PREPROCESS_BYTES_IN = Counter("aura_preprocess_bytes_in_total", "Octets reçus par le prétraitement", ["kind"])
+PREPROCESS_BYTES_SAVED = Counter(
+    "aura_preprocess_bytes_saved_total", "Octets économisés sur l'envoi à Gemini par le prétraitement", ["kind"]
+)
+PREPROCESS_OUTCOMES = Counter(
+    "aura_preprocess_outcomes_total", "Issue du prétraitement (resized, reencoded, trimmed, passthrough, rejected)",
+    ["outcome"]
+)
+AUTH_QUEUE_DEPTH = Gauge("aura_auth_queue_depth", "Opérations bcrypt en attente d'un processus du pool")
+AUTH_IN_FLIGHT = Gauge("aura_auth_in_flight", "Opérations bcrypt en cours")
+AUTH_SECONDS = Histogram(
+    "aura_auth_seconds", "Durée des opérations bcrypt, attente du processus comprise", ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+AUTH_OUTCOMES = Counter(
+    "aura_auth_outcomes_total", "Issue des connexions (success, failure, cached_failure, throttled, busy)", ["outcome"]
+)
+SENTINELLE_BLOCKED = Counter(
+    "aura_sentinelle_blocked_total", "Requêtes bloquées par la Sentinelle (banned, ip, scan_ip, scan_user)", ["reason"]
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Chronomètre une étape du scan : with stage("generate"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SCAN_STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# --- REQUÊTES SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._aura_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_aura_query_start", None)
+    if start is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else "UNKNOWN"
+    DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Compte et chronomètre chaque requête (moteur synchrone ou engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- LATENCE HTTP ---
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI pur (pas de BaseHTTPMiddleware : pas de tâche ni de flux
+    supplémentaires). La route est le gabarit (/api/aura/dashboard/{user_id}),
+    pas le chemin réel : le nombre de séries reste borné.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,108 @@
+import warnings
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+import models
+
+# --- MIGRATIONS LÉGÈRES ---
+# create_all ne crée que les tables manquantes : une base aura.db existante ne
+# reçoit ni les nouvelles colonnes ni les nouveaux index. upgrade() complète
+# le schéma de façon additive (jamais de suppression), sans outil externe.
+#
+# C'est une étape de déploiement explicite, lancée avant les workers (l'import
+# de main ne touche plus au schéma ; AURA_AUTO_MIGRATE=1 pour le dev local).
+#
+# Création / mise à niveau de la base (depuis backend/) :
+#     python migrations.py
+
+def upgrade(engine):
+    models.Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                print(f"🛠️ MIGRATION : colonne {table.name}.{column.name} ajoutée.")
+
+    # La réflexion ignore (avec un avertissement) les index sur expression
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", exc.SAWarning)
+        existing_indexes = {i["name"] for i in inspector.get_indexes("inventory_items")}
+    if "ux_inventory_items_company_product" not in existing_indexes:
+        merge_duplicate_inventory(engine)
+
+    # IF NOT EXISTS plutôt que checkfirst : les index sur expression ne sont pas réfléchis
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+    backfill_summaries(engine)
+
+
+def missing_tables(engine) -> list:
+    """Tables du modèle absentes de la base (vérification rapide au démarrage)."""
+    existing = set(inspect(engine).get_table_names())
+    return [t.name for t in models.Base.metadata.sorted_tables if t.name not in existing]
+
+
+def backfill_summaries(engine):
+    """
+    Sociétés avec des écritures mais sans agrégats (base antérieure à
+    financial_summaries) : agrégats calculés depuis Transaction, sans quoi
+    /summary afficherait zéro. Sans effet une fois les agrégats en place.
+    """
+    from summaries import rebuild
+
+    with Session(engine) as db:
+        missing = db.query(models.Transaction.company_id)\
+            .filter(models.Transaction.company_id.isnot(None))\
+            .filter(~models.Transaction.company_id.in_(db.query(models.FinancialSummary.company_id)))\
+            .distinct()\
+            .all()
+        for (company_id,) in missing:
+            rebuild(db, company_id)
+    if missing:
+        print(f"🛠️ MIGRATION : agrégats financiers calculés pour {len(missing)} sociétés.")
+
+
+def merge_duplicate_inventory(engine):
+    """
+    Avant l'index unique (company_id, product_name) : fusionne les doublons
+    créés par l'ancien Moteur 3 en cumulant les quantités sur la plus petite id.
+    """
+    with engine.begin() as conn:
+        merged = conn.execute(text("""
+            UPDATE inventory_items SET quantity_on_hand = (
+                SELECT SUM(dup.quantity_on_hand) FROM inventory_items dup
+                WHERE dup.company_id = inventory_items.company_id
+                  AND dup.product_name = inventory_items.product_name
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM inventory_items WHERE product_name IS NOT NULL
+                GROUP BY company_id, product_name HAVING COUNT(*) > 1
+            )
+        """)).rowcount
+        if not merged:
+            return
+        conn.execute(text("""
+            DELETE FROM inventory_items
+            WHERE product_name IS NOT NULL AND id NOT IN (
+                SELECT MIN(id) FROM inventory_items WHERE product_name IS NOT NULL
+                GROUP BY company_id, product_name
+            )
+        """))
+        print(f"🛠️ MIGRATION : {merged} articles de stock en doublon fusionnés.")
+
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("✅ Schéma à jour.")
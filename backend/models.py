@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Float, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -40,7 +40,7 @@ class Company(Base):
     __tablename__ = "companies"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    owner_id = Column(String, ForeignKey("users.id"))
+    owner_id = Column(String, ForeignKey("users.id"), index=True)
    
     name = Column(String)
     license_number = Column(String, nullable=True)
@@ -65,8 +65,10 @@ class FinancialDocument(Base):
     filename = Column(String)
     file_path = Column(String)
     file_type = Column(String)
+    content_hash = Column(String, index=True, nullable=True) # SHA-256 du fichier (cache d'analyse)
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(String, default="PENDING")
+    status_updated = Column(DateTime(timezone=True), nullable=True) # prise en charge par un job (reprise des orphelins)
    
     transactions = relationship("Transaction", back_populates="document")
     company = relationship("Company", back_populates="documents")
@@ -92,6 +94,28 @@ class Transaction(Base):
     company = relationship("Company", back_populates="transactions")
     document = relationship("FinancialDocument", back_populates="transactions")
 
+    # Pagination par curseur du tableau de bord : (date DESC, id) par société
+    __table_args__ = (
+        Index("ix_transactions_company_date_id", company_id, date.desc(), id),
+    )
+
+class FinancialSummary(Base):
+    """
+    Agrégats par société, tenus à jour dans la même transaction que chaque
+    écriture (voir summaries.py). dimension = TOTAL | CATEGORY | MONTH,
+    bucket = '' | nom de catégorie | 'YYYY-MM'.
+    """
+    __tablename__ = "financial_summaries"
+
+    company_id = Column(String, ForeignKey("companies.id"), primary_key=True)
+    dimension = Column(String, primary_key=True)
+    bucket = Column(String, primary_key=True)
+    tx_count = Column(Integer, default=0)
+    spend_total = Column(Float, default=0.0)
+    vat_paid = Column(Float, default=0.0)
+    deductible_total = Column(Float, default=0.0)
+    non_deductible_total = Column(Float, default=0.0)
+
 # --- 4. AI MEMORY (BLACK BOX STRATEGY) ---
 
 class AuraMemory(Base):
@@ -124,6 +148,44 @@ class InventoryItem(Base):
     low_stock_threshold = Column(Integer, default=5)
     company = relationship("Company", back_populates="inventory_items")
 
+    # Clé métier du Moteur 3 : un produit par société (création des articles)
+    __table_args__ = (
+        Index("ux_inventory_items_company_product", "company_id", "product_name", unique=True),
+        Index("ix_inventory_items_company_qty", "company_id", "quantity_on_hand"),
+    )
+
+# Alerte stock bas : même expression que la requête de inventory.low_stock_query
+Index(
+    "ix_inventory_items_company_low_stock",
+    InventoryItem.company_id,
+    InventoryItem.quantity_on_hand - InventoryItem.low_stock_threshold,
+)
+
+class StockMovement(Base):
+    """
+    Registre des mouvements de stock, en ajout seul : un scan insère ses lignes
+    sans jamais modifier InventoryItem (pas de ligne chaude entre scans
+    concurrents). Le compactage (inventory.compact_movements) reporte les
+    mouvements dans le stock d'InventoryItem et les marque de son lot ;
+    stock disponible = InventoryItem.quantity_on_hand + mouvements non compactés.
+    """
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    company_id = Column(String, ForeignKey("companies.id"))
+    item_id = Column(String, ForeignKey("inventory_items.id"))
+    document_id = Column(String, ForeignKey("financial_documents.id"), nullable=True)
+    quantity = Column(Integer)  # signé : entrée > 0, sortie < 0
+    unit_price = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    compaction_id = Column(String, nullable=True)  # lot de compactage ; NULL = pas encore reporté
+
+    __table_args__ = (
+        # Queue non compactée d'une société : seul l'index partiel est parcouru
+        Index("ix_stock_movements_pending", "company_id", "item_id",
+              postgresql_where=text("compaction_id IS NULL"), sqlite_where=text("compaction_id IS NULL")),
+    )
+
 class FixedAsset(Base):
     __tablename__ = "fixed_assets"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -133,5 +195,15 @@ class FixedAsset(Base):
     purchase_price = Column(Float)
     lifespan_years = Column(Integer)
     current_value = Column(Float)
+    # Moteur d'amortissement (depreciation.py) : "straight_line" ou "declining_balance"
+    depreciation_method = Column(String, default="straight_line")
+    salvage_value = Column(Float, default=0.0)
+    depreciation_months = Column(Integer, nullable=True)  # mois amortis à la dernière valorisation
+    depreciated_through = Column(String, nullable=True)  # période de la dernière valorisation (YYYY-MM)
     company = relationship("Company", back_populates="fixed_assets")
 
+    # Parcours par société, par id croissant (lots du moteur d'amortissement)
+    __table_args__ = (
+        Index("ix_fixed_assets_company_id", "company_id", "id"),
+    )
+
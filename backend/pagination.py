@@ -0,0 +1,23 @@
+import base64
+import json
+from datetime import datetime
+
+# --- PAGINATION PAR CURSEUR (KEYSET) ---
+# Le curseur encode la clé de tri (date, id) de la dernière ligne servie :
+# la page suivante reprend juste après via l'index, sans OFFSET. La page 500
+# coûte donc autant que la page 1, quel que soit l'historique de la société.
+
+
+def encode_cursor(date: datetime, row_id: str) -> str:
+    payload = json.dumps([date.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Retourne (date, id). Lève ValueError si le curseur est invalide."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(date_str), str(row_id)
+    except Exception as e:
+        raise ValueError(f"Curseur invalide : {cursor}") from e
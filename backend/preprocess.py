@@ -0,0 +1,301 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+
+from gemini_client import AnalyzerError
+from metrics import PREPROCESS_BYTES_IN, PREPROCESS_BYTES_SAVED, PREPROCESS_OUTCOMES, stage
+
+# --- PRÉTRAITEMENT DES DOCUMENTS (AVANT ENVOI AU CERVEAU UHG) ---
+# Une photo de 12 MP ou un PDF de 40 pages partait tel quel chez Gemini :
+# l'envoi et le traitement côté Google croissent avec les octets. Avant
+# l'envoi, chaque document est réduit à ce qui sert à l'analyse :
+#   - images (JPEG, PNG, WebP, GIF, BMP, TIFF) : orientation EXIF appliquée,
+#     réduction au plus grand côté MAX_SIDE (décodage JPEG réduit via draft),
+#     réencodage JPEG sans métadonnées (EXIF, GPS, miniature) ;
+#   - PDF : pages vides retirées, au-delà de MAX_PDF_PAGES seules les pages les
+#     plus pertinentes sont gardées (première page + pages aux montants/taxes),
+#     images embarquées réduites, objets dupliqués fusionnés ;
+#   - fichier annoncé comme image ou PDF mais illisible (tronqué, contenu
+#     incohérent, bombe de décompression) : refusé (CorruptDocument).
+# Les autres types (HEIC...) partent tels quels.
+#
+# Le travail CPU tourne dans un pool de processus (la boucle d'événements et
+# le GIL des workers API restent libres), depuis le job d'analyse : la route de
+# scan ne fait que check_declared (premiers octets contre type annoncé, 422)
+# et répond 202 sans attendre. Un fichier qui passe ce contrôle mais reste
+# illisible finit REJECTED dans le job. Le résultat est écrit à côté du blob
+# (<blob>.prepared) et réutilisé si le document est analysé de nouveau.
+#
+#     AURA_PREPROCESS=0                 désactive l'étape (fichier d'origine envoyé)
+#     AURA_PREPROCESS_WORKERS=2         processus du pool (0 = thread, sans pool)
+#     AURA_PREPROCESS_MAX_SIDE=2048     plus grand côté des images, en pixels
+#     AURA_PREPROCESS_JPEG_QUALITY=85
+#     AURA_PREPROCESS_MAX_PDF_PAGES=4
+
+ENABLED = os.getenv("AURA_PREPROCESS", "1") != "0"
+WORKERS = int(os.getenv("AURA_PREPROCESS_WORKERS", "2"))
+MAX_SIDE = int(os.getenv("AURA_PREPROCESS_MAX_SIDE", "2048"))
+JPEG_QUALITY = int(os.getenv("AURA_PREPROCESS_JPEG_QUALITY", "85"))
+MAX_PDF_PAGES = int(os.getenv("AURA_PREPROCESS_MAX_PDF_PAGES", "4"))
+PDF_SCAN_PAGES = 60  # pages examinées au plus pour choisir les pertinentes
+PREPARED_SUFFIX = ".prepared"
+
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+IMAGE_TYPES = {mime for _, mime in IMAGE_SIGNATURES} | {"image/jpg", "image/webp"}
+PDF_TYPES = {"application/pdf", "application/x-pdf"}
+
+# Indices de pertinence d'une page de facture / reçu
+RELEVANT_WORDS = re.compile(
+    r"total|subtotal|vat|tva|tax|taxe|amount|montant|invoice|facture|receipt|reçu|aed|qty|quantit|trn",
+    re.IGNORECASE,
+)
+AMOUNT = re.compile(r"\d+[.,]\d{2}\b")
+
+
+class CorruptDocument(AnalyzerError):
+    """Fichier illisible : refusé avant tout appel au Cerveau UHG."""
+    status = "REJECTED"
+
+
+class Prepared(NamedTuple):
+    path: str
+    mime_type: str
+    original_bytes: int
+    prepared_bytes: int
+    action: str  # resized, reencoded, trimmed, passthrough, reused, disabled
+
+
+def prepared_path(file_path: str) -> str:
+    return f"{file_path}{PREPARED_SUFFIX}"
+
+
+def sniff(file_path: str) -> str:
+    """Type réel d'après les premiers octets (None si non reconnu)."""
+    with open(file_path, "rb") as f:
+        head = f.read(12)
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+
+def check_declared(file_path: str, mime_type: str) -> str:
+    """
+    Contrôle rapide, sans décodage : type réel du fichier, ou CorruptDocument
+    si le contenu ne ressemble pas au type image / PDF annoncé.
+    """
+    detected = sniff(file_path)
+    declared = (mime_type or "").lower()
+    if detected is None and (declared in IMAGE_TYPES or declared in PDF_TYPES):
+        raise CorruptDocument(f"Contenu illisible pour le type annoncé {declared}.")
+    return detected
+
+
+# --- TRAVAIL CPU (EXÉCUTÉ DANS LE POOL DE PROCESSUS) ---
+
+def _prepare_image(src: str, dst: str):
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(src) as probe:
+            probe.verify()
+        with Image.open(src) as image:
+            has_metadata = bool(image.info.get("exif") or image.info.get("icc_profile") or image.getexif())
+            oversized = max(image.size) > MAX_SIDE
+            if not oversized and not has_metadata and image.format in ("JPEG", "PNG"):
+                image.load()  # détecte un fichier tronqué
+                return None, "passthrough"
+            if oversized:
+                # JPEG : décodage directement à l'échelle 1/2, 1/4 ou 1/8 (sans effet sur les autres formats)
+                image.draft("RGB", (MAX_SIDE, MAX_SIDE))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                flat = Image.new("RGB", image.size, "white")
+                flat.paste(image, mask=image.getchannel("A"))
+                image = flat
+            elif image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(dst, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    except (OSError, SyntaxError, ValueError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise CorruptDocument(f"Image illisible : {e}") from e
+    return "image/jpeg", "resized" if oversized else "reencoded"
+
+
+def _page_score(text: str) -> float:
+    return len(RELEVANT_WORDS.findall(text)) + len(AMOUNT.findall(text)) / 5
+
+
+def _relevant_pages(reader) -> list:
+    """Indices des pages gardées, dans l'ordre du document."""
+    scored = []
+    for index, page in enumerate(reader.pages[:PDF_SCAN_PAGES]):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        has_images = bool(page.get("/Resources", {}).get("/XObject"))
+        if not text.strip() and not has_images:
+            continue  # page blanche
+        # Page scannée (image sans texte) : pertinence inconnue, gardée avant une page sans indice
+        scored.append((index, _page_score(text) if text.strip() else 0.5))
+    if not scored:
+        return [0]
+    if len(scored) <= MAX_PDF_PAGES:
+        return [index for index, _ in scored]
+    first, rest = scored[0], sorted(scored[1:], key=lambda item: (-item[1], item[0]))
+    return sorted([first[0]] + [index for index, _ in rest[:MAX_PDF_PAGES - 1]])
+
+
+def _prepare_pdf(src: str, dst: str):
+    from PIL import Image
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.errors import PdfReadError
+
+    try:
+        reader = PdfReader(src)
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise CorruptDocument("PDF protégé par mot de passe.")
+        total = len(reader.pages)
+        if not total:
+            raise CorruptDocument("PDF sans page.")
+        keep = _relevant_pages(reader)
+
+        writer = PdfWriter()
+        for index in keep:
+            writer.add_page(reader.pages[index])
+        shrunk = 0
+        for page in writer.pages:
+            for embedded in page.images:
+                try:
+                    image = embedded.image
+                    if max(image.size) <= MAX_SIDE:
+                        continue
+                    image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+                    embedded.replace(image.convert("RGB") if image.mode not in ("RGB", "L") else image,
+                                     quality=JPEG_QUALITY)
+                    shrunk += 1
+                except Exception:
+                    continue  # image embarquée non décodable : laissée telle quelle
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        with open(dst, "wb") as f:
+            writer.write(f)
+    except CorruptDocument:
+        raise
+    except (PdfReadError, OSError, ValueError, KeyError, TypeError) as e:
+        raise CorruptDocument(f"PDF illisible : {e}") from e
+
+    if len(keep) == total and not shrunk and os.path.getsize(dst) >= os.path.getsize(src):
+        return None, "passthrough"
+    return "application/pdf", "trimmed" if len(keep) < total else "resized"
+
+
+def prepare_file(file_path: str, mime_type: str) -> Prepared:
+    """Écrit <blob>.prepared et le décrit. Exécuté dans le pool (ou un thread)."""
+    detected = check_declared(file_path, mime_type)
+    dst = prepared_path(file_path)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    original_bytes = os.path.getsize(file_path)
+    try:
+        if detected == "application/pdf":
+            new_type, action = _prepare_pdf(file_path, tmp)
+        elif detected is not None:
+            new_type, action = _prepare_image(file_path, tmp)
+        else:
+            new_type, action = None, "passthrough"
+
+        if new_type is None:
+            # Rien à gagner : lien vers l'original, pour ne pas refaire le travail au prochain passage
+            new_type = detected or mime_type
+            try:
+                os.link(file_path, tmp)
+            except OSError:
+                shutil.copyfile(file_path, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return Prepared(dst, new_type, original_bytes, os.path.getsize(dst), action)
+
+
+def _import_decoders():
+    import PIL.Image  # noqa: F401
+    import pypdf  # noqa: F401
+
+
+# --- CÔTÉ API ---
+
+class DocumentPreprocessor:
+    def __init__(self, workers: int = WORKERS, enabled: bool = ENABLED):
+        self.workers = workers
+        self.enabled = enabled
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None and self.workers > 0:
+            # spawn : pas de fork d'un processus déjà multi-thread (file de scan, SQLAlchemy)
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def prepare(self, file_path: str, mime_type: str) -> Prepared:
+        """Document à envoyer au Cerveau UHG. Lève CorruptDocument si le fichier est illisible."""
+        if not self.enabled:
+            size = os.path.getsize(file_path)
+            return Prepared(file_path, mime_type, size, size, "disabled")
+
+        dst = prepared_path(file_path)
+        if os.path.exists(dst):
+            size = os.path.getsize(dst)
+            return Prepared(dst, sniff(dst) or mime_type, size, size, "reused")
+
+        loop = asyncio.get_running_loop()
+        try:
+            with stage("preprocess"):
+                prepared = await loop.run_in_executor(self._executor(), prepare_file, file_path, mime_type)
+        except CorruptDocument:
+            PREPROCESS_OUTCOMES.labels("rejected").inc()
+            raise
+        except BrokenProcessPool as e:
+            # Un processus est mort sur ce fichier (décodeur planté) : pool recréé, fichier refusé
+            self._pool = None
+            PREPROCESS_OUTCOMES.labels("rejected").inc()
+            raise CorruptDocument("Fichier illisible (prétraitement interrompu).") from e
+
+        new_type = prepared.mime_type or ""
+        kind = "pdf" if new_type in PDF_TYPES else "image" if new_type.startswith("image/") else "other"
+        PREPROCESS_OUTCOMES.labels(prepared.action).inc()
+        PREPROCESS_BYTES_IN.labels(kind).inc(prepared.original_bytes)
+        PREPROCESS_BYTES_SAVED.labels(kind).inc(max(0, prepared.original_bytes - prepared.prepared_bytes))
+        if prepared.action != "passthrough":
+            print(f"🗜️ PRÉTRAITEMENT : {prepared.original_bytes} -> {prepared.prepared_bytes} octets ({prepared.action}).")
+        return prepared
+
+    def warm(self):
+        """Démarre les processus du pool (import de Pillow / pypdf compris) hors du premier scan."""
+        executor = self._executor()
+        if executor is not None:
+            for _ in range(self.workers):
+                executor.submit(_import_decoders)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
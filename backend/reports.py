@@ -0,0 +1,120 @@
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import select, extract, func, case
+from sqlalchemy.orm import Session
+
+import models
+
+# --- MOTEUR DE DÉCLARATIONS FISCALES (EAU) ---
+# TVA trimestrielle (TVA d'amont récupérable / non récupérable) et estimation
+# annuelle de l'impôt sur les sociétés. Les écritures sont lues par lots en
+# colonnes NumPy et agrégées par np.bincount sur l'indice de trimestre :
+# la mémoire reste bornée (un lot + quelques tableaux de 4 cases par année),
+# quel que soit le nombre de transactions de la société.
+
+CORPORATE_TAX_THRESHOLD = 375_000.0
+CORPORATE_TAX_RATE = 0.09
+CHUNK_SIZE = 50_000
+
+_COUNTERS = ("tx_count", "spend_total", "input_vat", "recoverable_vat", "deductible_spend")
+
+
+def _stream_chunks(db: Session, company_id: str, year_from: int, year_to: int, chunk_size: int):
+    """Lots de lignes (year, month, total, tax, deductible) en tableaux float64 de forme (n, 5)."""
+    T = models.Transaction
+    query = select(
+        extract("year", T.date),
+        extract("month", T.date),
+        func.coalesce(T.amount_total, 0.0),
+        func.coalesce(T.amount_tax, 0.0),
+        case((T.is_tax_deductible == True, 1.0), else_=0.0),
+    ).where(
+        T.company_id == company_id,
+        T.date >= datetime(year_from, 1, 1),
+        T.date < datetime(year_to + 1, 1, 1),
+    ).execution_options(yield_per=chunk_size)
+
+    # Exécution Core (sans couche ORM) ; np.fromiter évite d'inspecter chaque Row
+    for partition in db.connection().execute(query).partitions():
+        flat = np.fromiter(chain.from_iterable(partition), dtype=np.float64, count=len(partition) * 5)
+        yield flat.reshape(-1, 5)
+
+
+def aggregate_quarters(db: Session, company_id: str, year_from: int, year_to: int, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Compteurs par trimestre, indexés (année - year_from) * 4 + trimestre."""
+    periods = (year_to - year_from + 1) * 4
+    totals = {name: np.zeros(periods) for name in _COUNTERS}
+
+    for chunk in _stream_chunks(db, company_id, year_from, year_to, chunk_size):
+        year, month, amount, tax, deductible = chunk.T
+        period = ((year - year_from) * 4 + (month - 1) // 3).astype(np.int64)
+        deductible = deductible.astype(bool)
+
+        totals["tx_count"] += np.bincount(period, minlength=periods)
+        totals["spend_total"] += np.bincount(period, weights=amount, minlength=periods)
+        totals["input_vat"] += np.bincount(period, weights=tax, minlength=periods)
+        totals["recoverable_vat"] += np.bincount(period, weights=np.where(deductible, tax, 0.0), minlength=periods)
+        totals["deductible_spend"] += np.bincount(period, weights=np.where(deductible, amount, 0.0), minlength=periods)
+    return totals
+
+
+def corporate_tax(taxable_profit: float) -> float:
+    """0% jusqu'à 375 000 AED, 9% au-delà."""
+    return max(taxable_profit - CORPORATE_TAX_THRESHOLD, 0.0) * CORPORATE_TAX_RATE
+
+
+def compute_tax_report(
+    db: Session,
+    company_id: str,
+    year_from: int,
+    year_to: int = None,
+    revenue_by_year: dict = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    """
+    Déclarations TVA trimestrielles et estimation IS annuelle.
+    Sans chiffre d'affaires déclaré (revenue_by_year), l'IS n'est pas estimé :
+    les écritures ne contiennent que des dépenses.
+    """
+    year_to = year_to or year_from
+    revenue_by_year = revenue_by_year or {}
+    totals = aggregate_quarters(db, company_id, year_from, year_to, chunk_size)
+
+    vat_returns = []
+    for period in range(len(totals["tx_count"])):
+        input_vat = totals["input_vat"][period]
+        recoverable = totals["recoverable_vat"][period]
+        vat_returns.append({
+            "period": f"{year_from + period // 4}-Q{period % 4 + 1}",
+            "tx_count": int(totals["tx_count"][period]),
+            "spend_total": round(float(totals["spend_total"][period]), 2),
+            "input_vat": round(float(input_vat), 2),
+            "recoverable_vat": round(float(recoverable), 2),
+            "non_recoverable_vat": round(float(input_vat - recoverable), 2),
+        })
+
+    yearly = {name: values.reshape(-1, 4).sum(axis=1) for name, values in totals.items()}
+    corporate_tax_estimates = []
+    for index, year in enumerate(range(year_from, year_to + 1)):
+        # La TVA récupérable n'est pas une charge : seule la part HT est déductible
+        deductible_expenses = float(yearly["deductible_spend"][index] - yearly["recoverable_vat"][index])
+        estimate = {
+            "year": year,
+            "deductible_expenses": round(deductible_expenses, 2),
+            "revenue": None,
+            "taxable_profit": None,
+            "corporate_tax": None,
+        }
+        revenue = revenue_by_year.get(year)
+        if revenue is not None:
+            taxable_profit = revenue - deductible_expenses
+            estimate.update({
+                "revenue": revenue,
+                "taxable_profit": round(taxable_profit, 2),
+                "corporate_tax": round(corporate_tax(taxable_profit), 2),
+            })
+        corporate_tax_estimates.append(estimate)
+
+    return {"vat_returns": vat_returns, "corporate_tax": corporate_tax_estimates}
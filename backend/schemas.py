@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import List, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# --- SCHÉMAS DE RÉPONSE (ROUTES DE LECTURE) ---
+# Le tableau de bord et l'inventaire ne renvoient plus d'objets ORM passés par
+# jsonable_encoder (introspection objet par objet, relations chargées à la
+# demande). Chaque schéma fixe les champs envoyés ; la requête ne sélectionne
+# que ces colonnes (columns_for) et les lignes partent telles quelles vers
+# orjson (FastJSONResponse). Les schémas servent aussi à la doc OpenAPI.
+#
+# Inventaire volumineux : ?format=columnar renvoie une colonne par champ
+# ({"count", "columns", "data"}) au lieu d'un objet par article.
+
+
+class TransactionOut(BaseModel):
+    id: str
+    document_id: Optional[str] = None
+    entry_number: Optional[str] = None
+    date: Optional[datetime] = None
+    merchant_name: Optional[str] = None
+    description: Optional[str] = None
+    amount_total: Optional[float] = None
+    amount_tax: Optional[float] = None
+    currency: Optional[str] = None
+    category: Optional[str] = None
+    is_tax_deductible: Optional[bool] = None
+    deduction_justification: Optional[str] = None
+    is_tax_refundable: Optional[bool] = None
+
+
+class DashboardPage(BaseModel):
+    company: str
+    transactions: List[TransactionOut]
+    next_cursor: Optional[str] = None
+
+
+class InventoryItemOut(BaseModel):
+    id: str
+    product_name: Optional[str] = None
+    sku: Optional[str] = None
+    quantity_on_hand: Optional[int] = None
+    unit_price: Optional[float] = None
+    low_stock_threshold: Optional[int] = None
+
+
+class InventoryColumns(BaseModel):
+    """data[i] contient les valeurs de columns[i], article par article."""
+    count: int
+    columns: List[str]
+    data: List[list]
+
+
+def columns_for(model, schema) -> list:
+    """Colonnes ORM correspondant aux champs du schéma (même ordre)."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def as_records(rows, schema) -> list:
+    keys = list(schema.model_fields)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def as_columns(rows, schema) -> dict:
+    keys = list(schema.model_fields)
+    data = [list(values) for values in zip(*rows)] if rows else [[] for _ in keys]
+    return {"count": len(rows), "columns": keys, "data": data}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON sérialisé par orjson (datetime en ISO 8601, comme jsonable_encoder)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
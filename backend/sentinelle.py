@@ -0,0 +1,303 @@
+import asyncio
+import ipaddress
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse
+
+from metrics import SENTINELLE_BLOCKED
+
+# --- SÉCURITÉ SENTINELLE ---
+# Middleware ASGI pur (pas de BaseHTTPMiddleware : ni tâche ni tampon par
+# requête, les réponses en flux passent telles quelles) :
+#   - liste de bannissement par IP ou plage CIDR, rechargée depuis un fichier
+#     sans redémarrage (AURA_BANNED_IPS_FILE, une entrée par ligne, # commentaire) ;
+#   - limitation de débit par seau à jetons : par IP sur toutes les routes
+#     (optionnel), par IP et par utilisateur sur les routes de scan (coûteuses).
+# Les seaux vivent en mémoire du worker, ou dans un fichier SQLite partagé par
+# les workers de la machine (AURA_RATE_LIMIT_STORE=/dev/shm/aura-ratelimit.db) ;
+# ce dernier peut attendre son verrou : il est interrogé hors de la boucle.
+#
+# Limites : "débit:rafale" en requêtes par seconde, "0" désactive.
+#     AURA_RATE_LIMIT_IP=0             toutes les routes, par IP
+#     AURA_RATE_LIMIT_SCAN_IP=2:40     POST /api/aura/scan/..., par IP
+#     AURA_RATE_LIMIT_SCAN_USER=1:20   POST /api/aura/scan/..., par utilisateur
+
+DEFAULT_BANNED_IPS = ("1.2.3.4",)
+BAN_RELOAD_SECONDS = float(os.getenv("AURA_BAN_RELOAD_SECONDS", "5"))
+SCAN_PATH_PREFIX = "/api/aura/scan/"
+EVICTIONS_PER_CALL = 8  # éviction amortie : quelques seaux inactifs par appel
+
+
+# --- BANNISSEMENT (IP ET PLAGES CIDR) ---
+
+def _parse_bans(lines) -> dict:
+    """{version IP: [(longueur de préfixe, {préfixes entiers}), ...]}, préfixes longs d'abord."""
+    tables = {4: {}, 6: {}}
+    for line in lines:
+        entry = line.split("#", 1)[0].strip()
+        if not entry:
+            continue
+        try:
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            print(f"⚠️ SENTINELLE : entrée de bannissement invalide ignorée ({entry}).")
+            continue
+        shift = network.max_prefixlen - network.prefixlen
+        tables[network.version].setdefault(network.prefixlen, set()).add(int(network.network_address) >> shift)
+    return {version: sorted(by_length.items(), reverse=True) for version, by_length in tables.items()}
+
+
+class BanList:
+    """
+    Une table par longueur de préfixe : une recherche coûte un décalage et un
+    test d'appartenance par longueur présente (/32, /24...), pas un parcours
+    de toute la liste.
+    """
+
+    def __init__(self, entries=DEFAULT_BANNED_IPS, path: str = None, reload_seconds: float = BAN_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._mtime = None
+        self._next_check = 0.0
+        self._tables = _parse_bans(entries)
+        if path:
+            self._maybe_reload(force=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(path=os.getenv("AURA_BANNED_IPS_FILE"))
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + self.reload_seconds
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                tables = _parse_bans(f)
+        except OSError as e:
+            # Fichier absent ou illisible : la liste en place reste active
+            print(f"⚠️ SENTINELLE : liste de bannissement non rechargée ({e}).")
+            return
+        self._tables, self._mtime = tables, mtime
+        count = sum(len(prefixes) for table in tables.values() for _, prefixes in table)
+        print(f"🛡️ SENTINELLE : {count} entrées de bannissement chargées ({self.path}).")
+
+    def is_banned(self, host: str) -> bool:
+        if self.path:
+            self._maybe_reload()
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        value = int(address)
+        for prefix_len, prefixes in self._tables[address.version]:
+            if value >> (address.max_prefixlen - prefix_len) in prefixes:
+                return True
+        return False
+
+
+# --- LIMITATION DE DÉBIT (SEAUX À JETONS) ---
+
+def parse_limit(value: str):
+    """"débit:rafale" -> (jetons par seconde, capacité) ; None si désactivé."""
+    if not value or value.strip() == "0":
+        return None
+    rate, _, burst = value.partition(":")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBucketStore:
+    """
+    Seaux du worker : [jetons, dernière mise à jour] par clé, dans l'ordre
+    d'utilisation. Un seau inactif plus de idle_seconds est de nouveau plein,
+    donc équivalent à un seau absent : il est évincé.
+    Appelé depuis la boucle d'événements, sans await : pas de verrou nécessaire.
+    """
+
+    blocking = False
+
+    def __init__(self, idle_seconds: float):
+        self.idle_seconds = idle_seconds
+        self._buckets = OrderedDict()
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> float:
+        """0 si la requête passe, sinon le délai (s) avant le prochain jeton."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [capacity, now]
+        else:
+            bucket[0] = _refill(bucket[0], bucket[1], now, rate, capacity)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+    def _evict(self, now: float):
+        for _ in range(EVICTIONS_PER_CALL):
+            oldest = next(iter(self._buckets.values()), None)
+            if oldest is None or now - oldest[1] < self.idle_seconds:
+                return
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """
+    Seaux partagés par les workers d'une même machine (fichier SQLite, de
+    préférence en mémoire partagée /dev/shm). Une transaction IMMEDIATE par
+    décision ; en cas de contention au-delà du délai d'attente, la requête
+    passe (on ne bloque pas le service pour le limiteur).
+    Bloquant (attente du verrou) : appelé depuis un thread, une connexion par thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, idle_seconds: float, busy_timeout_ms: int = 50):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._next_eviction = 0.0
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL) WITHOUT ROWID"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+        return conn
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> float:
+        # Horloge murale : partagée entre processus, contrairement à monotonic()
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else _refill(row[0], row[1], now, rate, capacity)
+                allowed = tokens >= 1
+                conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens - 1 if allowed else tokens, now),
+                )
+                if now >= self._next_eviction:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_seconds,))
+                    self._next_eviction = now + self.idle_seconds
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ SENTINELLE : magasin de débit indisponible ({e}), requête acceptée.")
+            return 0.0
+        return 0.0 if allowed else (1 - tokens) / rate
+
+
+class RateLimiter:
+    def __init__(self, ip_limit=None, scan_ip_limit=None, scan_user_limit=None, store_path: str = None):
+        self.rules = {"ip": ip_limit, "scan_ip": scan_ip_limit, "scan_user": scan_user_limit}
+        limits = [limit for limit in self.rules.values() if limit]
+        # Au-delà, tout seau est de nouveau plein : durée d'inactivité avant éviction
+        idle_seconds = max((capacity / rate for rate, capacity in limits), default=60.0)
+        self.store = SQLiteBucketStore(store_path, idle_seconds) if store_path else MemoryBucketStore(idle_seconds)
+
+    @classmethod
+    def from_env(cls):
+        store = os.getenv("AURA_RATE_LIMIT_STORE", "memory")
+        return cls(
+            ip_limit=parse_limit(os.getenv("AURA_RATE_LIMIT_IP", "0")),
+            scan_ip_limit=parse_limit(os.getenv("AURA_RATE_LIMIT_SCAN_IP", "2:40")),
+            scan_user_limit=parse_limit(os.getenv("AURA_RATE_LIMIT_SCAN_USER", "1:20")),
+            store_path=None if store == "memory" else store,
+        )
+
+    async def _take(self, rule: str, key: str, now: float) -> float:
+        limit = self.rules[rule]
+        if not limit:
+            return 0.0
+        if self.store.blocking:
+            # Magasin partagé : l'attente du verrou SQLite ne doit pas geler la boucle
+            return await asyncio.to_thread(self.store.take, f"{rule}:{key}", limit[0], limit[1], now)
+        return self.store.take(f"{rule}:{key}", limit[0], limit[1], now)
+
+    async def check(self, scope, host: str):
+        """None si la requête passe, sinon (règle, délai avant nouvel essai)."""
+        now = time.monotonic()
+        wait = await self._take("ip", host, now)
+        if wait:
+            return "ip", wait
+        path = scope["path"]
+        if scope["method"] == "POST" and path.startswith(SCAN_PATH_PREFIX):
+            wait = await self._take("scan_ip", host, now)
+            if wait:
+                return "scan_ip", wait
+            # POST /api/aura/scan/{user_id} et /api/aura/scan/batch/{user_id}
+            wait = await self._take("scan_user", path.rstrip("/").rsplit("/", 1)[-1], now)
+            if wait:
+                return "scan_user", wait
+        return None
+
+
+class SentinelleMiddleware:
+    def __init__(self, app, bans: BanList = None, limiter: RateLimiter = None):
+        self.app = app
+        self.bans = bans or BanList.from_env()
+        self.limiter = limiter or RateLimiter.from_env()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        host = client[0] if client else ""
+        if self.bans.is_banned(host):
+            SENTINELLE_BLOCKED.labels("banned").inc()
+            response = JSONResponse(status_code=403, content={"error": "Sentinelle Block: IP Banned"})
+            await response(scope, receive, send)
+            return
+
+        limited = await self.limiter.check(scope, host)
+        if limited:
+            rule, wait = limited
+            SENTINELLE_BLOCKED.labels(rule).inc()
+            response = JSONResponse(
+                status_code=429,
+                content={"error": "Sentinelle Block: Rate Limited", "retry_after": round(wait, 2)},
+                headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_signature(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-security-by", b"UHG-Sentinelle-AI")]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_signature)
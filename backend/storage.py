@@ -0,0 +1,85 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import NamedTuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# --- STOCKAGE DES DOCUMENTS (ADRESSAGE PAR CONTENU) ---
+# Chaque fichier est écrit par morceaux (les écritures disque passent par le
+# threadpool, la boucle d'événements reste libre), haché au fil de l'eau et
+# rangé sous son SHA-256 dans des sous-dossiers à deux niveaux :
+# uploads/blobs/ab/cd/abcd...  Un doublon n'est stocké qu'une fois et aucun
+# dossier ne grossit au point de ralentir les recherches du système de fichiers.
+
+UPLOAD_ROOT = Path(os.getenv("AURA_UPLOAD_DIR", "uploads"))
+MAX_UPLOAD_BYTES = int(os.getenv("AURA_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StoredBlob(NamedTuple):
+    path: Path
+    content_hash: str
+    size: int
+
+
+class BlobStorage:
+    def __init__(self, root: Path = UPLOAD_ROOT, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def blob_path(self, content_hash: str) -> Path:
+        return self.root / "blobs" / content_hash[:2] / content_hash[2:4] / content_hash
+
+    async def save_upload(self, upload: UploadFile) -> StoredBlob:
+        """
+        Copie l'upload dans le stockage. Lève UploadTooLarge dès que la
+        taille maximale est dépassée (le fichier partiel est supprimé).
+        """
+        if upload.size is not None and upload.size > self.max_bytes:
+            raise UploadTooLarge(upload.size)
+        return await self._save_chunks(lambda: upload.read(CHUNK_SIZE))
+
+    async def save_stream(self, fileobj) -> StoredBlob:
+        """Comme save_upload, pour un fichier binaire synchrone (membre d'archive ZIP)."""
+        return await self._save_chunks(lambda: run_in_threadpool(fileobj.read, CHUNK_SIZE))
+
+    async def _save_chunks(self, read_chunk) -> StoredBlob:
+        tmp_dir = self.root / "tmp"
+        await run_in_threadpool(tmp_dir.mkdir, parents=True, exist_ok=True)
+        tmp_path = tmp_dir / uuid.uuid4().hex
+
+        digest = hashlib.sha256()
+        size = 0
+        buffer = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while chunk := await read_chunk():
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise UploadTooLarge(size)
+                digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+        except BaseException:
+            buffer.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        await run_in_threadpool(buffer.close)
+
+        content_hash = digest.hexdigest()
+        path = self.blob_path(content_hash)
+        await run_in_threadpool(self._commit, tmp_path, path)
+        return StoredBlob(path, content_hash, size)
+
+    def _commit(self, tmp_path: Path, path: Path):
+        if path.exists():
+            # Contenu déjà stocké : on garde l'existant
+            tmp_path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
@@ -0,0 +1,182 @@
+import argparse
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+# --- AGRÉGATS FINANCIERS PAR SOCIÉTÉ ---
+# Dépenses, TVA payée, déductible / non déductible, par catégorie et par mois.
+# Chaque écriture incrémente ses trois lignes (TOTAL, CATEGORY, MONTH) par un
+# upsert dans la transaction du scan : la lecture ne dépend plus de la taille
+# de l'historique. rebuild() recalcule tout depuis Transaction pour détecter
+# et corriger une dérive ; migrations.upgrade() l'appelle pour les sociétés
+# qui ont des écritures mais pas encore d'agrégats (base existante).
+#
+# Recalcul complet (depuis backend/) :
+#     python summaries.py rebuild [--company ID] [--batch-size 5000] [--check]
+
+TOTAL = "TOTAL"
+CATEGORY = "CATEGORY"
+MONTH = "MONTH"
+UNCATEGORIZED = "UNCATEGORIZED"
+METRICS = ("tx_count", "spend_total", "vat_paid", "deductible_total", "non_deductible_total")
+DRIFT_TOLERANCE = 0.01
+
+
+def _deltas(date, amount_total, amount_tax, category, is_deductible) -> dict:
+    amount = amount_total or 0.0
+    delta = {
+        "tx_count": 1,
+        "spend_total": amount,
+        "vat_paid": amount_tax or 0.0,
+        "deductible_total": amount if is_deductible else 0.0,
+        "non_deductible_total": 0.0 if is_deductible else amount,
+    }
+    buckets = [(TOTAL, ""), (CATEGORY, category or UNCATEGORIZED)]
+    if date:
+        buckets.append((MONTH, date.strftime("%Y-%m")))
+    return {bucket: delta for bucket in buckets}
+
+
+def apply_transaction(db: Session, tx: models.Transaction):
+    """Incrémente les agrégats de la société pour une nouvelle écriture (sans commit)."""
+    rows = [
+        {"company_id": tx.company_id, "dimension": dimension, "bucket": bucket, **delta}
+        for (dimension, bucket), delta in _deltas(
+            tx.date, tx.amount_total, tx.amount_tax, tx.category, tx.is_tax_deductible
+        ).items()
+    ]
+    table = models.FinancialSummary.__table__
+    stmt = dialect_insert(db, table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.company_id, table.c.dimension, table.c.bucket],
+        set_={name: table.c[name] + stmt.excluded[name] for name in METRICS},
+    )
+    db.execute(stmt)
+
+
+def read_summary(db: Session, company_id: str) -> dict:
+    rows = db.query(models.FinancialSummary)\
+        .filter(models.FinancialSummary.company_id == company_id)\
+        .all()
+
+    summary = {"totals": dict.fromkeys(METRICS, 0), "by_category": {}, "by_month": {}}
+    for row in rows:
+        values = {name: getattr(row, name) for name in METRICS}
+        if row.dimension == TOTAL:
+            summary["totals"] = values
+        elif row.dimension == CATEGORY:
+            summary["by_category"][row.bucket] = values
+        elif row.dimension == MONTH:
+            summary["by_month"][row.bucket] = values
+    summary["by_month"] = dict(sorted(summary["by_month"].items()))
+    return summary
+
+
+def _stored(db: Session, company_id: str) -> dict:
+    rows = db.query(models.FinancialSummary)\
+        .filter(models.FinancialSummary.company_id == company_id)\
+        .all()
+    return {(r.dimension, r.bucket): {name: getattr(r, name) for name in METRICS} for r in rows}
+
+
+def _drift(stored: dict, computed: dict) -> list:
+    drifted = []
+    for key in stored.keys() | computed.keys():
+        before = stored.get(key, {})
+        after = computed.get(key, {})
+        if any(abs((before.get(n) or 0) - (after.get(n) or 0)) > DRIFT_TOLERANCE for n in METRICS):
+            drifted.append({"dimension": key[0], "bucket": key[1], "stored": before, "computed": after})
+    return drifted
+
+
+def _replace(db: Session, company_id: str, computed: dict):
+    db.query(models.FinancialSummary)\
+        .filter(models.FinancialSummary.company_id == company_id)\
+        .delete(synchronize_session=False)
+    db.bulk_insert_mappings(models.FinancialSummary, [
+        {"company_id": company_id, "dimension": dimension, "bucket": bucket, **values}
+        for (dimension, bucket), values in computed.items()
+    ])
+
+
+def _lock(db: Session, company_id: str):
+    """
+    Verrouille les agrégats de la société jusqu'au commit (SELECT ... FOR UPDATE,
+    sans effet sous SQLite) : un scan concurrent attend sur son upsert au lieu
+    d'incrémenter une ligne que rebuild va remplacer. La ligne TOTAL d'abord,
+    comme dans apply_transaction : même ordre de verrouillage, pas d'interblocage.
+    """
+    S = models.FinancialSummary
+    for dimension in (S.dimension == TOTAL, S.dimension != TOTAL):
+        db.query(S.bucket)\
+            .filter(S.company_id == company_id, dimension)\
+            .with_for_update()\
+            .all()
+
+
+def _recompute(db: Session, company_id: str, batch_size: int) -> dict:
+    T = models.Transaction
+    rows = db.query(T.date, T.amount_total, T.amount_tax, T.category, T.is_tax_deductible)\
+        .filter(T.company_id == company_id)\
+        .execution_options(yield_per=batch_size)
+
+    computed = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    for row in rows:
+        for key, delta in _deltas(row.date, row.amount_total, row.amount_tax, row.category, row.is_tax_deductible).items():
+            for name in METRICS:
+                computed[key][name] += delta[name]
+    return computed
+
+
+def rebuild(db: Session, company_id: str = None, batch_size: int = 5000, check_only: bool = False) -> dict:
+    """
+    Recalcule les agrégats depuis Transaction, société par société, en lisant
+    les écritures par lots (yield_per). Retourne la dérive constatée par société.
+    check_only=True : rapport de dérive sans réécriture.
+    """
+    if company_id:
+        company_ids = [company_id]
+    else:
+        with_tx = db.query(models.Transaction.company_id).distinct()
+        with_summary = db.query(models.FinancialSummary.company_id).distinct()
+        company_ids = sorted({row[0] for row in with_tx.union(with_summary)})
+
+    report = {}
+    for current in company_ids:
+        if not check_only:
+            # Verrou pris avant la lecture : les écritures validées entre-temps sont comptées
+            _lock(db, current)
+        computed = _recompute(db, current, batch_size)
+        drifted = _drift(_stored(db, current), computed)
+        if drifted:
+            report[current] = drifted
+        if not check_only:
+            _replace(db, current, computed)
+            db.commit()
+    return report
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Agrégats financiers AURA")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--company", default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--check", action="store_true", help="rapport de dérive uniquement")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = rebuild(db, args.company, args.batch_size, args.check)
+    finally:
+        db.close()
+
+    for company, drifted in report.items():
+        print(f"⚠️ Dérive société {company} : {len(drifted)} agrégats")
+        for item in drifted:
+            print(f"   {item['dimension']}/{item['bucket']} : {item['stored']} -> {item['computed']}")
+    print("✅ Aucune dérive." if not report else f"{'🔎' if args.check else '🛠️'} {len(report)} sociétés en dérive.")
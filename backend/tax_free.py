@@ -0,0 +1,104 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import numpy as np
+import segno
+
+# --- MODULE TOURISTE : REMBOURSEMENTS TAX FREE ---
+# Règles Planet Tax Free UAE (approximation) : TVA de 5 % incluse dans le prix,
+# 85 % de la TVA remboursée, moins 4.80 AED de frais par bordereau, éligible
+# à partir de 250 AED. compute_refunds() traite un tableau de montants en une
+# passe NumPy (un reçu ou une journée complète de comptoir).
+# Les QR codes sont générés localement (segno, PNG ou SVG) et gardés dans un
+# cache LRU indexé par l'empreinte du contenu : plus d'appel à api.qrserver.com.
+
+VAT_RATE = 0.05
+REFUND_PERCENTAGE = 0.85
+ADMIN_FEE = 4.80
+MIN_ELIGIBLE_AMOUNT = 250
+
+TAX_FREE_BATCH_MAX = int(os.getenv("AURA_TAX_FREE_BATCH_MAX", "10000"))
+QR_CACHE_SIZE = int(os.getenv("AURA_QR_CACHE_SIZE", "2048"))
+QR_DARK = "#10b981"
+QR_LIGHT = "#020617"
+QR_SCALE = 8  # ~200 px pour un bordereau standard
+QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+QR_ROUTE = "/api/aura/tax-free/qr"
+
+
+def compute_refunds(amounts) -> dict:
+    """
+    Montants TTC -> colonnes TVA, remboursement estimé, frais et éligibilité.
+    Calcul en une passe NumPy ; l'arrondi final au fils passe par round() de
+    Python, comme le calcul unitaire d'origine (np.round diffère sur les demi-fils).
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    vat = amounts * (VAT_RATE / (1 + VAT_RATE))
+    refund = np.maximum(vat * REFUND_PERCENTAGE - ADMIN_FEE, 0.0)
+    fees = vat * (1 - REFUND_PERCENTAGE) + ADMIN_FEE
+    return {
+        "vat_paid": [round(v, 2) for v in vat.tolist()],
+        "estimated_refund": [round(v, 2) for v in refund.tolist()],
+        "admin_fees": [round(v, 2) for v in fees.tolist()],
+        "eligible": (amounts > MIN_ELIGIBLE_AMOUNT).tolist(),
+    }
+
+
+def qr_payload(merchant_name: str, amount_total: float, refund: float) -> str:
+    return f"TAXFREE|{merchant_name}|{amount_total}|{refund}|AED"
+
+
+def qr_url(payload: str, fmt: str = "svg") -> str:
+    return f"{QR_ROUTE}?{urlencode({'data': payload, 'format': fmt})}"
+
+
+class QRCodeCache:
+    """
+    Images QR par (empreinte du contenu, format), éviction LRU.
+    Thread-safe : les routes synchrones tournent dans le threadpool.
+    """
+
+    def __init__(self, max_entries: int = QR_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(payload: str, fmt: str) -> str:
+        return hashlib.sha256(f"{fmt}:{payload}".encode()).hexdigest()
+
+    def get(self, payload: str, fmt: str = "svg") -> tuple:
+        """Retourne (octets de l'image, empreinte utilisable comme ETag)."""
+        key = self.key(payload, fmt)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image, key
+            self.misses += 1
+
+        image = render_qr(payload, fmt)
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return image, key
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+def render_qr(payload: str, fmt: str = "svg") -> bytes:
+    buffer = io.BytesIO()
+    segno.make(payload, error="m").save(buffer, kind=fmt, scale=QR_SCALE, border=2, dark=QR_DARK, light=QR_LIGHT)
+    return buffer.getvalue()
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Environnement isolé, défini avant le premier import de main
+_tmp = Path(tempfile.mkdtemp(prefix="aura-tests-"))
+os.environ.setdefault("AURA_DATABASE_URL", f"sqlite:///{_tmp / 'main.db'}")
+os.environ.setdefault("AURA_UPLOAD_DIR", str(_tmp / "uploads"))
+os.environ.setdefault("AURA_AUTO_MIGRATE", "1")
+os.environ.setdefault("AURA_WARM_START", "0")
+os.environ.setdefault("AURA_ANALYZER", "fake")
+os.environ.setdefault("AURA_AUTH_WORKERS", "0")
+os.environ.setdefault("AURA_FAKE_UPLOAD_LATENCY", "0.01")
+os.environ.setdefault("AURA_FAKE_PROCESSING_POLLS", "0")
+os.environ.setdefault("AURA_RATE_LIMIT_SCAN_IP", "0")
+os.environ.setdefault("AURA_RATE_LIMIT_SCAN_USER", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
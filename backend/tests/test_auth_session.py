@@ -0,0 +1,62 @@
+"""Connexion avant inscription, puis jeton de session sur les routes /{user_id}."""
+import asyncio
+import uuid
+
+import httpx
+
+import main
+
+
+async def login_then_register():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test") as client:
+            email = f"auth-{uuid.uuid4().hex[:8]}@example.com"
+            creds = {"email": email, "password": "secret1"}
+            before = await client.post("/auth/login", json=creds)
+            created = await client.post("/auth/register", json={**creds, "full_name": "Auth Session"})
+            login = await client.post("/auth/login", json=creds)
+            user_id, token = login.json()["user_id"], login.json()["token"]
+
+            summary = f"/api/aura/summary/{user_id}"
+            statuses = {
+                "anonymous": (await client.get(summary)).status_code,
+                "own": (await client.get(summary, headers={"Authorization": f"Bearer {token}"})).status_code,
+                "other": (await client.get("/api/aura/summary/someone-else",
+                                           headers={"Authorization": f"Bearer {token}"})).status_code,
+                "invalid": (await client.get(summary, headers={"Authorization": "Bearer nope"})).status_code,
+            }
+            return before.status_code, created.status_code, login.status_code, statuses
+
+
+def test_failed_login_before_register_does_not_block_the_new_account():
+    before, created, login, statuses = asyncio.run(login_then_register())
+    assert (before, created, login) == (400, 201, 200)
+    assert statuses == {"anonymous": 200, "own": 200, "other": 403, "invalid": 401}
+
+
+async def job_of_another_user():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test") as client:
+            sessions = []
+            for name in ("owner", "other"):
+                creds = {"email": f"{name}-{uuid.uuid4().hex[:8]}@example.com", "password": "secret1"}
+                await client.post("/auth/register", json={**creds, "full_name": name})
+                login = (await client.post("/auth/login", json=creds)).json()
+                sessions.append((login["user_id"], {"Authorization": f"Bearer {login['token']}"}))
+            (owner_id, owner), (_, other) = sessions
+
+            scan = await client.post(f"/api/aura/scan/{owner_id}", headers=owner,
+                                     files={"file": ("recu.txt", uuid.uuid4().bytes, "text/plain")})
+            job_url = scan.json()["status_url"]
+            return {
+                "anonymous": (await client.get(job_url)).status_code,
+                "other": (await client.get(job_url, headers=other)).status_code,
+                "own": (await client.get(job_url, headers=owner)).status_code,
+            }
+
+
+def test_scan_job_requires_the_owner_session(monkeypatch):
+    monkeypatch.setattr(main, "REQUIRE_SESSION", True)
+    assert asyncio.run(job_of_another_user()) == {"anonymous": 401, "other": 403, "own": 200}
@@ -0,0 +1,139 @@
+"""
+Lot en flux interrompu par le client (POST /api/aura/scan/batch) : les
+résultats déjà envoyés sont écrits et les documents encore en cours sont
+renvoyés dans la file d'analyse, malgré l'annulation de la réponse. Si la
+file est pleine, ils restent PENDING et la reprise des orphelins s'en charge.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+os.environ.setdefault("AURA_FAKE_GENERATE_LATENCY", "0.2")
+os.environ.setdefault("AURA_BATCH_CONCURRENCY", "2")
+
+import httpx
+from sqlalchemy import select
+
+import main
+import models
+from jobs import ScanJobQueue
+
+DOCUMENTS = 6
+
+
+def multipart(files):
+    boundary = uuid.uuid4().hex
+    body = b""
+    for name, payload, mime in files:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="{name}"\r\n'
+            f"Content-Type: {mime}\r\n\r\n"
+        ).encode() + payload + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+async def statuses(job_ids):
+    async with main.AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.FinancialDocument.id, models.FinancialDocument.status)
+            .where(models.FinancialDocument.id.in_(job_ids))
+        )
+        return dict(result.all())
+
+
+async def disconnect_after_first_result(recover: bool = False):
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test") as client:
+            r = await client.post("/auth/register", json={
+                "email": f"batch-{uuid.uuid4().hex[:8]}@example.com", "password": "batch-disconnect",
+                "full_name": "Batch Disconnect",
+            })
+            r.raise_for_status()
+            user_id = r.json()["user_id"]
+
+        body, content_type = multipart(
+            [(f"recu-{i}.txt", f"Reçu {i} {uuid.uuid4().hex}".encode(), "text/plain") for i in range(DOCUMENTS)]
+        )
+        # Appel ASGI brut : httpx n'envoie jamais http.disconnect en cours de réponse
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "server": ("aura.test", 80), "client": ("127.0.0.1", 4000),
+            "path": f"/api/aura/scan/batch/{user_id}", "raw_path": f"/api/aura/scan/batch/{user_id}".encode(),
+            "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"aura.test"), (b"content-type", content_type.encode()),
+                        (b"content-length", str(len(body)).encode())],
+        }
+        first_result = asyncio.Event()
+        body_sent = False
+        events = []
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await first_result.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] != "http.response.body":
+                return
+            for line in message.get("body", b"").splitlines():
+                event = json.loads(line)
+                events.append(event)
+                if event.get("status") == "COMPLETED":
+                    first_result.set()
+
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=30)
+
+        completed = [e["job_id"] for e in events if e.get("status") == "COMPLETED"]
+        job_ids = [e["job_id"] for e in events if e.get("job_id")]
+        assert completed and len(job_ids) < DOCUMENTS, "le client doit partir avant la fin du lot"
+
+        accepted = next(e for e in events if e["event"] == "accepted")
+        assert accepted["documents"] == DOCUMENTS
+
+        # Les documents renvoyés dans la file finissent par être analysés
+        async with main.AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.FinancialDocument.id)
+                .join(models.Company, models.Company.id == models.FinancialDocument.company_id)
+                .where(models.Company.owner_id == user_id)
+            )
+            all_ids = list(result.scalars())
+        assert len(all_ids) == DOCUMENTS
+        if recover:
+            left = [job_id for job_id, status in (await statuses(all_ids)).items() if status == "PENDING"]
+            assert left, "la file pleine doit laisser des documents en attente"
+            await main.recover_scan_jobs()
+        for _ in range(200):
+            current = await statuses(all_ids)
+            if all(s not in ("PENDING", "ANALYZING") for s in current.values()):
+                break
+            await asyncio.sleep(0.05)
+
+        async with main.AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.Transaction.document_id).where(models.Transaction.document_id.in_(completed))
+            )
+            booked = set(result.scalars())
+        return current, completed, booked
+
+
+def test_disconnect_keeps_streamed_results_and_requeues_the_rest():
+    current, completed, booked = asyncio.run(disconnect_after_first_result())
+    assert set(current.values()) == {"COMPLETED"}, current
+    assert booked == set(completed)
+
+
+def test_disconnect_with_full_queue_leaves_documents_to_recovery(monkeypatch):
+    # File sans place : rien n'est renvoyé ; reprise immédiate des PENDING
+    monkeypatch.setattr(main, "scan_jobs", ScanJobQueue(workers=1, max_pending=1))
+    monkeypatch.setattr(main.scan_jobs, "submit", lambda func, *args: False)
+    monkeypatch.setattr(main, "SCAN_STALE_SECONDS", -60)
+    current, completed, booked = asyncio.run(disconnect_after_first_result(recover=True))
+    assert set(current.values()) == {"COMPLETED"}, current
+    assert booked == set(completed)
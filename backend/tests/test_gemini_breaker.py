@@ -0,0 +1,83 @@
+"""Disjoncteur Gemini : seules les pannes du service l'ouvrent, un essai annulé le libère."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_client import AnalyzerError, AnalyzerUnavailable, CircuitBreaker, GeminiClient
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class FakeSDK:
+    def __init__(self, state="ACTIVE"):
+        self.state = state
+
+    def upload_file(self, path, mime_type=None):
+        return SimpleNamespace(name="files/1", state=SimpleNamespace(name=self.state))
+
+
+class FakeModel:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def generate_content(self, parts):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return SimpleNamespace(text=self.reply)
+
+
+def client(model, sdk=None, threshold=2):
+    return GeminiClient(sdk or FakeSDK(), model, "prompt", max_retries=1, retry_base_delay=0,
+                        breaker=CircuitBreaker(threshold=threshold, reset_timeout=0.05))
+
+
+def test_document_errors_do_not_open_the_breaker():
+    async def run():
+        bad_json = client(FakeModel("pas du json"))
+        refused = client(FakeModel("{}"), sdk=FakeSDK(state="FAILED"))
+        for gemini in (bad_json, refused):
+            for _ in range(3):
+                with pytest.raises(AnalyzerError) as error:
+                    await gemini.analyze("recu.jpg", "image/jpeg")
+                assert error.value.status == "FAILED"
+            assert gemini.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(run())
+
+
+def test_unavailability_opens_the_breaker():
+    async def run():
+        gemini = client(FakeModel(ServiceUnavailable("503")))
+        for _ in range(2):
+            with pytest.raises(AnalyzerUnavailable):
+                await gemini.analyze("recu.jpg", "image/jpeg")
+        assert gemini.breaker.state == CircuitBreaker.OPEN
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_releases_the_breaker():
+    async def run():
+        gemini = client(FakeModel(ServiceUnavailable("503")))
+        for _ in range(2):
+            with pytest.raises(AnalyzerUnavailable):
+                await gemini.analyze("recu.jpg", "image/jpeg")
+        await asyncio.sleep(0.06)
+        assert gemini.breaker.state == CircuitBreaker.HALF_OPEN
+
+        # L'essai est annulé (client parti, arrêt du worker...) avant tout verdict
+        probe = asyncio.create_task(gemini.analyze("recu.jpg", "image/jpeg"))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        gemini.model = FakeModel(json.dumps({"ok": True}))
+        assert await gemini.analyze("recu.jpg", "image/jpeg") == {"ok": True}
+        assert gemini.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(run())
@@ -0,0 +1,93 @@
+"""
+File d'analyse pleine : pas de 202 pour un job qui ne tournerait jamais, et
+les documents orphelins (file perdue à l'arrêt) sont repris.
+"""
+import asyncio
+import uuid
+from datetime import timedelta
+
+import httpx
+from sqlalchemy import select
+
+import main
+import models
+from jobs import ScanJobQueue
+
+
+async def register(client) -> str:
+    r = await client.post("/auth/register", json={
+        "email": f"queue-{uuid.uuid4().hex[:8]}@example.com", "password": "scan-queue", "full_name": "Scan Queue",
+    })
+    r.raise_for_status()
+    return r.json()["user_id"]
+
+
+async def wait_settled(job_ids, timeout: float = 20):
+    for _ in range(int(timeout / 0.05)):
+        async with main.AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.FinancialDocument.status).where(models.FinancialDocument.id.in_(job_ids))
+            )
+            statuses = list(result.scalars())
+        if all(s not in ("PENDING", "ANALYZING") for s in statuses):
+            return statuses
+        await asyncio.sleep(0.05)
+    return statuses
+
+
+async def overflow(monkeypatch):
+    monkeypatch.setattr(main, "scan_jobs", ScanJobQueue(workers=1, max_pending=1))
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test") as client:
+            user_id = await register(client)
+            responses = await asyncio.gather(*(
+                client.post(f"/api/aura/scan/{user_id}",
+                            files={"file": (f"recu-{i}.txt", uuid.uuid4().bytes, "text/plain")})
+                for i in range(6)
+            ))
+            accepted = [r.json()["job_id"] for r in responses if r.status_code == 202]
+            refused = [r for r in responses if r.status_code == 503]
+            return accepted, refused, await wait_settled(accepted)
+
+
+def test_full_queue_answers_503_instead_of_an_orphan_job(monkeypatch):
+    accepted, refused, statuses = asyncio.run(overflow(monkeypatch))
+    assert refused and all(r.headers["Retry-After"] for r in refused)
+    assert len(accepted) + len(refused) == 6
+    assert statuses == ["COMPLETED"] * len(accepted)
+
+
+async def orphans():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://aura.test") as client:
+            user_id = await register(client)
+        stale = main.utc_now() - timedelta(seconds=main.SCAN_STALE_SECONDS + 60)
+        async with main.AsyncSessionLocal() as db:
+            company = await main.get_company_for_owner(db, user_id)
+            docs = []
+            for status in ("PENDING", "ANALYZING"):
+                blob = main.blob_storage.root / f"orphan-{uuid.uuid4().hex}.txt"
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                blob.write_bytes(uuid.uuid4().bytes)
+                docs.append(models.FinancialDocument(
+                    company_id=company.id, filename=blob.name, file_path=str(blob), file_type="text/plain",
+                    status=status, status_updated=stale,
+                ))
+            # Job en cours dans un autre worker : pas repris
+            docs.append(models.FinancialDocument(
+                company_id=company.id, filename="live.txt", file_path="live.txt", file_type="text/plain",
+                status="ANALYZING", status_updated=main.utc_now(),
+            ))
+            db.add_all(docs)
+            await db.commit()
+            ids = [doc.id for doc in docs]
+        await main.recover_scan_jobs()
+        return await wait_settled(ids[:2]), await wait_settled(ids[2:], timeout=0.1)
+
+
+def test_recovery_requeues_stale_jobs_only():
+    recovered, live = asyncio.run(orphans())
+    assert recovered == ["COMPLETED", "COMPLETED"]
+    assert live == ["ANALYZING"]
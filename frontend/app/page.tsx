@@ -280,7 +280,16 @@ function AuraDashboard() {
           new Promise(resolve => setTimeout(resolve, 3500)) 
         ]);
 
-        finalResult = response.data.data;
+        // L'analyse est asynchrone : on interroge le job jusqu'au résultat
+        let job = response.data;
+        while (job.status === "PENDING" || job.status === "ANALYZING") {
+          await new Promise(resolve => setTimeout(resolve, 1000));
+          job = (await axios.get(`${API_URL}${response.data.status_url}`)).data;
+        }
+        if (job.status === "AI_UNAVAILABLE") throw new Error("Cerveau UHG indisponible, réessayez plus tard.");
+        if (job.status !== "COMPLETED") throw new Error("Analyse IA en échec.");
+
+        finalResult = job.data;
         if (!finalResult) throw new Error("API returned no data.");
 
       } else {
@@ -660,7 +669,7 @@ function AuraDashboard() {
                                     <h3 className="font-bold text-lg">Digital Refund Tag</h3>
                                     <p className="text-xs text-slate-500 mb-4">{new Date().toLocaleString()}</p>
                                 </div>
-                                <img src={taxFreeResult.qr_code_url} alt="Refund QR" className="w-16 h-16 mix-blend-multiply" />
+                                <img src={`${API_URL}${taxFreeResult.qr_code_url}`} alt="Refund QR" className="w-16 h-16 mix-blend-multiply" />
                             </div>
                             <div className="flex justify-between items-end border-t border-slate-100 pt-4">
                                 <div>